@@ -0,0 +1,10 @@
+"""
+Load benchmarks for the AI backend that need no Google credentials.
+
+Every Google service is replaced by a local fake with configurable latency, error rate
+and payload size (fakes.py), synthetic leases are built from ai/dataset (leases.py), and
+run.py drives the FastAPI app in-process at several concurrency levels.
+
+Run from the ai/ directory (like generate_core_clauses.py):
+    python -m benchmarks.run --concurrency 1,4,16 --output benchmark.json
+"""
@@ -0,0 +1,315 @@
+"""
+Local stand-ins for the Google services the backend calls, for benchmarks.
+
+FakeServices.install() puts one fake per client into utils/client_registry.py, so the
+app's own code paths (PDF page splitting, embedding batching and retries, Gemini
+fallback and hedging, batched translation, TTS chunking, GCS existence checks) run
+unchanged; only the network call is replaced by a sleep.
+
+Each service has a ServiceProfile:
+- latency_ms, plus per_item_ms for each page / text / segment, varied by +-jitter
+- error_rate: share of calls that fail with ServiceUnavailable (503) after the latency
+- payload: size of what the service returns (OCR characters for a page without hidden
+  text, embedding dimensions, Gemini answer characters, TTS audio bytes per chunk;
+  unused for Translation and GCS)
+
+A Gemini model can be given its own profile as "gemini:<model name>" (e.g. to make the
+first model fail and benchmark the fallback). Calls, errors and simulated seconds are
+counted per service (FakeServices.stats()).
+"""
+import hashlib
+import io
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from google.api_core.exceptions import ServiceUnavailable
+from pypdf import PdfReader
+
+from .leases import PAGE_TEXT_KEY
+
+# Support both package and script execution imports
+try:
+    from ..utils import client_registry
+    from ..config import EMBEDDING_MODEL, GEMINI_MODELS
+except ImportError:
+    from utils import client_registry
+    from config import EMBEDDING_MODEL, GEMINI_MODELS
+
+
+@dataclass
+class ServiceProfile:
+    latency_ms: float = 0.0
+    per_item_ms: float = 0.0
+    jitter: float = 0.2
+    error_rate: float = 0.0
+    payload: int = 0
+
+
+# Rough production latencies of each service (milliseconds)
+DEFAULT_PROFILES: Dict[str, ServiceProfile] = {
+    "documentai": ServiceProfile(latency_ms=900, per_item_ms=150, payload=2000),
+    "vision": ServiceProfile(latency_ms=700, payload=2000),
+    "vertex_embeddings": ServiceProfile(latency_ms=150, per_item_ms=2, payload=768),
+    "gemini": ServiceProfile(latency_ms=2500, payload=1200),
+    "translate": ServiceProfile(latency_ms=180, per_item_ms=5),
+    "tts": ServiceProfile(latency_ms=400, payload=24000),
+    "gcs": ServiceProfile(latency_ms=60),
+}
+
+_FILLER = (
+    "The tenant shall pay the monthly rent on or before the fifth day of every month and "
+    "keep the premises in good condition. The security deposit is refundable at the end of "
+    "the lease after deducting unpaid dues. Either party may end the lease with one month "
+    "written notice. "
+)
+
+
+def _filler(chars: int) -> str:
+    repeats = chars // len(_FILLER) + 1
+    return (_FILLER * repeats)[: max(0, chars)].strip()
+
+
+def _generated_text(prompt: str, chars: int) -> str:
+    """About `chars` characters of words from the prompt: a different prompt gives a different
+    answer (as from the real model), so translation and audio caches are not hit by accident."""
+    words = prompt.split() or _FILLER.split()
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    picked: List[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(words)
+        picked.append(word)
+        length += len(word) + 1
+    return " ".join(picked)
+
+
+class FakeService:
+    """Latency, errors and counters of one fake service."""
+
+    def __init__(self, name: str, profile: ServiceProfile, scale: float, rng: random.Random) -> None:
+        self.name = name
+        self.profile = profile
+        self.scale = scale
+        self._rng = rng
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.items = 0
+        self.errors = 0
+        self.simulated_s = 0.0
+
+    def call(self, items: int = 1) -> None:
+        """Sleep like the real call would, then maybe fail."""
+        profile = self.profile
+        with self._lock:
+            spread = 1 + profile.jitter * (2 * self._rng.random() - 1)
+            failed = self._rng.random() < profile.error_rate
+        seconds = max(0.0, (profile.latency_ms + profile.per_item_ms * items) * spread * self.scale / 1000)
+        if seconds:
+            time.sleep(seconds)
+        with self._lock:
+            self.calls += 1
+            self.items += items
+            self.simulated_s += seconds
+            if failed:
+                self.errors += 1
+        if failed:
+            raise ServiceUnavailable(f"Simulated {self.name} outage")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "items": self.items,
+                "errors": self.errors,
+                "simulated_s": round(self.simulated_s, 3),
+            }
+
+
+class _Closable:
+    def close(self) -> None:
+        pass
+
+
+class FakeDocumentAI(_Closable):
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def processor_path(self, project: str, location: str, processor: str) -> str:
+        return f"projects/{project}/locations/{location}/processors/{processor}"
+
+    def process_document(self, request: Any) -> Any:
+        try:
+            pages = PdfReader(io.BytesIO(request.raw_document.content)).pages
+            texts = [str(page.get(PAGE_TEXT_KEY) or _filler(self.service.profile.payload)) for page in pages]
+        except Exception:
+            texts = [_filler(self.service.profile.payload)]
+        self.service.call(items=len(texts))
+        return SimpleNamespace(document=SimpleNamespace(text="\n".join(texts)))
+
+
+class FakeVision(_Closable):
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def document_text_detection(self, image: Any) -> Any:
+        self.service.call()
+        return SimpleNamespace(full_text_annotation=SimpleNamespace(text=_filler(self.service.profile.payload)))
+
+
+class FakeEmbeddingModel:
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def _vector(self, text: str) -> List[float]:
+        # Same text, same vector (like the real model), so caches behave as in production
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(max(1, self.service.profile.payload)).tolist()
+
+    def get_embeddings(self, texts: List[str]) -> List[Any]:
+        self.service.call(items=len(texts))
+        return [SimpleNamespace(values=self._vector(text)) for text in texts]
+
+
+class FakeGenerativeModel:
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None, stream: bool = False) -> Any:
+        self.service.call()
+        text = _generated_text(prompt, self.service.profile.payload)
+        if stream:
+            return self._pieces(text)
+        return SimpleNamespace(text=text)
+
+    @staticmethod
+    def _pieces(text: str, size: int = 40) -> Iterator[Any]:
+        for start in range(0, len(text), size):
+            yield SimpleNamespace(text=text[start : start + size])
+
+
+class FakeTranslate(_Closable):
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def translate(self, values: List[str], target_language: str) -> List[Dict[str, str]]:
+        self.service.call(items=len(values))
+        return [{"translatedText": f"[{target_language}] {value}", "input": value} for value in values]
+
+
+class FakeTextToSpeech(_Closable):
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+
+    def synthesize_speech(self, input: Any, voice: Any, audio_config: Any) -> Any:
+        self.service.call()
+        return SimpleNamespace(audio_content=b"\0" * max(0, self.service.profile.payload))
+
+
+class _FakeBlob:
+    def __init__(self, storage: "FakeStorage", name: str) -> None:
+        self._storage = storage
+        self.name = name
+
+    def exists(self) -> bool:
+        self._storage.service.call()
+        with self._storage.lock:
+            return self.name in self._storage.objects
+
+    def upload_from_string(self, data: bytes, content_type: str = "") -> None:
+        self._storage.service.call()
+        with self._storage.lock:
+            self._storage.objects[self.name] = len(data)
+
+
+class _FakeBucket:
+    def __init__(self, storage: "FakeStorage") -> None:
+        self._storage = storage
+
+    def blob(self, name: str) -> _FakeBlob:
+        return _FakeBlob(self._storage, name)
+
+
+class FakeStorage(_Closable):
+    """Keeps object names and sizes only, so exists() is true after an upload."""
+
+    def __init__(self, service: FakeService) -> None:
+        self.service = service
+        self.lock = threading.Lock()
+        self.objects: Dict[str, int] = {}
+
+    def bucket(self, name: str) -> _FakeBucket:
+        return _FakeBucket(self)
+
+
+class FakeServices:
+    """All fake services of one benchmark run."""
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, ServiceProfile]] = None,
+        latency_scale: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+        rng = random.Random(seed)
+        self.profiles = profiles
+        self.services: Dict[str, FakeService] = {
+            name: FakeService(name, profile, latency_scale, rng) for name, profile in profiles.items()
+        }
+        for model in GEMINI_MODELS:
+            key = f"gemini:{model}"
+            if key not in self.services:
+                self.services[key] = FakeService(key, profiles["gemini"], latency_scale, rng)
+
+    def install(self) -> None:
+        """Register the fakes in the client registry in place of the Google clients."""
+        clients: Dict[str, Any] = {
+            "docai": FakeDocumentAI(self.services["documentai"]),
+            "vision": FakeVision(self.services["vision"]),
+            f"embedding:{EMBEDDING_MODEL}": FakeEmbeddingModel(self.services["vertex_embeddings"]),
+            "translate": FakeTranslate(self.services["translate"]),
+            "tts": FakeTextToSpeech(self.services["tts"]),
+            "storage": FakeStorage(self.services["gcs"]),
+        }
+        for model in GEMINI_MODELS:
+            clients[f"gemini:{model}"] = FakeGenerativeModel(self.services[f"gemini:{model}"])
+        with client_registry._lock:
+            client_registry._clients.update(clients)
+            # No Application Default Credentials lookup, no vertexai.init()
+            client_registry._credentials = None
+            client_registry._credentials_loaded = True
+            client_registry._vertex_initialized = True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        # "gemini" itself is only the default profile of the per-model services
+        return {name: service.stats() for name, service in self.services.items() if name != "gemini"}
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        return {name: asdict(profile) for name, profile in self.profiles.items()}
+
+
+def parse_profile_overrides(specs: List[str], base: Optional[Dict[str, ServiceProfile]] = None) -> Dict[str, ServiceProfile]:
+    """Apply "service:field=value,field=value" overrides, e.g. "gemini:latency_ms=800,error_rate=0.05".
+
+    The service name may itself contain a colon ("gemini:gemini-2.5-pro:error_rate=1").
+    """
+    profiles = dict(base or DEFAULT_PROFILES)
+    for spec in specs:
+        name, _, fields = spec.rpartition(":")
+        if not name or "=" not in fields:
+            raise ValueError(f"Invalid service override '{spec}' (expected service:field=value,...)")
+        profile = profiles.get(name) or profiles.get(name.split(":")[0]) or ServiceProfile()
+        values: Dict[str, Any] = {}
+        for item in fields.split(","):
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in ServiceProfile.__dataclass_fields__:
+                raise ValueError(f"Unknown profile field '{key}' in '{spec}'")
+            values[key] = int(value) if key == "payload" else float(value)
+        profiles[name] = replace(profile, **values)
+    return profiles
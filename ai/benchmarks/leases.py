@@ -0,0 +1,171 @@
+"""
+Synthetic rental agreements for benchmarks, built from the sample leases in ai/dataset.
+
+Each lease starts from the paragraphs of one sample agreement, swaps some of them for
+paragraphs of the other samples and changes amounts and dates. Every upload is therefore
+a new file (no result cache hit), while length and wording stay realistic and boilerplate
+is shared between leases as it is in real traffic (so the embedding cache behaves as in
+production).
+
+Leases are rendered as PDFs:
+- "scanned" pages have no text layer, so they go to (fake) Document AI, which reads the
+  page's text from a hidden /LegalSenseText entry of the page;
+- text-layer pages are read locally by pypdf, like born-digital uploads.
+"""
+import io
+import os
+import random
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+import docx
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject, TextStringObject
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset")
+PAGE_TEXT_KEY = "/LegalSenseText"
+
+_MONTHS = "January|February|March|April|May|June|July|August|September|October|November|December"
+_AMOUNT_RE = re.compile(r"(Rs\.?\s*|INR\s*|₹\s*)\d[\d,]*(?:\.\d+)?(?:/-)?", re.IGNORECASE)
+_DATE_RE = re.compile(rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+(?:day\s+of\s+)?({_MONTHS}),?\s+\d{{4}}", re.IGNORECASE)
+
+# Letter-size page, 9pt Helvetica
+_PAGE_WIDTH, _PAGE_HEIGHT = 612, 792
+_LINE_CHARS = 100
+
+
+@dataclass
+class SyntheticLease:
+    name: str
+    text: str
+    pdf: bytes
+    pages: int
+
+
+def read_dataset(path: str = DATASET_DIR) -> List[List[str]]:
+    """Paragraphs of each sample agreement (headings and other short lines are dropped)."""
+    documents: List[List[str]] = []
+    for filename in sorted(f for f in os.listdir(path) if f.endswith(".docx")):
+        doc = docx.Document(os.path.join(path, filename))
+        paragraphs = [" ".join(p.text.split()) for p in doc.paragraphs if len(p.text.strip()) > 20]
+        if paragraphs:
+            documents.append(paragraphs)
+    if not documents:
+        raise FileNotFoundError(f"No .docx agreements found in '{path}'")
+    return documents
+
+
+def _vary(paragraph: str, rng: random.Random) -> str:
+    paragraph = _AMOUNT_RE.sub(lambda m: f"{m.group(1)}{rng.randrange(5, 200) * 1000:,}/-", paragraph)
+    return _DATE_RE.sub(lambda m: f"{rng.randint(1, 28)} {m.group(1)} {rng.randint(2015, 2026)}", paragraph)
+
+
+def _paginate(paragraphs: List[str], words_per_page: int) -> List[str]:
+    pages: List[str] = []
+    current: List[str] = []
+    words = 0
+    for paragraph in paragraphs:
+        current.append(paragraph)
+        words += len(paragraph.split())
+        if words >= words_per_page:
+            pages.append("\n".join(current))
+            current, words = [], 0
+    if current:
+        pages.append("\n".join(current))
+    return pages
+
+
+def _wrap(text: str) -> List[str]:
+    lines: List[str] = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > _LINE_CHARS:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def _text_layer(lines: List[str]) -> bytes:
+    """PDF content stream drawing the lines in Helvetica (non-Latin-1 characters become '?')."""
+    ops = ["BT", "/F1 9 Tf", "11 TL", f"50 {_PAGE_HEIGHT - 50} Td"]
+    for line in lines:
+        escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        ops.append(f"({escaped}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1", errors="replace")
+
+
+def _render_pdf(pages: List[str], text_layer: List[bool]) -> bytes:
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for text, has_layer in zip(pages, text_layer):
+        page = writer.add_blank_page(width=_PAGE_WIDTH, height=_PAGE_HEIGHT)
+        if has_layer:
+            page[NameObject("/Resources")] = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+            })
+            stream = DecodedStreamObject()
+            stream.set_data(_text_layer(_wrap(text)))
+            page.replace_contents(stream)
+        else:
+            # A scan: nothing for pypdf to read; the fake Document AI returns this text
+            page[NameObject(PAGE_TEXT_KEY)] = TextStringObject(text)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def make_lease(
+    documents: List[List[str]],
+    index: int,
+    seed: int = 0,
+    mix: float = 0.3,
+    text_layer_fraction: float = 0.0,
+    words_per_page: int = 350,
+    min_words: int = 0,
+) -> SyntheticLease:
+    """Lease number `index` of a run: the same (index, seed) always gives the same file.
+
+    `mix` is the share of paragraphs taken from other samples, `text_layer_fraction` the
+    share of pages with a text layer, and `min_words` pads short samples with more
+    paragraphs (to benchmark long documents).
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    base = documents[rng.randrange(len(documents))]
+    paragraphs = [f"Lease reference LS-{seed}-{index:06d}."]
+    for paragraph in base:
+        if len(documents) > 1 and rng.random() < mix:
+            other = documents[rng.randrange(len(documents))]
+            paragraph = other[rng.randrange(len(other))]
+        paragraphs.append(_vary(paragraph, rng))
+    words = sum(len(paragraph.split()) for paragraph in paragraphs)
+    while words < min_words:
+        other = documents[rng.randrange(len(documents))]
+        paragraph = _vary(other[rng.randrange(len(other))], rng)
+        paragraphs.append(paragraph)
+        words += len(paragraph.split())
+    pages = _paginate(paragraphs, max(50, words_per_page))
+    layers = [rng.random() < text_layer_fraction for _ in pages]
+    text = "\n".join(paragraphs)
+    return SyntheticLease(name=f"lease-{seed}-{index:06d}.pdf", text=text, pdf=_render_pdf(pages, layers), pages=len(pages))
+
+
+def synthetic_leases(
+    count: int,
+    seed: int = 0,
+    start: int = 0,
+    documents: Optional[List[List[str]]] = None,
+    **options,
+) -> List[SyntheticLease]:
+    """`count` leases numbered from `start` (see make_lease for the options)."""
+    documents = documents or read_dataset()
+    return [make_lease(documents, index, seed, **options) for index in range(start, start + count)]
@@ -0,0 +1,341 @@
+"""
+Load benchmark of /api/process-document and /api/chat against fake Google services.
+
+For each concurrency level, that many workers upload synthetic leases (with
+timings=true), then ask questions about the leases processed at that level. Everything
+runs in this process through httpx's ASGI transport, with the app's real startup and
+shutdown: no server, network or Google credentials are needed.
+
+The JSON report has, per level and endpoint: throughput, latency percentiles, errors,
+and the mean/p50/p95/p99 of each stage from the `timings` field; plus the calls made to
+each fake service and a final /healthz snapshot (caches, batching, Gemini counters).
+With --baseline, p95 latency and throughput are compared with an earlier report and the
+run exits with status 1 on a regression.
+
+Run from the ai/ directory:
+    python -m benchmarks.run --concurrency 1,4,16 --output benchmark.json
+    python -m benchmarks.run --latency-scale 0            # app overhead only
+    python -m benchmarks.run --service gemini:error_rate=0.2 --service documentai:latency_ms=3000
+    python -m benchmarks.run --output new.json --baseline benchmark.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from .leases import DATASET_DIR, SyntheticLease, read_dataset, synthetic_leases
+
+QUESTIONS = [
+    "What is the monthly rent?",
+    "How much is the security deposit?",
+    "When is the rent due every month?",
+    "What is the notice period to end the agreement?",
+    "Who pays the electricity and water charges?",
+    "Can the tenant sublet the premises?",
+    "How long is the lease period?",
+    "Is there a lock-in period?",
+    "By how much does the rent increase on renewal?",
+    "Who is responsible for repairs and maintenance?",
+    "When will the security deposit be refunded?",
+    "Can the landlord inspect the premises?",
+    "What happens if the rent is paid late?",
+    "Are pets allowed in the premises?",
+    "What is the address of the rented property?",
+    "Who are the parties to this agreement?",
+]
+
+
+@dataclass
+class Sample:
+    seconds: float
+    status: int
+    timings: Dict[str, float] = field(default_factory=dict)
+    cached: bool = False
+    document_id: str = ""
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels (default 1,4,16)")
+    parser.add_argument("--documents", type=int, default=8, help="uploads per level (at least the concurrency)")
+    parser.add_argument("--chats", type=int, default=32, help="chat questions per level (at least the concurrency)")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured uploads (and chats) before the first level")
+    parser.add_argument("--language", default="hi", help="target language (default hi; en still calls Translate)")
+    parser.add_argument("--audio", action="store_true", help="request audio with every upload and answer (TTS + GCS)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every fake latency (0 = no sleeping)")
+    parser.add_argument(
+        "--service", action="append", default=[], metavar="NAME:FIELD=VALUE,...",
+        help="override a fake service profile, e.g. gemini:latency_ms=800,error_rate=0.05 (repeatable)",
+    )
+    parser.add_argument("--text-layer-fraction", type=float, default=0.0, help="share of lease pages with a text layer (skip OCR)")
+    parser.add_argument("--min-words", type=int, default=0, help="pad leases to at least this many words")
+    parser.add_argument("--dataset", default=DATASET_DIR, help="directory of sample .docx agreements")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="", help="vector store, caches and artifacts (default: a new temp directory)")
+    parser.add_argument("--output", default="", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default="", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput change vs the baseline (default 0.2)")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    if not args.concurrency or min(args.concurrency) < 1:
+        parser.error("--concurrency needs positive integers")
+    return args
+
+
+def _isolate_environment(workdir: str) -> None:
+    """Point every store and cache at the work directory (config reads these at import)."""
+    if "config" in sys.modules or "ai.config" in sys.modules:
+        raise SystemExit(
+            "The app's config was imported before the benchmark could set its environment. "
+            "Run it from the ai/ directory: python -m benchmarks.run"
+        )
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vector_store"),
+        "RESULT_CACHE_DIR": os.path.join(workdir, "results"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "CORE_CLAUSES_ARTIFACT_DIR": workdir,
+        "GCS_BUCKET_NAME": "legalsense-benchmark",
+        "PROFILE_TOKEN": "",
+    })
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    array = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "mean": round(float(array.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(array.max()), 4),
+    }
+
+
+async def _drive(send: Callable[[int], Awaitable[Sample]], count: int, concurrency: int) -> Tuple[List[Sample], float]:
+    """Send `count` requests from `concurrency` workers; returns the samples and wall time."""
+    indexes = iter(range(count))
+    samples: List[Sample] = []
+
+    async def worker() -> None:
+        for index in indexes:
+            samples.append(await send(index))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def _process(client: httpx.AsyncClient, lease: SyntheticLease, language: str, audio: bool) -> Sample:
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/process-document",
+        files={"file": (lease.name, lease.pdf, "application/pdf")},
+        data={"language": language, "audio": "true" if audio else "false", "timings": "true"},
+    )
+    seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        return Sample(seconds, response.status_code)
+    body = response.json()
+    return Sample(seconds, 200, body.get("timings") or {}, document_id=body.get("document_id", ""))
+
+
+async def _chat(client: httpx.AsyncClient, document_id: str, query: str, language: str, audio: bool) -> Sample:
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/chat",
+        params={
+            "query": query, "language": language, "document_id": document_id,
+            "audio": "true" if audio else "false", "timings": "true",
+        },
+    )
+    seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        return Sample(seconds, response.status_code)
+    body = response.json()
+    return Sample(seconds, 200, body.get("timings") or {}, cached=bool(body.get("cached")))
+
+
+def _summarize(samples: List[Sample], wall: float, with_cached: bool = False) -> Dict[str, Any]:
+    ok = [sample for sample in samples if sample.status == 200]
+    stages: Dict[str, List[float]] = {}
+    for sample in ok:
+        for stage, seconds in sample.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    summary: Dict[str, Any] = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall > 0 else 0.0,
+        "latency_s": _percentiles([sample.seconds for sample in ok]),
+        "stages_s": {stage: _percentiles(values) for stage, values in stages.items()},
+    }
+    if with_cached:
+        summary["cached_rate"] = round(sum(sample.cached for sample in ok) / len(ok), 3) if ok else 0.0
+    return summary
+
+
+def _service_delta(after: Dict[str, Dict[str, Any]], before: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    delta: Dict[str, Dict[str, Any]] = {}
+    for name, stats in after.items():
+        old = before.get(name, {})
+        values = {key: round(value - old.get(key, 0), 3) for key, value in stats.items()}
+        if values["calls"]:
+            delta[name] = values
+    return delta
+
+
+async def _run(args: argparse.Namespace, fakes: Any, app: Any) -> Dict[str, Any]:
+    documents = read_dataset(args.dataset)
+    rng = random.Random(args.seed)
+    lease_options = {"text_layer_fraction": args.text_layer_fraction, "min_words": args.min_words}
+    made = 0
+
+    def leases(count: int) -> List[SyntheticLease]:
+        # Numbered across levels, so no upload repeats an earlier one (no result cache hits)
+        nonlocal made
+        batch = synthetic_leases(count, args.seed, made, documents, **lease_options)
+        made += count
+        return batch
+
+    levels: List[Dict[str, Any]] = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for lease in leases(args.warmup):
+                warm = await _process(client, lease, args.language, args.audio)
+                if warm.document_id:
+                    await _chat(client, warm.document_id, rng.choice(QUESTIONS), args.language, args.audio)
+
+            for concurrency in args.concurrency:
+                before = fakes.stats()
+                batch = leases(max(args.documents, concurrency))
+                processed, process_wall = await _drive(
+                    lambda i: _process(client, batch[i], args.language, args.audio), len(batch), concurrency
+                )
+                document_ids = [sample.document_id for sample in processed if sample.document_id]
+                chats: List[Sample] = []
+                chat_wall = 0.0
+                if document_ids:
+                    questions = [(rng.choice(document_ids), rng.choice(QUESTIONS)) for _ in range(max(args.chats, concurrency))]
+                    chats, chat_wall = await _drive(
+                        lambda i: _chat(client, questions[i][0], questions[i][1], args.language, args.audio),
+                        len(questions), concurrency,
+                    )
+                levels.append({
+                    "concurrency": concurrency,
+                    "process_document": _summarize(processed, process_wall),
+                    "chat": _summarize(chats, chat_wall, with_cached=True),
+                    "services": _service_delta(fakes.stats(), before),
+                })
+                _print_level(levels[-1])
+
+            health = (await client.get("/healthz")).json()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "documents": args.documents,
+            "chats": args.chats,
+            "warmup": args.warmup,
+            "language": args.language,
+            "audio": args.audio,
+            "latency_scale": args.latency_scale,
+            "seed": args.seed,
+            "leases": lease_options,
+            "services": fakes.describe(),
+        },
+        "levels": levels,
+        "healthz": health,
+    }
+
+
+def _print_level(level: Dict[str, Any]) -> None:
+    parts = [f"concurrency {level['concurrency']:>3}"]
+    for endpoint in ("process_document", "chat"):
+        summary = level[endpoint]
+        latency = summary["latency_s"]
+        parts.append(
+            f"{endpoint}: {summary['throughput_rps']:.2f} req/s, p50 {latency['p50']:.3f}s, "
+            f"p95 {latency['p95']:.3f}s, p99 {latency['p99']:.3f}s, {summary['errors']} errors"
+        )
+    print(" | ".join(parts), file=sys.stderr)
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of p95 latency, throughput or errors against a baseline report."""
+    regressions: List[str] = []
+    old_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        old_level = old_levels.get(level["concurrency"])
+        if old_level is None:
+            continue
+        for endpoint in ("process_document", "chat"):
+            new, old = level[endpoint], old_level.get(endpoint, {})
+            label = f"{endpoint} @ concurrency {level['concurrency']}"
+            old_p95 = old.get("latency_s", {}).get("p95", 0.0)
+            if old_p95 > 0 and new["latency_s"]["p95"] > old_p95 * (1 + tolerance):
+                regressions.append(f"{label}: p95 {old_p95:.3f}s -> {new['latency_s']['p95']:.3f}s")
+            old_rps = old.get("throughput_rps", 0.0)
+            if old_rps > 0 and new["throughput_rps"] < old_rps * (1 - tolerance):
+                regressions.append(f"{label}: throughput {old_rps:.2f} -> {new['throughput_rps']:.2f} req/s")
+            if new["errors"] > old.get("errors", 0):
+                regressions.append(f"{label}: errors {old.get('errors', 0)} -> {new['errors']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="legalsense-benchmark-")
+    _isolate_environment(workdir)
+
+    # Imported after the environment is set: config reads it at import time
+    from .fakes import FakeServices, parse_profile_overrides
+    try:
+        from ..init import app
+    except ImportError:
+        from init import app
+
+    fakes = FakeServices(parse_profile_overrides(args.service), args.latency_scale, args.seed)
+    fakes.install()
+    # The app logs with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(_run(args, fakes, app))
+    report["workdir"] = workdir
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_reports(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,90 +1,270 @@
-"""
-Central place for application settings.
-
-Non-technical summary:
-- We read values from a local .env file (not committed) so you can configure the app
-	without touching code (project IDs, regions, models, and simple toggles).
-- Sensible defaults are provided, but you should set real values in .env.
-"""
-
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Google Cloud settings (fill these in your .env)
-PROJECT_ID = os.getenv("GCP_PROJECT_ID", "your-gcp-project-id")
-# Region used for Google AI services
-LOCATION = os.getenv("GCP_LOCATION", "us-central1")
-# Document AI region: multi-region values like "us" or "eu"
-DOCAI_LOCATION = os.getenv("DOCAI_LOCATION", "us")
-PROCESSOR_ID = os.getenv("DOCAI_PROCESSOR_ID", "your-docai-processor-id")
-BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "your-gcs-bucket-name")
-
-# AI models
-# Embeddings model used to convert text into vectors for search
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
-
-# Processing settings
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "200"))
-ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "0.65"))
-
-# UI/UX
-# Disclaimer added at the end of summaries and chat answers
-DISCLAIMER_TEXT = os.getenv(
-	"DISCLAIMER_TEXT",
-	"The information provided is for informational purposes only. All responses are AI-generated and may be inaccurate.",
-)
-
-# Prompt templates (customizable via .env)
-# Use placeholders to insert content:
-#  - {context}  -> replaced with joined document chunks
-#  - {question} -> (Q&A only) replaced with the user's question
-DEFAULT_SUMMARY_PROMPT_TEMPLATE = (
-	"You are a meticulous legal analyst tasked with demystifying a rental agreement. "
-	"Work ONLY with the provided document excerpts. Do not invent facts or rely on outside knowledge.\n\n"
-	"Goals:\n"
-	"- Produce a clear, plain-language summary suitable for a non-lawyer.\n"
-	"- Extract concrete facts (names, dates, amounts, addresses) exactly as written.\n"
-	"- Highlight obligations of each party, fees/penalties, and key risks.\n"
-	"- Note any sections that are not specified in the excerpts.\n\n"
-	"Output format (use short bullets, keep it crisp):\n"
-	"- Title: Plain-language Summary\n"
-	"- Parties & Property: ...\n"
-	"- Financial Terms (amounts, frequency, due dates, deposits): ...\n"
-	"- Term & Termination (start/end, notice, renewal): ...\n"
-	"- Obligations (landlord vs tenant): ...\n"
-	"- Restrictions/Usage rules: ...\n"
-	"- Maintenance/Repairs: ...\n"
-	"- Penalties/Liability/Indemnity: ...\n"
-	"- Notices & Jurisdiction: ...\n"
-	"- Other Material Terms: ...\n"
-	"- Unknown/Not specified: bullet list of important items that are missing from the excerpts.\n\n"
-	"Guidelines:\n"
-	"- Quote numbers/dates/amounts exactly as they appear.\n"
-	"- If a field is missing in the excerpts, write: Not specified in excerpts.\n\n"
-	"Document Excerpts:\n{context}"
-)
-
-DEFAULT_QA_PROMPT_TEMPLATE = (
-	"You are an expert legal assistant. Answer the user's question strictly and ONLY from the provided document excerpts.\n"
-	"If the answer is not present in the text, reply exactly: \"I cannot answer this question based on the document.\"\n\n"
-	"Instructions:\n"
-	"- Be concise and precise; quote exact amounts/dates/names when relevant.\n"
-	"- If only partial information is available, state what is known and note what is not specified in the excerpts.\n"
-	"- Do not speculate or use outside knowledge.\n\n"
-	"User question: {question}\n\n"
-	"Document excerpts:\n{context}"
-)
-
-# Support writing multi-line prompts in .env using \n escapes
-SUMMARY_PROMPT_TEMPLATE = os.getenv(
-	"SUMMARY_PROMPT_TEMPLATE",
-	DEFAULT_SUMMARY_PROMPT_TEMPLATE,
-).replace("\\n", "\n")
-
-QA_PROMPT_TEMPLATE = os.getenv(
-	"QA_PROMPT_TEMPLATE",
-	DEFAULT_QA_PROMPT_TEMPLATE,
-).replace("\\n", "\n")
\ No newline at end of file
+"""
+Central place for application settings.
+
+Non-technical summary:
+- We read values from a local .env file (not committed) so you can configure the app
+	without touching code (project IDs, regions, models, and simple toggles).
+- Sensible defaults are provided, but you should set real values in .env.
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Google Cloud settings (fill these in your .env)
+PROJECT_ID = os.getenv("GCP_PROJECT_ID", "your-gcp-project-id")
+# Region used for Google AI services
+LOCATION = os.getenv("GCP_LOCATION", "us-central1")
+# Document AI region: multi-region values like "us" or "eu"
+DOCAI_LOCATION = os.getenv("DOCAI_LOCATION", "us")
+PROCESSOR_ID = os.getenv("DOCAI_PROCESSOR_ID", "your-docai-processor-id")
+BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "your-gcs-bucket-name")
+
+# AI models
+# Embeddings model used to convert text into vectors for search
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+
+# Gemini models, tried in this order (comma-separated)
+GEMINI_MODELS = [
+	name.strip()
+	for name in os.getenv("GEMINI_MODELS", "gemini-2.5-pro,gemini-2.5-flash,gemini-2.5-flash-lite").split(",")
+	if name.strip()
+]
+# Seconds to wait for one model before moving on to the next. Override per model with
+# GEMINI_MODEL_TIMEOUTS, e.g. "gemini-2.5-pro=20,gemini-2.5-flash=10".
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+GEMINI_MODEL_TIMEOUTS = {
+	name.strip(): float(seconds)
+	for name, _, seconds in (
+		item.partition("=") for item in os.getenv("GEMINI_MODEL_TIMEOUTS", "").split(",") if "=" in item
+	)
+}
+# Upper bound for one generation across all models (the request's deadline)
+GEMINI_DEADLINE_S = float(os.getenv("GEMINI_DEADLINE_S", "60"))
+# Hedged mode: if a model has not answered after this many seconds, start the next model
+# too and use whichever answers first (0 disables hedging)
+GEMINI_HEDGE_DELAY_S = float(os.getenv("GEMINI_HEDGE_DELAY_S", "0"))
+# Circuit breaker: after this many failures in a row a model is skipped for the cool-down
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "3"))
+GEMINI_BREAKER_COOLDOWN_S = float(os.getenv("GEMINI_BREAKER_COOLDOWN_S", "60"))
+# Gemini calls run in their own pool of this many threads (calls we stopped waiting for
+# finish there in the background)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+
+# Embedding cache: vectors are reused for text we have embedded before (same model + text).
+# EMBEDDING_CACHE_PATH is a local SQLite file (empty = memory only); the memory tier is an LRU.
+EMBEDDING_CACHE_PATH = os.getenv(
+	"EMBEDDING_CACHE_PATH",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "embeddings.sqlite3"),
+)
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+
+# Query embeddings: chat questions arriving within QUERY_EMBED_BATCH_WINDOW_MS of each other
+# are embedded in one Vertex AI call (at most QUERY_EMBED_MAX_BATCH texts, and at most
+# QUERY_EMBED_MAX_IN_FLIGHT calls at once). A window of 0 sends each question on its own.
+QUERY_EMBED_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "10"))
+QUERY_EMBED_MAX_BATCH = min(250, int(os.getenv("QUERY_EMBED_MAX_BATCH", "250")))
+QUERY_EMBED_MAX_IN_FLIGHT = int(os.getenv("QUERY_EMBED_MAX_IN_FLIGHT", "4"))
+
+# Chat retrieval: keyword (BM25) and vector rankings of RETRIEVAL_CANDIDATES chunks each are
+# fused (reciprocal rank fusion, constant RETRIEVAL_RRF_K). If the question's embedding is not
+# ready within RETRIEVAL_EMBED_DEADLINE_S, keyword search alone is used.
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_EMBED_DEADLINE_S = float(os.getenv("RETRIEVAL_EMBED_DEADLINE_S", "2"))
+
+# Core clauses
+# Folder holding the precomputed core clause embeddings (core_clauses.npy + manifest).
+# It is generated data, so by default it lives with the other caches, not in the source tree.
+CORE_CLAUSES_ARTIFACT_DIR = os.getenv(
+	"CORE_CLAUSES_ARTIFACT_DIR",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "core_clauses"),
+)
+# How often (seconds) to check the artifact/normal_data.py for changes; 0 disables hot reload
+CORE_CLAUSES_RELOAD_INTERVAL_S = float(os.getenv("CORE_CLAUSES_RELOAD_INTERVAL_S", "30"))
+
+# Whole-upload result cache (keyed by SHA-256 of the file): folder and size cap in bytes.
+# Leave RESULT_CACHE_DIR empty to disable.
+RESULT_CACHE_DIR = os.getenv(
+	"RESULT_CACHE_DIR",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results"),
+)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Audio: made during /api/process-document and /api/chat only if EAGER_AUDIO is on or the
+# request sets audio=true; otherwise clients fetch it from /api/audio/{id} when needed.
+# AUDIO_TEXT_ITEMS bounds how many summary/answer texts are remembered for that.
+EAGER_AUDIO = os.getenv("EAGER_AUDIO", "false").strip().lower() in ("1", "true", "yes")
+AUDIO_TEXT_ITEMS = int(os.getenv("AUDIO_TEXT_ITEMS", "10000"))
+
+# Chat answer cache (per document): the same question, or one whose query embedding has at
+# least ANSWER_CACHE_SIMILARITY cosine similarity to a cached question, reuses the answer.
+# ANSWER_CACHE_ITEMS=0 disables it.
+ANSWER_CACHE_ITEMS = int(os.getenv("ANSWER_CACHE_ITEMS", "5000"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+# Text-to-Speech: how many chunks of one text are synthesised at the same time
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+
+# Translation cache: how many translated segments (per text hash + language) to keep in memory
+TRANSLATION_CACHE_ITEMS = int(os.getenv("TRANSLATION_CACHE_ITEMS", "5000"))
+
+# Processing settings
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "200"))
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "0.65"))
+
+# OCR
+# PDF pages with at least this many characters in their embedded text layer are read
+# locally; the rest are sent to Document AI in page ranges of OCR_PAGES_PER_REQUEST
+# (online processing limit), at most OCR_MAX_CONCURRENCY requests at a time.
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", "20"))
+OCR_PAGES_PER_REQUEST = int(os.getenv("OCR_PAGES_PER_REQUEST", "15"))
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+
+# Job mode (/api/jobs/process-document)
+# JOB_WORKERS documents are processed at once, independently of HTTP concurrency. At most
+# JOB_QUEUE_MAX_DEPTH jobs wait; beyond that new jobs get 503 with Retry-After immediately.
+# Finished jobs can be fetched for JOB_RESULT_TTL_S seconds.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "20"))
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+JOB_RETRY_AFTER_S = int(os.getenv("JOB_RETRY_AFTER_S", "10"))
+
+# Concurrency
+# Upper bound on threads used for blocking Google SDK calls (OCR, embeddings, Gemini, etc.)
+MAX_BLOCKING_WORKERS = int(os.getenv("MAX_BLOCKING_WORKERS", "16"))
+# Seconds to wait for each Google client's connection to open during startup warm-up.
+# Warm-up runs in the background; after CLIENT_WARMUP_DEADLINE_S it is reported as timed
+# out on /healthz (clients not ready by then are created on first use).
+CLIENT_WARMUP_TIMEOUT_S = float(os.getenv("CLIENT_WARMUP_TIMEOUT_S", "5"))
+CLIENT_WARMUP_DEADLINE_S = float(os.getenv("CLIENT_WARMUP_DEADLINE_S", "10"))
+
+# Profiling of single requests: send "X-Profile-Token: <PROFILE_TOKEN>" or arm the next N
+# requests with POST /admin/profiling?count=N (same header). Empty token = profiling off.
+# Profiles (pyinstrument HTML if installed, else cProfile .prof) are saved in PROFILE_DIR.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv(
+	"PROFILE_DIR",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"),
+)
+PROFILE_PATHS = [
+	path.strip()
+	for path in os.getenv("PROFILE_PATHS", "/api/process-document,/api/chat").split(",")
+	if path.strip()
+]
+
+# Vector store
+# Folder where processed documents (FAISS index + chunk text) are saved so they survive
+# restarts. Set to an empty value to keep everything in memory only.
+VECTOR_STORE_DIR = os.getenv(
+	"VECTOR_STORE_DIR",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "vector_store"),
+)
+# Memory budget for loaded documents (vectors, chunk text and keyword index; 0 = unlimited).
+# Over budget, the least recently used documents are unloaded: saved ones are reopened from
+# VECTOR_STORE_DIR on next use, memory-only ones are dropped. DOCUMENT_TTL_S > 0 removes
+# documents unused for that long from memory and disk (a re-upload restores them from the
+# result cache).
+DOCUMENT_MEMORY_MAX_BYTES = int(os.getenv("DOCUMENT_MEMORY_MAX_BYTES", str(512 * 1024 * 1024)))
+DOCUMENT_TTL_S = float(os.getenv("DOCUMENT_TTL_S", "0"))
+# Vectors are normalized and compared by cosine (inner product). Documents with at least
+# ANN_MIN_VECTORS chunks get an approximate index built in the background (0 disables).
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "20000"))
+# "hnsw" (no training, best recall) or "ivf" (smaller, trained in the background)
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "hnsw").strip().lower()
+ANN_HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+ANN_HNSW_EF_CONSTRUCTION = int(os.getenv("ANN_HNSW_EF_CONSTRUCTION", "80"))
+# Higher = better recall, slower search
+ANN_HNSW_EF_SEARCH = int(os.getenv("ANN_HNSW_EF_SEARCH", "64"))
+ANN_IVF_NPROBE = int(os.getenv("ANN_IVF_NPROBE", "16"))
+
+# UI/UX
+# Disclaimer added at the end of summaries and chat answers
+DISCLAIMER_TEXT = os.getenv(
+	"DISCLAIMER_TEXT",
+	"The information provided is for informational purposes only. All responses are AI-generated and may be inaccurate.",
+)
+
+# Prompt templates (customizable via .env)
+# Use placeholders to insert content:
+#  - {context}  -> replaced with joined document chunks
+#  - {question} -> (Q&A only) replaced with the user's question
+DEFAULT_SUMMARY_PROMPT_TEMPLATE = (
+	"You are a meticulous legal analyst tasked with demystifying a rental agreement. "
+	"Work ONLY with the provided document excerpts. Do not invent facts or rely on outside knowledge.\n\n"
+	"Goals:\n"
+	"- Produce a clear, plain-language summary suitable for a non-lawyer.\n"
+	"- Extract concrete facts (names, dates, amounts, addresses) exactly as written.\n"
+	"- Highlight obligations of each party, fees/penalties, and key risks.\n"
+	"- Note any sections that are not specified in the excerpts.\n\n"
+	"Output format (use short bullets, keep it crisp):\n"
+	"- Title: Plain-language Summary\n"
+	"- Parties & Property: ...\n"
+	"- Financial Terms (amounts, frequency, due dates, deposits): ...\n"
+	"- Term & Termination (start/end, notice, renewal): ...\n"
+	"- Obligations (landlord vs tenant): ...\n"
+	"- Restrictions/Usage rules: ...\n"
+	"- Maintenance/Repairs: ...\n"
+	"- Penalties/Liability/Indemnity: ...\n"
+	"- Notices & Jurisdiction: ...\n"
+	"- Other Material Terms: ...\n"
+	"- Unknown/Not specified: bullet list of important items that are missing from the excerpts.\n\n"
+	"Guidelines:\n"
+	"- Quote numbers/dates/amounts exactly as they appear.\n"
+	"- If a field is missing in the excerpts, write: Not specified in excerpts.\n\n"
+	"Document Excerpts:\n{context}"
+)
+
+DEFAULT_QA_PROMPT_TEMPLATE = (
+	"You are an expert legal assistant. Answer the user's question strictly and ONLY from the provided document excerpts.\n"
+	"If the answer is not present in the text, reply exactly: \"I cannot answer this question based on the document.\"\n\n"
+	"Instructions:\n"
+	"- Be concise and precise; quote exact amounts/dates/names when relevant.\n"
+	"- If only partial information is available, state what is known and note what is not specified in the excerpts.\n"
+	"- Do not speculate or use outside knowledge.\n\n"
+	"User question: {question}\n\n"
+	"Document excerpts:\n{context}"
+)
+
+# Long-document mode: each group of excerpts is first condensed into notes with this
+# template ({context}, plus {part} and {parts} for its position), then the notes are
+# summarised with SUMMARY_PROMPT_TEMPLATE.
+DEFAULT_MAP_SUMMARY_PROMPT_TEMPLATE = (
+	"You are reading part {part} of {parts} of a rental agreement. "
+	"Work ONLY with the provided excerpts. Do not invent facts or rely on outside knowledge.\n\n"
+	"Write compact bullet notes of everything in this part that matters for a plain-language summary:\n"
+	"- Parties, property, and dates\n"
+	"- Amounts, frequencies, deposits, fees and penalties (quote them exactly)\n"
+	"- Term, renewal, termination and notice periods\n"
+	"- Obligations and restrictions for each party, maintenance/repairs\n"
+	"- Liability, indemnity, notices, jurisdiction and any other material terms\n"
+	"Skip boilerplate with no concrete content. If this part has nothing material, write: No material terms.\n\n"
+	"Excerpts:\n{context}"
+)
+
+# Support writing multi-line prompts in .env using \n escapes
+SUMMARY_PROMPT_TEMPLATE = os.getenv(
+	"SUMMARY_PROMPT_TEMPLATE",
+	DEFAULT_SUMMARY_PROMPT_TEMPLATE,
+).replace("\\n", "\n")
+
+QA_PROMPT_TEMPLATE = os.getenv(
+	"QA_PROMPT_TEMPLATE",
+	DEFAULT_QA_PROMPT_TEMPLATE,
+).replace("\\n", "\n")
+
+MAP_SUMMARY_PROMPT_TEMPLATE = os.getenv(
+	"MAP_SUMMARY_PROMPT_TEMPLATE",
+	DEFAULT_MAP_SUMMARY_PROMPT_TEMPLATE,
+).replace("\\n", "\n")
+
+# Summaries: documents up to SUMMARY_SINGLE_CALL_CHARS characters are summarised in one
+# call. Longer ones are split into groups of at most SUMMARY_GROUP_CHARS characters that
+# are condensed concurrently (at most SUMMARY_MAX_CONCURRENCY at a time across all documents)
+# and then combined.
+SUMMARY_SINGLE_CALL_CHARS = int(os.getenv("SUMMARY_SINGLE_CALL_CHARS", "8000"))
+SUMMARY_GROUP_CHARS = int(os.getenv("SUMMARY_GROUP_CHARS", "24000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
\ No newline at end of file
@@ -1,112 +1,282 @@
-"""
-App startup and health checks.
-
-What this does in simple terms:
-- Prepares the AI system when the app starts (loads standard/core clauses and turns them into vectors).
-- Keeps a small in-memory store for text pieces and their vectors so we can search quickly.
-- Exposes a /healthz endpoint to show if the app is ready.
-"""
-import faiss
-import os
-import time
-try:
-    from .normal_data import CORE_CLAUSES  # package import
-    from .utils.embedding_utils import get_embeddings
-except Exception:
-    from normal_data import CORE_CLAUSES  # local import when run as module from ai/
-    from utils.embedding_utils import get_embeddings
-
-from fastapi import FastAPI
-from contextlib import asynccontextmanager
-
-# Utility modules are imported by processor_app where needed; keep init lean
-
-from typing import Dict, Any
-
-# A dictionary to hold our application state, including the vector store
-app_state: Dict[str, Any] = {}
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """
-    Runs once when the server starts, then once again on shutdown.
-    Here we compute embeddings (numeric vectors) for the known core clauses
-    and set up a shared state dictionary (app_state) that other endpoints use.
-    """
-    print("AI Backend starting up...")
-    # 1. Generate and store embeddings for the core clauses
-    print(f"Generating embeddings for {len(CORE_CLAUSES)} core clauses...")
-    try:
-        if CORE_CLAUSES:
-            # Get the text of all core clauses
-            core_clause_texts = list(CORE_CLAUSES.values())
-            # Get the embeddings for all of them in a single API call
-            embeddings = get_embeddings(core_clause_texts)
-            # Create a dictionary that maps each clause name to its corresponding embedding
-            app_state["core_embeddings"] = {name: emb for name, emb in zip(CORE_CLAUSES.keys(), embeddings)}
-            print("Core clause embeddings are ready!")
-        else:
-            app_state["core_embeddings"] = {}
-            print("No core clauses found. Skipping core embeddings generation.")
-    except Exception as e:
-        # Start in degraded mode if credentials/APIs are not configured yet
-        app_state["core_embeddings"] = {}
-        print(f"Warning: Failed to generate core embeddings at startup: {e}")
-    
-    # Record startup time for health checks
-    app_state["startup_time"] = time.time()
-
-    # Initialize app state. Vector store is created later when the first document is processed.
-    app_state["faiss_index"] = None
-    app_state["chunks"] = []
-    
-     # Placeholder for a bucket name for audio files
-    app_state["bucket_name"] = os.getenv("GCS_BUCKET_NAME", "your-gcs-bucket-name")
-    
-    print("AI Backend is ready to process documents!")
-    yield
-    print("AI Backend is shutting down...")
-
-# Main FastAPI application instance
-app = FastAPI(title="LegalSense AI Backend", lifespan=lifespan)
-
-@app.get("/")
-def root():
-    return {"message": "LegalSense AI Backend is running"}
-
-@app.get("/healthz")
-def healthz():
-    """Lightweight health check with no external calls."""
-    now = time.time()
-    startup = app_state.get("startup_time", now)
-    uptime_seconds = round(max(0.0, now - startup), 2)
-
-    faiss_ok = app_state.get("faiss_index") is not None
-    doc_chunks = app_state.get("chunks", []) or []
-
-    creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-    creds_set = bool(creds_path)
-    creds_exists = bool(creds_path and os.path.isfile(creds_path))
-
-    # If we haven't built the index yet, we report "degraded" (still fine to accept uploads)
-    status = "ok" if faiss_ok else "degraded"
-
-    return {
-        "status": status,
-        "uptime_seconds": uptime_seconds,
-        "vector_store": {
-            "faiss_index_initialized": faiss_ok,
-            "document_chunks_count": len(doc_chunks),
-        },
-        "env": {
-            "GOOGLE_APPLICATION_CREDENTIALS_set": creds_set,
-            "GOOGLE_APPLICATION_CREDENTIALS_exists": creds_exists,
-        },
-    }
-
-# Import API endpoints so they attach to this app instance
-# Place after `app` is defined to avoid circular import issues
-try:
-    from . import processor_app  # noqa: F401
-except Exception:
+"""
+App startup and health checks.
+
+What this does in simple terms:
+- Prepares the AI system when the app starts (loads standard/core clauses and turns them into vectors).
+- Keeps a small in-memory store for text pieces and their vectors so we can search quickly.
+- Exposes a /healthz endpoint to show if the app is ready.
+"""
+import asyncio
+import os
+import time
+try:
+    from .normal_data import CORE_CLAUSES  # package import
+    from .utils.embedding_utils import get_embedding_cache_stats, close_embedding_cache
+    from .utils.embedding_utils import get_query_batcher_stats, shutdown_query_batcher
+    from .utils.translation_utils import get_translation_stats
+    from .utils.core_clause_utils import load_core_clause_embeddings, publish_core_clauses, watch_core_clauses
+    from .utils.concurrency_utils import run_blocking, shutdown_executor
+    from .utils.ocr_utils import shutdown_ocr_executor
+    from .utils.tts_utils import shutdown_tts_executor
+    from .utils.summarizer_utils import get_gemini_stats, shutdown_gemini_executor, shutdown_summary_executor
+    from .utils.client_registry import warm_up_clients, close_clients
+    from .utils.vectorstore_utils import DocumentStore
+    from .utils.lexical_index import get_lexical_stats
+    from .utils.result_cache import DocumentResultCache
+    from .utils.job_queue import JobQueue
+    from .utils.audio_registry import AudioRegistry
+    from .utils.metrics import MetricsMiddleware, bind_app_state, render_metrics, METRICS_CONTENT_TYPE
+    from .utils.profiling import RequestProfiler, ProfilingMiddleware
+    from .utils.answer_cache import AnswerCache
+    from .config import VECTOR_STORE_DIR, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+    from .config import DOCUMENT_MEMORY_MAX_BYTES, DOCUMENT_TTL_S
+    from .config import PROFILE_TOKEN, PROFILE_DIR, PROFILE_PATHS
+    from .config import JOB_WORKERS, JOB_QUEUE_MAX_DEPTH, JOB_RESULT_TTL_S, AUDIO_TEXT_ITEMS
+    from .config import ANSWER_CACHE_ITEMS, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIMILARITY
+    from .config import CLIENT_WARMUP_DEADLINE_S
+except Exception:
+    from normal_data import CORE_CLAUSES  # local import when run as module from ai/
+    from utils.embedding_utils import get_embedding_cache_stats, close_embedding_cache
+    from utils.embedding_utils import get_query_batcher_stats, shutdown_query_batcher
+    from utils.translation_utils import get_translation_stats
+    from utils.core_clause_utils import load_core_clause_embeddings, publish_core_clauses, watch_core_clauses
+    from utils.concurrency_utils import run_blocking, shutdown_executor
+    from utils.ocr_utils import shutdown_ocr_executor
+    from utils.tts_utils import shutdown_tts_executor
+    from utils.summarizer_utils import get_gemini_stats, shutdown_gemini_executor, shutdown_summary_executor
+    from utils.client_registry import warm_up_clients, close_clients
+    from utils.vectorstore_utils import DocumentStore
+    from utils.lexical_index import get_lexical_stats
+    from utils.result_cache import DocumentResultCache
+    from utils.job_queue import JobQueue
+    from utils.audio_registry import AudioRegistry
+    from utils.metrics import MetricsMiddleware, bind_app_state, render_metrics, METRICS_CONTENT_TYPE
+    from utils.profiling import RequestProfiler, ProfilingMiddleware
+    from utils.answer_cache import AnswerCache
+    from config import VECTOR_STORE_DIR, RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+    from config import DOCUMENT_MEMORY_MAX_BYTES, DOCUMENT_TTL_S
+    from config import PROFILE_TOKEN, PROFILE_DIR, PROFILE_PATHS
+    from config import JOB_WORKERS, JOB_QUEUE_MAX_DEPTH, JOB_RESULT_TTL_S, AUDIO_TEXT_ITEMS
+    from config import ANSWER_CACHE_ITEMS, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIMILARITY
+    from config import CLIENT_WARMUP_DEADLINE_S
+
+from fastapi import FastAPI, Header, HTTPException, Response
+from contextlib import asynccontextmanager
+
+# Utility modules are imported by processor_app where needed; keep init lean
+
+from typing import Dict, Any
+
+# A dictionary to hold our application state, including the vector store
+app_state: Dict[str, Any] = {}
+
+
+async def warm_up_in_background(state: Dict[str, Any]) -> None:
+    """Open the Google clients without holding up startup; progress is shown on /healthz."""
+    started = time.monotonic()
+    warm_up = state["warm_up"]
+    try:
+        await asyncio.wait_for(run_blocking(warm_up_clients), CLIENT_WARMUP_DEADLINE_S)
+        warm_up["status"] = "done"
+    except asyncio.TimeoutError:
+        # The thread carries on; whatever it has not opened yet is created on first use
+        warm_up["status"] = "timed_out"
+        print(f"Warning: client warm-up did not finish within {CLIENT_WARMUP_DEADLINE_S}s")
+    except Exception as e:
+        warm_up["status"] = "failed"
+        warm_up["error"] = str(e)
+        print(f"Warning: client warm-up failed: {e}")
+    warm_up["seconds"] = round(time.monotonic() - started, 2)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs once when the server starts, then once again on shutdown.
+    Here we load embeddings (numeric vectors) for the known core clauses
+    and set up a shared state dictionary (app_state) that other endpoints use.
+    """
+    print("AI Backend starting up...")
+    # 0. Create shared Google clients once and open their connections, in the background
+    #    so a slow or unreachable Google endpoint does not delay startup
+    app_state["warm_up"] = {"status": "running", "seconds": None, "error": None}
+    warm_up_task = asyncio.create_task(warm_up_in_background(app_state))
+
+    # 1. Load embeddings for the core clauses from the precomputed artifact
+    #    (only new/changed clauses, or a missing/stale artifact, need the embeddings API)
+    print(f"Loading embeddings for {len(CORE_CLAUSES)} core clauses...")
+    try:
+        if CORE_CLAUSES:
+            core_embeddings, info = await run_blocking(load_core_clause_embeddings, CORE_CLAUSES)
+            # A dictionary that maps each clause name to its corresponding embedding,
+            # plus a detector holding them as one pre-normalized matrix
+            publish_core_clauses(app_state, core_embeddings)
+            print(
+                f"Core clause embeddings are ready! "
+                f"({info['from_artifact']} from artifact, {info['embedded']} embedded)"
+            )
+            app_state["core_clauses_missing"] = info["missing"]
+            if info["missing"]:
+                print(f"Warning: {len(info['missing'])} core clauses are not loaded yet: {', '.join(info['missing'])}")
+        else:
+            publish_core_clauses(app_state, {})
+            print("No core clauses found. Skipping core embeddings generation.")
+    except Exception as e:
+        # Start in degraded mode if credentials/APIs are not configured yet
+        publish_core_clauses(app_state, {})
+        print(f"Warning: Failed to generate core embeddings at startup: {e}")
+    
+    # Record startup time for health checks
+    app_state["startup_time"] = time.time()
+
+    # Initialize app state. Each processed document gets its own namespace in the store.
+    # Documents saved by earlier runs are registered now and memory-mapped on first use;
+    # least recently used documents are unloaded again when over the memory budget.
+    store = DocumentStore(VECTOR_STORE_DIR, DOCUMENT_MEMORY_MAX_BYTES, DOCUMENT_TTL_S)
+    try:
+        restored = await run_blocking(store.load_from_disk)
+        if restored:
+            print(f"Restored {restored} documents from {VECTOR_STORE_DIR}")
+    except Exception as e:
+        print(f"Warning: failed to load saved documents: {e}")
+    app_state["document_store"] = store
+
+    # Results of earlier uploads (by file hash) so a re-upload skips OCR/embeddings/Gemini
+    app_state["result_cache"] = None
+    if RESULT_CACHE_DIR:
+        try:
+            app_state["result_cache"] = DocumentResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+        except Exception as e:
+            print(f"Warning: result cache disabled: {e}")
+
+    # Summaries/answers that can be voiced later on request (/api/audio/{id})
+    app_state["audio_registry"] = AudioRegistry(AUDIO_TEXT_ITEMS)
+
+    # Chat answers per document, reused for repeated or reworded questions
+    app_state["answer_cache"] = AnswerCache(ANSWER_CACHE_ITEMS, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIMILARITY)
+
+    # Background workers for job mode: a bounded queue, separate from HTTP concurrency
+    job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_MAX_DEPTH, JOB_RESULT_TTL_S)
+    job_queue.start()
+    app_state["job_queue"] = job_queue
+
+    # /metrics reads store and queue sizes from app_state when scraped
+    bind_app_state(app_state)
+
+    # Reload core clauses when the artifact or normal_data.py changes (no restart needed)
+    core_clause_watcher = asyncio.create_task(watch_core_clauses(app_state))
+    
+     # Placeholder for a bucket name for audio files
+    app_state["bucket_name"] = os.getenv("GCS_BUCKET_NAME", "your-gcs-bucket-name")
+    
+    print("AI Backend is ready to process documents!")
+    yield
+    print("AI Backend is shutting down...")
+    core_clause_watcher.cancel()
+    warm_up_task.cancel()
+    await job_queue.stop()
+    shutdown_query_batcher(wait=False)
+    shutdown_executor(wait=False)
+    shutdown_ocr_executor(wait=False)
+    shutdown_tts_executor(wait=False)
+    shutdown_gemini_executor(wait=False)
+    shutdown_summary_executor(wait=False)
+    close_clients()
+    app_state["document_store"].close()
+    close_embedding_cache()
+
+# Main FastAPI application instance
+app = FastAPI(title="LegalSense AI Backend", lifespan=lifespan)
+# Counts in-flight requests and times each one per route for /metrics
+app.add_middleware(MetricsMiddleware)
+# Runs single requests under a profiler on demand (X-Profile-Token header or /admin/profiling)
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_TOKEN, PROFILE_PATHS)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+@app.get("/")
+def root():
+    return {"message": "LegalSense AI Backend is running"}
+
+@app.get("/healthz")
+def healthz():
+    """Lightweight health check with no external calls."""
+    now = time.time()
+    startup = app_state.get("startup_time", now)
+    uptime_seconds = round(max(0.0, now - startup), 2)
+
+    store = app_state.get("document_store")
+    documents_count = len(store) if store is not None else 0
+    faiss_ok = documents_count > 0
+    result_cache = app_state.get("result_cache")
+    job_queue = app_state.get("job_queue")
+    audio_registry = app_state.get("audio_registry")
+    answer_cache = app_state.get("answer_cache")
+
+    creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    creds_set = bool(creds_path)
+    creds_exists = bool(creds_path and os.path.isfile(creds_path))
+
+    # If we haven't built the index yet, we report "degraded" (still fine to accept uploads)
+    status = "ok" if faiss_ok else "degraded"
+
+    return {
+        "status": status,
+        "uptime_seconds": uptime_seconds,
+        "vector_store": {
+            "faiss_index_initialized": faiss_ok,
+            "documents_count": documents_count,
+            "document_chunks_count": store.total_chunks() if store is not None else 0,
+            # Estimated bytes of loaded documents, unloads over the memory budget and TTL removals
+            **(store.memory_stats() if store is not None else {}),
+            # Keyword index build/query times, and chat searches that had to go without embeddings
+            "lexical": {
+                **get_lexical_stats(),
+                "lexical_only_searches": store.lexical_only_searches if store is not None else 0,
+            },
+        },
+        # Google client warm-up: running, done, timed_out or failed
+        "warm_up": app_state.get("warm_up"),
+        # Clauses in use, and new/changed ones the embeddings API could not embed yet
+        "core_clauses": {
+            "loaded": len(app_state.get("core_embeddings") or {}),
+            "missing": app_state.get("core_clauses_missing", []),
+        },
+        # Cache counters show how many embedding API calls (and how much latency) we saved
+        "embedding_cache": get_embedding_cache_stats(),
+        # Concurrent chat questions embedded per Vertex AI call, and how long they waited
+        "query_embeddings": get_query_batcher_stats(),
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "translation": get_translation_stats(),
+        "audio": audio_registry.stats() if audio_registry is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "jobs": job_queue.stats() if job_queue is not None else None,
+        # Whether on-demand profiling is on, requests still armed and profiles saved
+        "profiling": request_profiler.stats(),
+        # Which Gemini model answered, failures/timeouts/hedges, and circuit breaker state
+        "gemini": get_gemini_stats(),
+        "env": {
+            "GOOGLE_APPLICATION_CREDENTIALS_set": creds_set,
+            "GOOGLE_APPLICATION_CREDENTIALS_exists": creds_exists,
+        },
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: stage and Google service latencies, Gemini outcomes, search, in-flight requests."""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/admin/profiling")
+def arm_profiling(count: int = 1, x_profile_token: str = Header("")):
+    """Profile the next `count` requests to PROFILE_PATHS (0 disarms); needs the profile token."""
+    if not request_profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILE_TOKEN).")
+    if not request_profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token.")
+    request_profiler.arm(count)
+    return {**request_profiler.stats(), "directory": PROFILE_DIR}
+
+# Import API endpoints so they attach to this app instance
+# Place after `app` is defined to avoid circular import issues
+try:
+    from . import processor_app  # noqa: F401
+except Exception:
     import processor_app  # type: ignore  # noqa: F401
\ No newline at end of file
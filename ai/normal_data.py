@@ -1,23 +1,23 @@
-"""
-Auto-generated core clauses from dataset.
-Do not edit manually—re-run generate_core_clauses.py to refresh.
-"""
-
-from typing import Dict
-
-CORE_CLAUSES: Dict[str, str] = {
-    "Entire Agreement": "This Rental Agreement or Residential Lease shall evidence the complete terms and conditions under which the parties whose signatures appear below have agreed.",
-    "Background Recitals": "Whereas the First Party is the Absolute Owner and in possession of the Schedule property Second Party “TENANT” is interested to take the schedule premises on rent and the Owner interested to give the schedule premises on the rent on the following terms and conditions:-.",
-    "Acceptance of Terms": "All the terms and conditions are agreed as stated above.",
-    "Payment of Rent": "Whereas the lessee hereby agreed to pay the said rent to lessor on or before 5th of every English calendar month.",
-    "Title: Term and Extension": "The lease will be for period of 1 l(Eleven) months from the date of this Agreement, but it can be extended by mutual consent.",
-    "Refundable Security Deposit": "The Tenant has deposited with Owner Rs.40, 000 (Forty thousand) as advance and security deposit which the Owner hereby acknowledges the said sum shall carry no interest but refundable to the Tenant on the termination of the tenancy.",
-    "Use and Restrictions": "The tenant shall use the premises only for Residential purpose and shall not use it for any offensive or objectionable purpose and shall not without the written consent of the owner sublet under lease or part with the possession of the premises any whosoever or make any alterations therein.",
-    "Termination by Notice": "This rental agreement can be terminated at any time by three months notice on either side and on such termination the tenant shall surrender the vacant possession of the premises to the Landlord.",
-    "Utility and Maintenance Charges": "The lessee shall pay electricity charges regularly as per the meter reading and also undertake house maintenance and water charges.",
-    "Right of Entry": "Resident(s) specifically agrees to permit the Owner(s) or agent(s) access to the premises for the purposes of inspection, repairs, or to show the property to another person at reasonable hours, on request.",
-    "Title: Security Deposit Application": "The security deposit will be used at the end of the tenancy to compensate the Owner(s) for any damages or unpaid rent or charges, and will be repaired or replaced at Resident(s)’s expense with funds other than the deposit.",
-    "Property Description": "All the piece and parcel of the house premises, 154/2, Ground floor, 9th Cross, Byrasandra Main Road, G M Palya, Bangalore - 560 075.",
-    "Lessor Definition": "Hereinafter called as the “LESSOR” (which expression shall mean and include wherever the context so requires admits his heirs, executors, representatives and assigns) of the ONE PART;.",
-    "Execution of Agreement": "In WITNESS WHEREOF the parties have executed this agreement in the presence of the following witnesses on the day, month and year as first above mentioned.",
-}
+"""
+Auto-generated core clauses from dataset.
+Do not edit manually—re-run generate_core_clauses.py to refresh.
+"""
+
+from typing import Dict
+
+CORE_CLAUSES: Dict[str, str] = {
+    "Entire Agreement": "This Rental Agreement or Residential Lease shall evidence the complete terms and conditions under which the parties whose signatures appear below have agreed.",
+    "Background Recitals": "Whereas the First Party is the Absolute Owner and in possession of the Schedule property Second Party “TENANT” is interested to take the schedule premises on rent and the Owner interested to give the schedule premises on the rent on the following terms and conditions:-.",
+    "Acceptance of Terms": "All the terms and conditions are agreed as stated above.",
+    "Payment of Rent": "Whereas the lessee hereby agreed to pay the said rent to lessor on or before 5th of every English calendar month.",
+    "Title: Term and Extension": "The lease will be for period of 1 l(Eleven) months from the date of this Agreement, but it can be extended by mutual consent.",
+    "Refundable Security Deposit": "The Tenant has deposited with Owner Rs.40, 000 (Forty thousand) as advance and security deposit which the Owner hereby acknowledges the said sum shall carry no interest but refundable to the Tenant on the termination of the tenancy.",
+    "Use and Restrictions": "The tenant shall use the premises only for Residential purpose and shall not use it for any offensive or objectionable purpose and shall not without the written consent of the owner sublet under lease or part with the possession of the premises any whosoever or make any alterations therein.",
+    "Termination by Notice": "This rental agreement can be terminated at any time by three months notice on either side and on such termination the tenant shall surrender the vacant possession of the premises to the Landlord.",
+    "Utility and Maintenance Charges": "The lessee shall pay electricity charges regularly as per the meter reading and also undertake house maintenance and water charges.",
+    "Right of Entry": "Resident(s) specifically agrees to permit the Owner(s) or agent(s) access to the premises for the purposes of inspection, repairs, or to show the property to another person at reasonable hours, on request.",
+    "Title: Security Deposit Application": "The security deposit will be used at the end of the tenancy to compensate the Owner(s) for any damages or unpaid rent or charges, and will be repaired or replaced at Resident(s)’s expense with funds other than the deposit.",
+    "Property Description": "All the piece and parcel of the house premises, 154/2, Ground floor, 9th Cross, Byrasandra Main Road, G M Palya, Bangalore - 560 075.",
+    "Lessor Definition": "Hereinafter called as the “LESSOR” (which expression shall mean and include wherever the context so requires admits his heirs, executors, representatives and assigns) of the ONE PART;.",
+    "Execution of Agreement": "In WITNESS WHEREOF the parties have executed this agreement in the presence of the following witnesses on the day, month and year as first above mentioned.",
+}
@@ -1,200 +1,738 @@
-"""
-HTTP API for processing documents and chatting about their contents.
-
-Plain-language overview:
-- /api/process-document: You upload a PDF or an image. We extract text (OCR), split into pieces,
-  turn them into vectors, search/summarize with AI, detect missing standard clauses, translate, and produce audio.
-- /api/chat: Ask questions about the uploaded document. Answers come only from the document text.
-"""
-import time
-from typing import List, Dict, Any
-import numpy as np
-import faiss
-from fastapi import UploadFile, File, HTTPException, Depends, Form
-from pydantic import BaseModel
-
-try:
-    from .init import app as fastapi_app, app_state
-    from .utils.ocr_utils import extract_text_from_document, extract_text_from_image
-    from .utils.embedding_utils import chunk_text, get_embeddings, get_embedding_for_query
-    from .utils.summarizer_utils import generate_summary, generate_grounded_answer
-    from .utils.translation_utils import translate_text
-    from .utils.tts_utils import generate_audio
-    from .utils.vectorstore_utils import search_vector_store
-    from .utils.anomaly_utils import find_missing_clauses
-except ImportError:
-    from init import app as fastapi_app, app_state  # type: ignore
-    from utils.ocr_utils import extract_text_from_document, extract_text_from_image  # type: ignore
-    from utils.embedding_utils import chunk_text, get_embeddings, get_embedding_for_query  # type: ignore
-    from utils.summarizer_utils import generate_summary, generate_grounded_answer  # type: ignore
-    from utils.translation_utils import translate_text  # type: ignore
-    from utils.tts_utils import generate_audio  # type: ignore
-    from utils.vectorstore_utils import search_vector_store  # type: ignore
-    from utils.anomaly_utils import find_missing_clauses  # type: ignore
-
-# --- Models and Dependencies ---
-
-class ProcessResponse(BaseModel):
-    """Response schema for /api/process-document."""
-    summary: str
-    total_chunks: int
-    processing_time: float
-    audio_url: str
-    translated_summary: str
-    is_suspicious: bool
-    suspicion_note: str
-    
-def get_app_state():
-    """Dependency to access the shared application state."""
-    return app_state
-
-# --- API Endpoints ---
-
-@fastapi_app.post("/api/process-document")
-async def process_document(
-    file: UploadFile = File(...),
-    language: str = Form("en"),
-    state: Dict = Depends(get_app_state)
-):
-    start_time = time.time()
-
-    # 1) OCR: figure out file type and extract text from PDF/image
-    mime_type = file.content_type
-
-    if not mime_type or ('pdf' not in mime_type and 'image' not in mime_type):
-        raise HTTPException(status_code=400, detail="Only PDF and image files are supported.")
-
-    try:
-        # Read file content directly into memory
-        content = await file.read()
-
-        if 'pdf' in mime_type:
-            text = extract_text_from_document(content)
-        else:  # Assumes image
-            text = extract_text_from_image(content)
-
-        if not text:
-            raise HTTPException(status_code=500, detail="Text extraction failed.")
-
-    # 2) RAG pipeline: split text → embed → (later) search
-        chunks = chunk_text(text)
-        embeddings = np.array(get_embeddings(chunks), dtype=np.float32)
-
-    # 3) Missing clause detection: compare document vs. standard/core clauses
-        core_map = state.get("core_embeddings", {}) or {}
-        if core_map:
-            # Convert ndarray to list of lists for typing
-            missing = find_missing_clauses(embeddings.tolist(), core_map)
-        else:
-            missing = []
-
-        is_suspicious = len(missing) > 0
-        suspicion_note = ""
-        if is_suspicious:
-            # Keep the note concise: show up to 5 items, then "+N more"
-            display_limit = 5
-            shown = missing[:display_limit]
-            remaining = max(0, len(missing) - len(shown))
-            missing_list = ", ".join(shown)
-            if remaining > 0:
-                missing_list = f"{missing_list} +{remaining} more"
-            suspicion_note = (
-                f"The following standard clauses appear to be missing from your agreement: {missing_list}. "
-                f"It is advised to consult with a professional legal advisor."
-            )
-
-        # 4) Build or update our in-memory vector store for later chat/search
-        if not state.get("faiss_index"):
-            dim = embeddings.shape[1]
-            state["faiss_index"] = faiss.IndexFlatL2(dim)
-
-        # Add document chunks to our persistent vector store
-        state["faiss_index"].add(embeddings)  # type: ignore[arg-type]
-        state["chunks"].extend(chunks)
-
-    # 5) Generate a summary and translate it if requested
-        relevant_chunks_for_summary = chunks
-        summary = generate_summary(relevant_chunks=relevant_chunks_for_summary)
-        translated_summary = translate_text(summary, language)
-
-        # Translate suspicion note to match translated summary language
-        if suspicion_note:
-            suspicion_note = translate_text(suspicion_note, language)
-
-    # 6) Generate audio (Text-to-Speech) for accessibility
-        audio_url = generate_audio(translated_summary, language=language)
-
-        processing_time = round(time.time() - start_time, 2)
-
-        return ProcessResponse(
-            summary=summary,
-            total_chunks=len(chunks),
-            processing_time=processing_time,
-            audio_url=audio_url,
-            translated_summary=translated_summary,
-            is_suspicious=is_suspicious,
-            suspicion_note=suspicion_note,
-        )
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
-    finally:
-        # No need for file cleanup since we're not using a temporary file
-        pass
-
-@fastapi_app.post("/api/chat")
-async def chat(
-    query: str,
-    language: str = "en",
-    state: Dict = Depends(get_app_state)
-):
-    start_time = time.time()
-    try:
-        if not query:
-            raise HTTPException(status_code=400, detail="Query cannot be empty.")
-            
-    # 1) Turn the user's question into a vector
-        query_embedding = get_embedding_for_query(query)
-        
-        # 0. Ensure vector store has content
-        if not state.get("faiss_index") or not state.get("chunks"):
-            return {
-                "chatbot_response": "No document content is indexed yet. Please process a document first.",
-                "audio_url": "",
-                "translated_response": "No document content is indexed yet. Please process a document first."
-            }
-
-        # 2) Find the most relevant document chunks for this question
-        relevant_chunks = search_vector_store(
-            state["faiss_index"],
-            state["chunks"],
-            query_embedding,
-            top_k=3
-        )
-        
-        if not relevant_chunks:
-            return {
-                "chatbot_response": "I couldn't find relevant information in the document.",
-                "audio_url": "",
-                "translated_response": "I couldn't find relevant information in the document."
-            }
-
-    # 3) Ask the AI to answer based ONLY on those chunks
-        chatbot_response_text = generate_grounded_answer(relevant_chunks, query)
-        translated_response = translate_text(chatbot_response_text, language)
-        audio_url = generate_audio(translated_response, language=language)
-
-        return {
-            "chatbot_response": chatbot_response_text,
-            "audio_url": audio_url,
-            "translated_response": translated_response
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chatbot failed: {str(e)}")
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("__init__:app", host="0.0.0.0", port=8000, reload=True)
-
+"""
+HTTP API for processing documents and chatting about their contents.
+
+Plain-language overview:
+- /api/process-document: You upload a PDF or an image. We extract text (OCR), split into pieces,
+  turn them into vectors, search/summarize with AI, detect missing standard clauses, and translate.
+  Audio is made only if asked for (audio=true), or later via /api/audio/{summary_id}.
+  With stream=ndjson or stream=sse, each stage's result is sent as soon as it is ready.
+- /api/jobs/process-document: Same as above, but answers at once with a job ID; the work runs in a
+  background queue and GET /api/jobs/{job_id} shows the current stage and, when done, the result.
+- /api/chat: Ask questions about an uploaded document (identified by the document_id returned
+  from /api/process-document). Answers come only from that document's text. Repeated or
+  reworded questions about the same document reuse the earlier answer (answer cache).
+- /api/chat/stream: Same question, but the answer is streamed as it is written; the translation
+  and audio follow as separate events (or are skipped if not requested).
+- /api/audio/{text_id}: Audio for a summary_id/answer_id in a given language, made on first request.
+"""
+import asyncio
+import json
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from fastapi import UploadFile, File, HTTPException, Depends, Form, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+try:
+    from .init import app as fastapi_app, app_state
+    from .utils.ocr_utils import extract_text_from_document, extract_text_from_image
+    from .utils.embedding_utils import chunk_text, get_embeddings, get_embedding_for_query
+    from .utils.summarizer_utils import generate_summary, generate_grounded_answer, stream_grounded_answer, NO_ANSWER_TEXT
+    from .utils.translation_utils import translate_text, translate_texts
+    from .utils.tts_utils import generate_audio
+    from .utils.anomaly_utils import ClauseDetector, ClauseMatch
+    from .utils.concurrency_utils import run_blocking, iterate_blocking
+    from .utils.result_cache import content_hash
+    from .utils.job_queue import PipelineProgress, JobQueueFull
+    from .utils.metrics import observe_stage, CHAT_STAGE_SECONDS, PIPELINE_SECONDS
+    from .config import JOB_RETRY_AFTER_S, EAGER_AUDIO, RETRIEVAL_EMBED_DEADLINE_S
+except ImportError:
+    from init import app as fastapi_app, app_state  # type: ignore
+    from utils.ocr_utils import extract_text_from_document, extract_text_from_image  # type: ignore
+    from utils.embedding_utils import chunk_text, get_embeddings, get_embedding_for_query  # type: ignore
+    from utils.summarizer_utils import generate_summary, generate_grounded_answer, stream_grounded_answer, NO_ANSWER_TEXT  # type: ignore
+    from utils.translation_utils import translate_text, translate_texts  # type: ignore
+    from utils.tts_utils import generate_audio  # type: ignore
+    from utils.anomaly_utils import ClauseDetector, ClauseMatch  # type: ignore
+    from utils.concurrency_utils import run_blocking, iterate_blocking  # type: ignore
+    from utils.result_cache import content_hash  # type: ignore
+    from utils.job_queue import PipelineProgress, JobQueueFull  # type: ignore
+    from utils.metrics import observe_stage, CHAT_STAGE_SECONDS, PIPELINE_SECONDS  # type: ignore
+    from config import JOB_RETRY_AFTER_S, EAGER_AUDIO, RETRIEVAL_EMBED_DEADLINE_S  # type: ignore
+
+# --- Models and Dependencies ---
+
+class ClauseMatchResult(BaseModel):
+    """Best match in the document for one core clause."""
+    name: str
+    score: float
+    chunk_index: int
+    missing: bool
+
+
+class ProcessResponse(BaseModel):
+    """Response schema for /api/process-document."""
+    document_id: str
+    summary: str
+    summary_id: str = ""
+    total_chunks: int
+    processing_time: float
+    audio_url: str
+    translated_summary: str
+    is_suspicious: bool
+    suspicion_note: str
+    clause_matches: List[ClauseMatchResult] = []
+    # Seconds per stage (and "total"), only when the request asked for timings
+    timings: Optional[Dict[str, float]] = None
+
+
+class JobAccepted(BaseModel):
+    """Response schema for POST /api/jobs/process-document."""
+    job_id: str
+    status: str
+    status_url: str
+
+
+class StageTiming(BaseModel):
+    status: str
+    seconds: Optional[float] = None
+
+
+class JobStatus(BaseModel):
+    """Response schema for GET /api/jobs/{job_id}."""
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    stages: Dict[str, StageTiming] = {}
+    queued_seconds: float
+    elapsed_seconds: float
+    result: Optional[ProcessResponse] = None
+    error: Optional[str] = None
+
+def get_app_state():
+    """Dependency to access the shared application state."""
+    return app_state
+
+
+def _build_suspicion_note(missing: List[str]) -> str:
+    """Keep the note concise: show up to 5 items, then "+N more"."""
+    if not missing:
+        return ""
+    display_limit = 5
+    shown = missing[:display_limit]
+    remaining = max(0, len(missing) - len(shown))
+    missing_list = ", ".join(shown)
+    if remaining > 0:
+        missing_list = f"{missing_list} +{remaining} more"
+    return (
+        f"The following standard clauses appear to be missing from your agreement: {missing_list}. "
+        f"It is advised to consult with a professional legal advisor."
+    )
+
+
+def _detect_clauses(embeddings: np.ndarray, detector: Optional[ClauseDetector]) -> List[ClauseMatch]:
+    """Compare the document against the standard/core clauses (one matrix multiply)."""
+    if detector is None or not len(detector):
+        return []
+    return detector.score(embeddings)
+
+
+def _to_match_results(matches: List[ClauseMatch]) -> List[ClauseMatchResult]:
+    return [
+        ClauseMatchResult(name=m.name, score=round(m.best_score, 4), chunk_index=m.best_chunk_index, missing=m.missing)
+        for m in matches
+    ]
+
+
+def _ensure_indexed(state: Dict, document_id: str, embeddings: np.ndarray, chunks: List[str]) -> str:
+    """Re-upload of a cached document: reuse its namespace, re-adding it only if it is gone.
+
+    Blocking (store.get may reopen the document from disk): run it in the executor.
+    """
+    store = state["document_store"]
+    if store.get(document_id) is None:
+        store.add_document(embeddings, chunks, document_id=document_id)
+    return document_id
+
+
+async def _translate_optional(text: str, language: str) -> str:
+    """Translate in the executor, skipping the thread hop for empty text."""
+    if not text:
+        return text
+    return await run_blocking(translate_text, text, language)
+
+
+async def _synthesize_audio(text: str, language: str) -> str:
+    """Voice a text in the given language (translations come from the translation cache)."""
+    translated = await _translate_optional(text, language)
+    return await run_blocking(generate_audio, translated, language=language)
+
+
+def _register_audio_text(state: Dict, text: str, key: Optional[str] = None) -> str:
+    """ID under which /api/audio/{id} can voice this text later."""
+    registry = state.get("audio_registry")
+    return registry.register(text, key) if registry is not None and text else ""
+
+
+def _wants_audio(audio: Optional[bool]) -> bool:
+    return EAGER_AUDIO if audio is None else audio
+
+async def _tracked(progress: PipelineProgress, stage: str, awaitable, describe=None):
+    """Await one pipeline stage, reporting its start, duration and (optional) output."""
+    progress.stage_started(stage)
+    stage_start = time.perf_counter()
+    result = await awaitable
+    progress.stage_finished(stage, time.perf_counter() - stage_start, describe(result) if describe else {})
+    return result
+
+
+class _MeteredProgress(PipelineProgress):
+    """Records each finished stage in the stage latency histogram and in `timings`, then passes the event on."""
+
+    def __init__(self, inner: PipelineProgress) -> None:
+        self.inner = inner
+        self.timings: Dict[str, float] = {}
+
+    def stage_started(self, stage: str) -> None:
+        self.inner.stage_started(stage)
+
+    def stage_finished(self, stage: str, seconds: float, data: Dict[str, Any]) -> None:
+        self.record(stage, seconds, cached=bool(data.get("cached")))
+        self.inner.stage_finished(stage, seconds, data)
+
+    def record(self, stage: str, seconds: float, cached: bool = False) -> None:
+        """Time a step that is not reported as a stage event of its own (e.g. chunking)."""
+        observe_stage(stage, seconds, cached=cached)
+        self.timings[stage] = round(seconds, 4)
+
+
+def _describe_matches(matches: List[ClauseMatch]) -> Dict[str, Any]:
+    missing = [m.name for m in matches if m.missing]
+    return {
+        "is_suspicious": len(missing) > 0,
+        "missing_clauses": missing,
+        "clause_matches": [m.model_dump() for m in _to_match_results(matches)],
+    }
+
+
+def _check_upload(mime_type: Optional[str]) -> str:
+    if not mime_type or ('pdf' not in mime_type and 'image' not in mime_type):
+        raise HTTPException(status_code=400, detail="Only PDF and image files are supported.")
+    return mime_type
+
+
+async def run_pipeline(
+    state: Dict,
+    content: bytes,
+    mime_type: str,
+    language: str = "en",
+    progress: Optional[PipelineProgress] = None,
+    with_audio: bool = EAGER_AUDIO,
+    with_timings: bool = False,
+) -> ProcessResponse:
+    """The full processing pipeline for one upload.
+
+    Stages (reported to `progress` as they start and finish): ocr, embeddings, clauses,
+    indexing, summary, translation, and audio if `with_audio`. Used directly by
+    /api/process-document and by the job workers. With `with_timings`, the response
+    also lists the seconds spent in each stage (plus result cache lookup and chunking).
+    """
+    progress = _MeteredProgress(progress or PipelineProgress())
+    start_time = time.time()
+
+    # Same bytes uploaded before? Reuse the earlier OCR/embedding/summary results.
+    cache = state.get("result_cache")
+    lookup_start = time.perf_counter()
+    upload_hash = await run_blocking(content_hash, content)
+    cached = await run_blocking(cache.get_stages, upload_hash) if cache else None
+    progress.record("result_cache", time.perf_counter() - lookup_start)
+    detector = state.get("clause_detector")
+
+    if cached is not None:
+        stages, embeddings = cached
+        chunks = stages["chunks"]
+        summary = stages["summary"]
+        progress.stage_finished("ocr", 0.0, {"total_chunks": len(chunks), "cached": True})
+        # Clause detection is one matrix multiply, so it is simply re-run
+        # (this also applies any core clause changes since the first upload)
+        matches, document_id = await asyncio.gather(
+            _tracked(progress, "clauses", run_blocking(_detect_clauses, embeddings, detector), _describe_matches),
+            _tracked(progress, "indexing", run_blocking(_ensure_indexed, state, stages["document_id"], embeddings, chunks),
+                     lambda doc_id: {"document_id": doc_id}),
+        )
+        progress.stage_finished("summary", 0.0, {"summary": summary, "cached": True})
+    else:
+        # 1) OCR: every Google SDK call below is blocking, so it runs in the shared executor
+        if 'pdf' in mime_type:
+            extract = extract_text_from_document
+        else:  # Assumes image
+            extract = extract_text_from_image
+        progress.stage_started("ocr")
+        ocr_start = time.perf_counter()
+        text = await run_blocking(extract, content)
+        if not text:
+            raise HTTPException(status_code=500, detail="Text extraction failed.")
+
+        ocr_seconds = time.perf_counter() - ocr_start
+
+    # 2) RAG pipeline: split text → embed → (later) search
+        chunk_start = time.perf_counter()
+        chunks = chunk_text(text)
+        progress.record("chunking", time.perf_counter() - chunk_start)
+        progress.stage_finished("ocr", ocr_seconds, {"total_chunks": len(chunks), "cached": False})
+        embeddings = np.array(await _tracked(progress, "embeddings", run_blocking(get_embeddings, chunks)), dtype=np.float32)
+
+    # 3) Independent stages run at the same time:
+    #    missing clause detection, vector store update and summary generation
+        summary_info: Dict[str, Any] = {}  # long documents: condense rounds and characters cut
+        matches, document_id, summary = await asyncio.gather(
+            _tracked(progress, "clauses", run_blocking(_detect_clauses, embeddings, detector), _describe_matches),
+            # Each document gets its own namespace so chat only ever searches that document
+            _tracked(progress, "indexing", run_blocking(state["document_store"].add_document, embeddings, chunks),
+                     lambda doc_id: {"document_id": doc_id}),
+            _tracked(progress, "summary", run_blocking(generate_summary, relevant_chunks=chunks, info=summary_info),
+                     lambda text: {"summary": text, "cached": False, **summary_info}),
+        )
+
+        if cache:
+            stages = {"text": text, "chunks": chunks, "summary": summary, "document_id": document_id}
+            await run_blocking(cache.put_stages, upload_hash, stages, embeddings)
+
+    missing = [m.name for m in matches if m.missing]
+    is_suspicious = len(missing) > 0
+    suspicion_note = _build_suspicion_note(missing)
+
+    # Already translated/voiced in this language? Only redo it if the note changed.
+    cached_language = await run_blocking(cache.get_language, upload_hash, language) if cache else None
+    language_changed = False
+    if cached_language and cached_language.get("suspicion_note_source") == suspicion_note:
+        translated_summary = cached_language["translated_summary"]
+        translated_note = cached_language["suspicion_note"]
+        audio_url = cached_language.get("audio_url", "")
+        progress.stage_finished("translation", 0.0, {
+            "translated_summary": translated_summary, "suspicion_note": translated_note, "cached": True,
+        })
+    else:
+    # 4) Translate the summary and the suspicion note together (one batched Translation call)
+        translated_summary, translated_note = await _tracked(
+            progress, "translation",
+            run_blocking(translate_texts, [summary, suspicion_note], language),
+            lambda pair: {"translated_summary": pair[0], "suspicion_note": pair[1], "cached": False},
+        )
+        # The audio voices the summary only, so an earlier (e.g. on-demand) one still applies
+        audio_url = cached_language.get("audio_url", "") if cached_language else ""
+        language_changed = True
+
+    # 5) Audio (Text-to-Speech) only when asked for; otherwise the client can fetch it
+    #    later from /api/audio/{summary_id}, keeping TTS off the critical path
+    if audio_url:
+        progress.stage_finished("audio", 0.0, {"audio_url": audio_url, "cached": True})
+    elif with_audio:
+        audio_url = await _tracked(
+            progress, "audio", run_blocking(generate_audio, translated_summary, language=language),
+            lambda url: {"audio_url": url, "cached": False},
+        )
+        language_changed = True
+
+    if cache and language_changed:
+        await run_blocking(cache.put_language, upload_hash, language, {
+            "translated_summary": translated_summary,
+            "suspicion_note_source": suspicion_note,
+            "suspicion_note": translated_note,
+            "audio_url": audio_url,
+        })
+
+    PIPELINE_SECONDS.labels("true" if cached is not None else "false").observe(time.time() - start_time)
+    processing_time = round(time.time() - start_time, 2)
+
+    return ProcessResponse(
+        document_id=document_id,
+        summary=summary,
+        # The upload hash: /api/audio can find the summary in the result cache after a restart
+        summary_id=_register_audio_text(state, summary, upload_hash),
+        total_chunks=len(chunks),
+        processing_time=processing_time,
+        audio_url=audio_url,
+        translated_summary=translated_summary,
+        is_suspicious=is_suspicious,
+        suspicion_note=translated_note,
+        clause_matches=_to_match_results(matches),
+        timings={**progress.timings, "total": round(time.time() - start_time, 4)} if with_timings else None,
+    )
+
+class _StreamProgress(PipelineProgress):
+    """Turns finished pipeline stages into stream events (consumed by _stream_events)."""
+
+    def __init__(self) -> None:
+        self.events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    def stage_finished(self, stage: str, seconds: float, data: Dict[str, Any]) -> None:
+        self.events.put_nowait({"event": stage, "seconds": round(seconds, 3), "data": data})
+
+
+def _stream_format(request: Request, stream: str) -> Optional[str]:
+    """Streaming is opt-in: stream=ndjson|sse, or an Accept header asking for either."""
+    stream = (stream or "").strip().lower()
+    if stream in ("ndjson", "sse"):
+        return stream
+    accept = request.headers.get("accept", "")
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+
+def _encode_event(event: Dict[str, Any], fmt: str) -> str:
+    if fmt == "sse":
+        payload = {k: v for k, v in event.items() if k != "event"}
+        return f"event: {event['event']}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps(event) + "\n"
+
+
+async def _stream_events(
+    state: Dict, content: bytes, mime_type: str, language: str, with_audio: bool, fmt: str, with_timings: bool = False,
+):
+    """Run the pipeline and yield one event per finished stage, then the full result."""
+    progress = _StreamProgress()
+    task = asyncio.create_task(
+        run_pipeline(state, content, mime_type, language, progress=progress, with_audio=with_audio,
+                     with_timings=with_timings)
+    )
+    task.add_done_callback(lambda _: progress.events.put_nowait({"event": "_done"}))
+    try:
+        while True:
+            event = await progress.events.get()
+            if event["event"] == "_done":
+                break
+            yield _encode_event(event, fmt)
+        try:
+            result = task.result()
+            yield _encode_event({"event": "result", "data": result.model_dump(exclude_none=True)}, fmt)
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            yield _encode_event({"event": "error", "data": {"detail": f"Processing failed: {detail}"}}, fmt)
+    finally:
+        # Client went away: stop waiting on the remaining stages
+        if not task.done():
+            task.cancel()
+
+# --- API Endpoints ---
+
+@fastapi_app.post("/api/process-document", response_model=ProcessResponse, response_model_exclude_none=True)
+async def process_document(
+    request: Request,
+    file: UploadFile = File(...),
+    language: str = Form("en"),
+    stream: str = Form(""),
+    audio: Optional[bool] = Form(None),
+    timings: bool = Form(False),
+    state: Dict = Depends(get_app_state)
+):
+    # Only PDFs and images can be OCR'd
+    mime_type = _check_upload(file.content_type)
+
+    try:
+        # Read file content directly into memory
+        content = await file.read()
+
+        # Opt-in streaming: send each stage (OCR, clauses, summary, translation, audio)
+        # as soon as it finishes, then the complete response as the last event
+        fmt = _stream_format(request, stream)
+        if fmt is not None:
+            media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+            return StreamingResponse(
+                _stream_events(state, content, mime_type, language, _wants_audio(audio), fmt, timings),
+                media_type=media_type,
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        return await run_pipeline(state, content, mime_type, language, with_audio=_wants_audio(audio), with_timings=timings)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+
+@fastapi_app.post("/api/jobs/process-document", status_code=202, response_model=JobAccepted)
+async def submit_process_document_job(
+    file: UploadFile = File(...),
+    language: str = Form("en"),
+    audio: Optional[bool] = Form(None),
+    state: Dict = Depends(get_app_state)
+):
+    """Queue a document for processing and return a job ID right away (poll /api/jobs/{job_id})."""
+    mime_type = _check_upload(file.content_type)
+    jobs = state.get("job_queue")
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Job queue is not available.")
+
+    content = await file.read()
+    try:
+        with_audio = _wants_audio(audio)
+        job = jobs.submit(
+            lambda job: run_pipeline(state, content, mime_type, language, progress=job, with_audio=with_audio)
+        )
+    except JobQueueFull as e:
+        # Fail fast so the caller can back off instead of piling up behind a full queue
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER_S)})
+    return JobAccepted(job_id=job.id, status=job.status, status_url=f"/api/jobs/{job.id}")
+
+
+@fastapi_app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, state: Dict = Depends(get_app_state)):
+    """Current stage, per-stage timings, and the ProcessResponse once the job has finished."""
+    jobs = state.get("job_queue")
+    job = jobs.get(job_id) if jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired).")
+    return JobStatus(**job.to_dict())
+
+@fastapi_app.get("/api/audio/{text_id}")
+async def get_audio(text_id: str, language: str = "en", state: Dict = Depends(get_app_state)):
+    """Audio for a summary_id/answer_id in the given language, synthesised on first request.
+
+    Concurrent requests for the same audio share one synthesis; repeats reuse the stored MP3.
+    """
+    registry = state.get("audio_registry")
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Audio is not available.")
+    cache = state.get("result_cache")
+
+    async def load_summary(key: str) -> Optional[str]:
+        # A summary_id is its upload's result cache key (answer IDs are only kept in memory)
+        return await run_blocking(cache.get_summary, key) if cache is not None else None
+
+    async def synthesize(text: str, lang: str) -> str:
+        audio_url = await _synthesize_audio(text, lang)
+        if cache is not None and audio_url:
+            # Recorded with the upload, so re-uploads in this language return it directly
+            await run_blocking(cache.update_language, text_id, lang, {"audio_url": audio_url})
+        return audio_url
+
+    try:
+        audio_url = await registry.audio_url(text_id, language, synthesize, load_summary)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Audio generation failed: {str(e)}")
+    if audio_url is None:
+        raise HTTPException(status_code=404, detail="Unknown text ID (it may have expired); ask again.")
+    return {"text_id": text_id, "language": language, "audio_url": audio_url}
+
+class _StageClock:
+    """Wall-clock seconds of each step of one chat request: observed in /metrics, and
+    returned in the optional `timings` field."""
+
+    def __init__(self) -> None:
+        self.started = self._last = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        CHAT_STAGE_SECONDS.labels(stage).observe(now - self._last)
+        self.timings[stage] = round(now - self._last, 4)
+        self._last = now
+
+    def result(self) -> Dict[str, float]:
+        return {**self.timings, "total": round(time.perf_counter() - self.started, 4)}
+
+
+NO_DOCUMENT_REPLY = "No document content is indexed yet. Please process a document first."
+NO_CONTEXT_REPLY = "I couldn't find relevant information in the document."
+
+
+def _is_fixed_reply(answer: str) -> bool:
+    """Replies that say there is nothing to answer from: no answer_id or audio for these."""
+    return answer in (NO_DOCUMENT_REPLY, NO_CONTEXT_REPLY)
+
+
+async def _query_embedding(query: str) -> Optional[List[float]]:
+    """The question's embedding, or None if the API fails or misses RETRIEVAL_EMBED_DEADLINE_S.
+
+    Without it, retrieval falls back to keyword search; a late embedding still lands in the cache.
+    """
+    try:
+        return await asyncio.wait_for(run_blocking(get_embedding_for_query, query), RETRIEVAL_EMBED_DEADLINE_S)
+    except asyncio.TimeoutError:
+        print(f"Query embedding took longer than {RETRIEVAL_EMBED_DEADLINE_S}s; using keyword search only")
+    except Exception as e:
+        print(f"Query embedding failed ({e}); using keyword search only")
+    return None
+
+
+async def _cached_answer(state: Dict, entry, query: str) -> Tuple[Optional[str], Optional[List[float]]]:
+    """Earlier answer to this (or a very similar) question, else None plus the query embedding.
+
+    An identical question is found without embedding it at all.
+    """
+    cache = state.get("answer_cache")
+    if cache is not None:
+        answer = cache.get_exact(entry.document_id, entry.created_at, query)
+        if answer is not None:
+            return answer, None
+    query_embedding = await _query_embedding(query)
+    if cache is not None and query_embedding is not None:
+        answer = cache.get_similar(entry.document_id, entry.created_at, query_embedding)
+        if answer is not None:
+            return answer, query_embedding
+    return None, query_embedding
+
+
+def _remember_answer(state: Dict, entry, query: str, query_embedding: Optional[List[float]], answer: str) -> None:
+    # NO_ANSWER_TEXT is also what we say when every model failed, so it is not worth keeping
+    cache = state.get("answer_cache")
+    if cache is not None and query_embedding is not None and not answer.startswith(NO_ANSWER_TEXT):
+        cache.put(entry.document_id, entry.created_at, query, query_embedding, answer)
+
+
+async def _retrieve_chunks(store, document_id: str, query: str, query_embedding: Optional[List[float]]) -> List[str]:
+    """Return the 3 best chunks of that document by keyword and vector rank (keyword only without an embedding)."""
+    return await run_blocking(store.search_hybrid, document_id, query, query_embedding, 3)
+
+
+async def _stream_chat_events(
+    state: Dict, query: str, language: str, document_id: Optional[str],
+    with_translation: bool, with_audio: bool, fmt: str,
+):
+    """Yield answer tokens as Gemini writes them, then the optional translation and audio."""
+    start_time = time.time()
+    clock = _StageClock()
+    try:
+        store = state["document_store"]
+        # May reopen an unloaded document from disk, so not on the event loop
+        entry = await run_blocking(store.get, document_id)
+        cached = False
+        if entry is None:
+            answer = NO_DOCUMENT_REPLY
+        else:
+            answer, query_embedding = await _cached_answer(state, entry, query)
+            clock.lap("embedding")
+            if answer is not None:
+                # Nothing to wait for: send the whole cached answer as one token
+                cached = True
+                yield _encode_event({"event": "token", "data": {"text": answer}}, fmt)
+            else:
+                relevant_chunks = await _retrieve_chunks(store, entry.document_id, query, query_embedding)
+                clock.lap("retrieval")
+                if not relevant_chunks:
+                    answer = NO_CONTEXT_REPLY
+                else:
+                    pieces: List[str] = []
+                    async for piece in iterate_blocking(stream_grounded_answer, relevant_chunks, query):
+                        pieces.append(piece)
+                        yield _encode_event({"event": "token", "data": {"text": piece}}, fmt)
+                    answer = "".join(pieces)
+                    clock.lap("answer")
+                    _remember_answer(state, entry, query, query_embedding, answer)
+        answer_id = "" if _is_fixed_reply(answer) else _register_audio_text(state, answer)
+        yield _encode_event(
+            {"event": "answer", "data": {"chatbot_response": answer, "answer_id": answer_id, "cached": cached}}, fmt
+        )
+
+        translated = answer
+        if with_translation or with_audio:
+            translated = await _translate_optional(answer, language)
+            clock.lap("translation")
+        if with_translation:
+            yield _encode_event({"event": "translation", "data": {"translated_response": translated}}, fmt)
+        if with_audio and not _is_fixed_reply(answer):
+            audio_url = await run_blocking(generate_audio, translated, language=language)
+            clock.lap("audio")
+            yield _encode_event({"event": "audio", "data": {"audio_url": audio_url}}, fmt)
+        yield _encode_event({"event": "done", "data": {"processing_time": round(time.time() - start_time, 2)}}, fmt)
+    except Exception as e:
+        yield _encode_event({"event": "error", "data": {"detail": f"Chatbot failed: {str(e)}"}}, fmt)
+
+
+@fastapi_app.post("/api/chat/stream")
+async def chat_stream(
+    request: Request,
+    query: str,
+    language: str = "en",
+    document_id: Optional[str] = None,
+    translate: bool = True,
+    audio: Optional[bool] = None,
+    stream: str = "",
+    state: Dict = Depends(get_app_state)
+):
+    """Streaming chat: token events first, then translation/audio events if requested (NDJSON or SSE)."""
+    if not query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    fmt = _stream_format(request, stream) or "ndjson"
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_chat_events(state, query, language, document_id, translate, _wants_audio(audio), fmt),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@fastapi_app.post("/api/chat")
+async def chat(
+    query: str,
+    language: str = "en",
+    document_id: Optional[str] = None,
+    audio: Optional[bool] = None,
+    timings: bool = False,
+    state: Dict = Depends(get_app_state)
+):
+    clock = _StageClock()
+
+    def reply(body: Dict[str, Any]) -> Dict[str, Any]:
+        # With timings=true, add the seconds spent in each step
+        if timings:
+            body["timings"] = clock.result()
+        return body
+
+    try:
+        if not query:
+            raise HTTPException(status_code=400, detail="Query cannot be empty.")
+            
+        # 0. Ensure the requested document has been indexed
+        store = state["document_store"]
+        # May reopen an unloaded document from disk, so not on the event loop
+        entry = await run_blocking(store.get, document_id)
+        if entry is None:
+            # Fixed replies are translated too (and memoised by the translation cache)
+            return reply({
+                "chatbot_response": NO_DOCUMENT_REPLY,
+                "answer_id": "",
+                "audio_url": "",
+                "translated_response": await _translate_optional(NO_DOCUMENT_REPLY, language)
+            })
+
+        # 1) Reuse an earlier answer to the same or a similar question, otherwise embed the query
+        chatbot_response_text, query_embedding = await _cached_answer(state, entry, query)
+        clock.lap("embedding")
+        cached = chatbot_response_text is not None
+        if chatbot_response_text is None:
+            # 2) find the most relevant chunks of this document only
+            relevant_chunks = await _retrieve_chunks(store, entry.document_id, query, query_embedding)
+            clock.lap("retrieval")
+
+            if not relevant_chunks:
+                return reply({
+                    "chatbot_response": NO_CONTEXT_REPLY,
+                    "answer_id": "",
+                    "audio_url": "",
+                    "translated_response": await _translate_optional(NO_CONTEXT_REPLY, language)
+                })
+
+            # 3) Ask the AI to answer based ONLY on those chunks
+            chatbot_response_text = await run_blocking(generate_grounded_answer, relevant_chunks, query)
+            clock.lap("answer")
+            _remember_answer(state, entry, query, query_embedding, chatbot_response_text)
+        # Translation and audio of a cached answer come from their own caches
+        translated_response = await run_blocking(translate_text, chatbot_response_text, language)
+        clock.lap("translation")
+        # Audio only if asked for; otherwise GET /api/audio/{answer_id} makes it on demand
+        audio_url = ""
+        if _wants_audio(audio):
+            audio_url = await run_blocking(generate_audio, translated_response, language=language)
+            clock.lap("audio")
+
+        return reply({
+            "chatbot_response": chatbot_response_text,
+            "answer_id": _register_audio_text(state, chatbot_response_text),
+            "audio_url": audio_url,
+            "translated_response": translated_response,
+            "cached": cached,
+        })
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chatbot failed: {str(e)}")
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("__init__:app", host="0.0.0.0", port=8000, reload=True)
+
     
\ No newline at end of file
@@ -1,18 +1,19 @@
-"""
-Simplified utility functions for AI document processing
-"""
-
-from .ocr_utils import extract_text_from_document
-from .embedding_utils import chunk_text, get_embeddings
-from .vectorstore_utils import create_and_add_embeddings, search_vector_store
-from .summarizer_utils import generate_summary
-
-__all__ = [
-    "extract_text_from_document",
-    "chunk_text",
-    "get_embeddings", 
-    "create_and_add_embeddings",
-    "search_vector_store",
-    "generate_summary"
-]
+"""
+Simplified utility functions for AI document processing
+"""
+
+from .ocr_utils import extract_text_from_document
+from .embedding_utils import chunk_text, get_embeddings
+from .vectorstore_utils import create_and_add_embeddings, search_vector_store, DocumentStore
+from .summarizer_utils import generate_summary
+
+__all__ = [
+    "extract_text_from_document",
+    "chunk_text",
+    "get_embeddings", 
+    "create_and_add_embeddings",
+    "search_vector_store",
+    "DocumentStore",
+    "generate_summary"
+]
   
\ No newline at end of file
@@ -1,51 +1,105 @@
-"""
-Missing core clauses detection.
-
-We check whether each expected "core clause" has a close match in the user's document
-by comparing embeddings (numeric vectors) and a similarity threshold.
-"""
-from typing import List, Dict, Tuple
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-# Support both package and script execution imports
-try:
-    from ..config import ANOMALY_THRESHOLD  # We'll reuse this threshold
-except ImportError:
-    from config import ANOMALY_THRESHOLD
-
-# ... (keep your existing detect_anomalies and risk_score functions for now, or remove them)
-
-def find_missing_clauses(doc_embeddings: List[List[float]], core_clauses_embeddings: Dict[str, List[float]]) -> List[str]:
-    """
-    Identifies which core clauses are missing from a document.
-
-    This function checks if each core clause has a semantically similar counterpart
-    in the user's document.
-
-    Args:
-        doc_embeddings: A list of embeddings from the user's document.
-        core_clauses_embeddings: A dictionary mapping clause names to their embeddings.
-
-    Returns:
-        A list of names of the core clauses that are considered missing.
-    """
-    if not doc_embeddings:
-        return list(core_clauses_embeddings.keys()) # If the doc is empty, all clauses are missing
-
-    missing_clauses = []
-    doc_embeddings_array = np.array(doc_embeddings, dtype=np.float32)
-
-    for clause_name, core_embedding in core_clauses_embeddings.items():
-        # Compare this single core clause against ALL clauses in the user's document
-        core_embedding_array = np.array([core_embedding], dtype=np.float32)
-        similarity_scores = cosine_similarity(core_embedding_array, doc_embeddings_array)
-
-        # Find the highest similarity score. This tells us if ANY clause in the document
-        # is a good match for our current core clause.
-        max_similarity = np.max(similarity_scores)
-
-        # If the best match is below our threshold, we consider the clause to be missing.
-        if max_similarity < ANOMALY_THRESHOLD:
-            missing_clauses.append(clause_name)
-
-    return missing_clauses
\ No newline at end of file
+"""
+Missing core clauses detection.
+
+We check whether each expected "core clause" has a close match in the user's document
+by comparing embeddings (numeric vectors) and a similarity threshold.
+
+The core clauses are kept as one pre-normalized matrix, so scoring a document against
+every clause is a single matrix multiply (cosine similarity), and a batch of documents
+can be scored together in one multiply as well.
+"""
+from dataclasses import dataclass
+from typing import List, Dict, Sequence, Union
+import numpy as np
+# Support both package and script execution imports
+try:
+    from ..config import ANOMALY_THRESHOLD  # We'll reuse this threshold
+except ImportError:
+    from config import ANOMALY_THRESHOLD
+
+ArrayLike = Union[np.ndarray, Sequence[Sequence[float]]]
+
+
+@dataclass
+class ClauseMatch:
+    """How well one core clause is covered by a document."""
+    name: str
+    best_score: float  # highest cosine similarity against any chunk (-1.0 if the document is empty)
+    best_chunk_index: int  # index of that chunk (-1 if the document is empty)
+    missing: bool
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class ClauseDetector:
+    """Scores documents against all core clauses at once."""
+
+    def __init__(self, core_clauses_embeddings: Dict[str, ArrayLike], threshold: float = ANOMALY_THRESHOLD) -> None:
+        self.names: List[str] = list(core_clauses_embeddings.keys())
+        self.threshold = threshold
+        if self.names:
+            matrix = np.asarray([np.asarray(v, dtype=np.float32).ravel() for v in core_clauses_embeddings.values()])
+            self._clauses = _normalize_rows(matrix.astype(np.float32))
+        else:
+            self._clauses = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _matches(self, similarity: np.ndarray) -> List[ClauseMatch]:
+        """Turn a (chunks x clauses) similarity block into per-clause results."""
+        if similarity.shape[0] == 0:
+            # If the doc is empty, all clauses are missing
+            return [ClauseMatch(name, -1.0, -1, True) for name in self.names]
+        best_idx = np.argmax(similarity, axis=0)
+        best_scores = similarity[best_idx, np.arange(similarity.shape[1])]
+        return [
+            ClauseMatch(name, float(score), int(idx), bool(score < self.threshold))
+            for name, score, idx in zip(self.names, best_scores, best_idx)
+        ]
+
+    def score_batch(self, documents: Sequence[ArrayLike]) -> List[List[ClauseMatch]]:
+        """Score several documents with one matrix multiply; one result list per document."""
+        if not self.names:
+            return [[] for _ in documents]
+        arrays = [np.asarray(doc, dtype=np.float32).reshape(-1, self._clauses.shape[1]) for doc in documents]
+        if not arrays:
+            return []
+        stacked = _normalize_rows(np.concatenate(arrays, axis=0))
+        similarity = stacked @ self._clauses.T
+        results: List[List[ClauseMatch]] = []
+        start = 0
+        for array in arrays:
+            end = start + array.shape[0]
+            results.append(self._matches(similarity[start:end]))
+            start = end
+        return results
+
+    def score(self, doc_embeddings: ArrayLike) -> List[ClauseMatch]:
+        return self.score_batch([doc_embeddings])[0]
+
+    def find_missing(self, doc_embeddings: ArrayLike) -> List[str]:
+        return [m.name for m in self.score(doc_embeddings) if m.missing]
+
+
+def find_missing_clauses(doc_embeddings: ArrayLike, core_clauses_embeddings: Dict[str, ArrayLike]) -> List[str]:
+    """
+    Identifies which core clauses are missing from a document.
+
+    This function checks if each core clause has a semantically similar counterpart
+    in the user's document. For repeated calls, build a ClauseDetector once instead.
+
+    Args:
+        doc_embeddings: The embeddings from the user's document (list of lists or 2-D array).
+        core_clauses_embeddings: A dictionary mapping clause names to their embeddings.
+
+    Returns:
+        A list of names of the core clauses that are considered missing.
+    """
+    if len(doc_embeddings) == 0:
+        return list(core_clauses_embeddings.keys()) # If the doc is empty, all clauses are missing
+    return ClauseDetector(core_clauses_embeddings).find_missing(doc_embeddings)
@@ -0,0 +1,173 @@
+"""
+Per-document cache of chat answers.
+
+People ask the same things about the same agreement over and over ("what is the deposit?",
+"how much is the security deposit?"). Each question normally costs an embedding call, a
+vector search and a Gemini call, so we remember the grounded answers per document:
+
+- The same question text (ignoring case and extra spaces) is answered without any API call.
+- A differently worded question is compared with the cached questions of that document by
+  the cosine similarity of their query embeddings; at or above the threshold the answer is reused.
+- Entries expire after a TTL, and the cache holds at most max_items answers (least recently
+  used dropped first).
+- Each entry remembers the version of the document it was answered from (the store entry's
+  created_at); when the document's chunks are re-added, its old answers are dropped.
+
+Translation and audio of a reused answer come from their own caches (same text, same result).
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    vector: np.ndarray  # unit length, so a dot product is the cosine similarity
+    answer: str
+    created_at: float
+
+
+class AnswerCache:
+    """Bounded, TTL-limited answer cache with exact and semantic (embedding) lookup.
+
+    Answers are kept per document, so a lookup only looks at that document's questions,
+    and dropping a document's answers is one pop. A separate LRU list across documents
+    decides which answer goes when the cache is full.
+    """
+
+    def __init__(self, max_items: int, ttl_s: float, similarity: float) -> None:
+        self.max_items = max(0, max_items)
+        self.ttl_s = max(0.0, ttl_s)
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # document_id -> normalized query -> answer
+        self._documents: Dict[str, Dict[str, CachedAnswer]] = {}
+        # (document_id, normalized query) of every answer, least recently used first
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        # document_id -> document version the cached answers belong to
+        self._versions: Dict[str, float] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def _check_version(self, document_id: str, version: float) -> None:
+        """Drop a document's answers if they were made from other chunks (caller holds the lock)."""
+        known = self._versions.get(document_id)
+        if known == version:
+            return
+        if known is not None:
+            self._drop_document(document_id)
+            self.invalidations += 1
+        self._versions[document_id] = version
+
+    def _drop_document(self, document_id: str) -> None:
+        for query in self._documents.pop(document_id, {}):
+            self._lru.pop((document_id, query), None)
+
+    def _remove(self, document_id: str, query: str) -> None:
+        answers = self._documents.get(document_id)
+        if answers is not None:
+            answers.pop(query, None)
+            if not answers:
+                del self._documents[document_id]
+        self._lru.pop((document_id, query), None)
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return self.ttl_s > 0 and now - entry.created_at > self.ttl_s
+
+    def get_exact(self, document_id: str, version: float, query: str) -> Optional[str]:
+        """Answer to the same question text, if cached (no embedding needed)."""
+        if not self.enabled:
+            return None
+        normalized = normalize_query(query)
+        with self._lock:
+            self._check_version(document_id, version)
+            entry = self._documents.get(document_id, {}).get(normalized)
+            if entry is None:
+                return None
+            if self._expired(entry, time.time()):
+                self._remove(document_id, normalized)
+                return None
+            self._lru.move_to_end((document_id, normalized))
+            self.exact_hits += 1
+            return entry.answer
+
+    def get_similar(self, document_id: str, version: float, query_embedding: List[float]) -> Optional[str]:
+        """Answer to the most similar cached question of this document, if similar enough."""
+        if not self.enabled:
+            return None
+        vector = _unit(query_embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(document_id, version)
+            answers = self._documents.get(document_id, {})
+            for query in [q for q, entry in answers.items() if self._expired(entry, now)]:
+                self._remove(document_id, query)
+            answers = self._documents.get(document_id, {})
+            if answers:
+                queries = list(answers)
+                scores = np.stack([answers[q].vector for q in queries]) @ vector
+                best = int(np.argmax(scores))
+                if float(scores[best]) >= self.similarity:
+                    self._lru.move_to_end((document_id, queries[best]))
+                    self.semantic_hits += 1
+                    return answers[queries[best]].answer
+            self.misses += 1
+            return None
+
+    def put(self, document_id: str, version: float, query: str, query_embedding: List[float], answer: str) -> None:
+        if not self.enabled:
+            return
+        normalized = normalize_query(query)
+        entry = CachedAnswer(query=query, vector=_unit(query_embedding), answer=answer, created_at=time.time())
+        with self._lock:
+            self._check_version(document_id, version)
+            self._documents.setdefault(document_id, {})[normalized] = entry
+            self._lru[(document_id, normalized)] = None
+            self._lru.move_to_end((document_id, normalized))
+            while len(self._lru) > self.max_items:
+                victim_document, victim_query = next(iter(self._lru))
+                self._remove(victim_document, victim_query)
+                self.evictions += 1
+
+    def invalidate(self, document_id: str) -> None:
+        """Forget every answer for a document (e.g. it was re-indexed)."""
+        with self._lock:
+            self._drop_document(document_id)
+            self._versions.pop(document_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "answers": len(self._lru),
+                "documents": len(self._documents),
+                "max_items": self.max_items,
+                "similarity": self.similarity,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm > 0 else array
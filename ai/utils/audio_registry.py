@@ -0,0 +1,87 @@
+"""
+On-demand audio for summaries and chat answers.
+
+Most users never press play, so audio is no longer made while a document is processed
+or a question is answered. Instead each summary/answer gets a text ID, and the audio
+endpoint turns (text ID, language) into an MP3 URL only when someone asks for it.
+
+- Texts are kept in a bounded in-memory map (oldest dropped first). A text that is not
+  there (restart, other worker, evicted) can be loaded again by the caller, e.g. a summary
+  from the result cache, whose key is the summary ID.
+- Concurrent requests for the same (text ID, language) share one synthesis.
+- The MP3 itself is content-addressed in Cloud Storage (see tts_utils), so repeats are cheap.
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def text_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class AudioRegistry:
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max(1, max_items)
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, str], "asyncio.Future[str]"] = {}
+        self.syntheses = 0
+        self.shared = 0
+
+    def register(self, text: str, key: Optional[str] = None) -> str:
+        """Remember a text that may be spoken later and return its ID (by default a hash of it)."""
+        key = key or text_id(text)
+        with self._lock:
+            self._texts[key] = text
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.max_items:
+                self._texts.popitem(last=False)
+        return key
+
+    def get_text(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._texts.get(key)
+
+    async def audio_url(
+        self,
+        key: str,
+        language: str,
+        synthesize: Callable[[str, str], Awaitable[str]],
+        load_text: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+    ) -> Optional[str]:
+        """URL of the audio for a registered text, or None if the ID is unknown.
+
+        IDs that are not in memory are looked up with `load_text`, if given.
+        If the same audio is already being made, wait for that instead of starting again.
+        """
+        text = self.get_text(key)
+        if text is None and load_text is not None:
+            text = await load_text(key)
+            if text:
+                self.register(text, key)
+        if not text:
+            return None
+        flight_key = (key, language)
+        task = self._in_flight.get(flight_key)
+        if task is not None:
+            self.shared += 1
+        else:
+            # A task of its own, so a caller that disconnects does not cancel it for the others
+            task = asyncio.ensure_future(synthesize(text, language))
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+            self.syntheses += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            texts = len(self._texts)
+        return {
+            "texts": texts,
+            "in_flight": len(self._in_flight),
+            "syntheses": self.syntheses,
+            "shared": self.shared,
+        }
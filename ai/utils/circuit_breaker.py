@@ -0,0 +1,68 @@
+"""
+A small circuit breaker for calls to an external service (one breaker per model/endpoint).
+
+After `failure_threshold` failures in a row the breaker "opens" and calls are skipped for
+`cooldown_s` seconds, so requests stop waiting on something that is known to be down.
+After the cool-down one trial call is let through ("half-open"): if it works the breaker
+closes again, if it fails the cool-down starts over.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_s: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_s = max(0.0, cooldown_s)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """May a call go through now? In half-open state only one trial call is allowed."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probe_in_flight:
+                    self.times_opened += 1
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.times_opened,
+            }
@@ -0,0 +1,159 @@
+"""
+Process-wide registry of Google Cloud clients and Vertex AI models.
+
+Creating a client (or loading a model handle) means opening connections and fetching
+auth tokens, which costs hundreds of milliseconds. We create each one once per worker,
+the first time it is needed, and reuse it for every request after that.
+
+- warm_up_clients() is called at startup so the first user does not pay this cost.
+- close_clients() is called at shutdown to release sockets cleanly.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import google.auth
+import google.auth.transport.requests
+import grpc
+import vertexai
+from google.cloud import documentai_v1 as documentai
+from google.cloud import storage
+from google.cloud import texttospeech
+from google.cloud import translate_v2 as translate
+from google.cloud import vision
+from vertexai.generative_models import GenerativeModel
+from vertexai.language_models import TextEmbeddingModel
+
+# Support both package and script execution imports
+try:
+    from ..config import PROJECT_ID, LOCATION, EMBEDDING_MODEL, CLIENT_WARMUP_TIMEOUT_S
+except ImportError:
+    from config import PROJECT_ID, LOCATION, EMBEDDING_MODEL, CLIENT_WARMUP_TIMEOUT_S
+
+_CLOUD_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+_clients: Dict[str, Any] = {}
+_lock = threading.RLock()
+_credentials: Any = None
+_credentials_loaded = False
+_vertex_initialized = False
+
+
+def _get_credentials() -> Any:
+    """Load Application Default Credentials once so every client shares one token."""
+    global _credentials, _credentials_loaded
+    with _lock:
+        if not _credentials_loaded:
+            try:
+                _credentials, _ = google.auth.default(scopes=_CLOUD_SCOPES)
+            except Exception as e:
+                # Let each client fall back to its own discovery (and fail with a clear error)
+                print(f"Warning: could not load default credentials: {e}")
+                _credentials = None
+            _credentials_loaded = True
+        return _credentials
+
+
+def _ensure_vertex() -> None:
+    global _vertex_initialized
+    with _lock:
+        if not _vertex_initialized:
+            vertexai.init(project=PROJECT_ID, location=LOCATION, credentials=_get_credentials())
+            _vertex_initialized = True
+
+
+def _get_or_create(key: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+        return client
+
+
+def get_embedding_model() -> TextEmbeddingModel:
+    """Shared Vertex AI text embedding model."""
+    def factory():
+        _ensure_vertex()
+        return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+    return _get_or_create(f"embedding:{EMBEDDING_MODEL}", factory)
+
+
+def get_generative_model(model_name: str) -> GenerativeModel:
+    """Shared Gemini model handle for the given model name."""
+    def factory():
+        _ensure_vertex()
+        return GenerativeModel(model_name)
+    return _get_or_create(f"gemini:{model_name}", factory)
+
+
+def get_translate_client() -> translate.Client:
+    return _get_or_create("translate", lambda: translate.Client(credentials=_get_credentials()))
+
+
+def get_tts_client() -> texttospeech.TextToSpeechClient:
+    return _get_or_create("tts", lambda: texttospeech.TextToSpeechClient(credentials=_get_credentials()))
+
+
+def get_storage_client() -> storage.Client:
+    return _get_or_create("storage", lambda: storage.Client(project=PROJECT_ID, credentials=_get_credentials()))
+
+
+def get_docai_client() -> documentai.DocumentProcessorServiceClient:
+    return _get_or_create(
+        "docai", lambda: documentai.DocumentProcessorServiceClient(credentials=_get_credentials())
+    )
+
+
+def get_vision_client() -> vision.ImageAnnotatorClient:
+    return _get_or_create("vision", lambda: vision.ImageAnnotatorClient(credentials=_get_credentials()))
+
+
+def _wait_for_channel(client: Any, timeout: float) -> None:
+    """Open the gRPC channel now instead of on the first request."""
+    channel: Optional[grpc.Channel] = getattr(getattr(client, "transport", None), "grpc_channel", None)
+    if channel is not None:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+
+
+def warm_up_clients() -> None:
+    """Create every client, refresh auth and connect gRPC channels ahead of traffic."""
+    credentials = _get_credentials()
+    if credentials is not None:
+        try:
+            credentials.refresh(google.auth.transport.requests.Request())
+        except Exception as e:
+            print(f"Warning: credential refresh failed during warm-up: {e}")
+
+    grpc_getters = (get_docai_client, get_vision_client, get_tts_client)
+    other_getters = (get_translate_client, get_storage_client, get_embedding_model)
+    for getter in grpc_getters:
+        try:
+            _wait_for_channel(getter(), CLIENT_WARMUP_TIMEOUT_S)
+        except Exception as e:
+            print(f"Warning: warm-up of {getter.__name__} failed: {e}")
+    for getter in other_getters:
+        try:
+            getter()
+        except Exception as e:
+            print(f"Warning: warm-up of {getter.__name__} failed: {e}")
+
+
+def close_clients() -> None:
+    """Close every client we opened and forget them."""
+    global _vertex_initialized
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+        _vertex_initialized = False
+    for key, client in clients:
+        try:
+            transport = getattr(client, "transport", None)
+            if transport is not None and hasattr(transport, "close"):
+                transport.close()
+            elif hasattr(client, "close"):
+                client.close()
+        except Exception as e:
+            print(f"Warning: failed to close client {key}: {e}")
@@ -0,0 +1,98 @@
+"""
+Run blocking work without freezing the web server.
+
+The Google SDKs we use (Document AI, Vision, Vertex AI, Translation, TTS, Storage) are
+synchronous. Calling them directly inside an async endpoint stops every other request on
+the worker, so we hand them to a small shared thread pool with a fixed upper bound.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+# Support both package and script execution imports
+try:
+    from ..config import MAX_BLOCKING_WORKERS
+    from .metrics import BLOCKING_IN_FLIGHT
+except ImportError:
+    from config import MAX_BLOCKING_WORKERS
+    from utils.metrics import BLOCKING_IN_FLIGHT
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, MAX_BLOCKING_WORKERS),
+                    thread_name_prefix="blocking",
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking function in the shared executor and await its result."""
+    loop = asyncio.get_running_loop()
+    BLOCKING_IN_FLIGHT.inc()
+    try:
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    finally:
+        BLOCKING_IN_FLIGHT.dec()
+
+
+async def iterate_blocking(func: Callable[..., Iterable[T]], *args: Any, **kwargs: Any) -> AsyncIterator[T]:
+    """Consume a blocking iterator (e.g. a streaming SDK response) in the shared executor.
+
+    Items are handed to the event loop one by one as they arrive. If the consumer stops
+    early, the worker thread stops pulling at the next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def put(item: Any, error: Optional[BaseException] = None) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            stop.set()  # the event loop is gone; nobody is listening any more
+
+    def produce() -> None:
+        try:
+            for item in func(*args, **kwargs):
+                if stop.is_set():
+                    return
+                put(item)
+        except Exception as e:  # re-raised in the consumer
+            put(done, e)
+            return
+        put(done)
+
+    loop.run_in_executor(get_executor(), produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        stop.set()
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Stop the shared executor (called on app shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
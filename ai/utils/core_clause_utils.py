@@ -0,0 +1,208 @@
+"""
+Precomputed embeddings for the standard/core clauses.
+
+generate_core_clauses.py writes two files to CORE_CLAUSES_ARTIFACT_DIR (ai/cache/core_clauses
+by default):
+- core_clauses.npy: one embedding row per clause (float32)
+- core_clauses.manifest.json: format version, embedding model, and for each row the
+  clause name and a hash of its text
+
+At startup we memory-map these instead of calling Vertex AI. Only clauses that are new,
+or whose text changed since the artifact was written, are embedded again; if the
+artifact was made with a different model it is ignored. A small background task
+watches the files and reloads them when they change, so clauses can be updated
+without restarting the server.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Support both package and script execution imports
+try:
+    from ..config import EMBEDDING_MODEL, CORE_CLAUSES_ARTIFACT_DIR, CORE_CLAUSES_RELOAD_INTERVAL_S
+    from .embedding_utils import get_embeddings
+    from .concurrency_utils import run_blocking
+    from .anomaly_utils import ClauseDetector
+except ImportError:
+    from config import EMBEDDING_MODEL, CORE_CLAUSES_ARTIFACT_DIR, CORE_CLAUSES_RELOAD_INTERVAL_S
+    from utils.embedding_utils import get_embeddings
+    from utils.concurrency_utils import run_blocking
+    from utils.anomaly_utils import ClauseDetector
+
+ARTIFACT_VERSION = 1
+EMBEDDINGS_FILE = "core_clauses.npy"
+MANIFEST_FILE = "core_clauses.manifest.json"
+NORMAL_DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "normal_data.py")
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_core_clauses(path: Optional[str] = None) -> Dict[str, str]:
+    """Load CORE_CLAUSES fresh from normal_data.py (bypasses the import cache)."""
+    path = path or NORMAL_DATA_FILE
+    spec = importlib.util.spec_from_file_location("_core_clauses_reload", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load core clauses from {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return dict(getattr(module, "CORE_CLAUSES", {}) or {})
+
+
+def write_core_clause_artifact(
+    clauses: Dict[str, str],
+    embeddings: List[List[float]],
+    directory: str = CORE_CLAUSES_ARTIFACT_DIR,
+    model_name: str = EMBEDDING_MODEL,
+) -> None:
+    """Write the embeddings + manifest atomically (readers never see half a file)."""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if len(clauses) and matrix.shape[0] != len(clauses):
+        raise ValueError("Expected one embedding per clause")
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "model": model_name,
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "created_at": time.time(),
+        "clauses": [{"name": name, "text_sha256": _text_hash(text)} for name, text in clauses.items()],
+    }
+    npy_tmp = os.path.join(directory, f"{EMBEDDINGS_FILE}.tmp")
+    with open(npy_tmp, "wb") as f:
+        np.save(f, matrix)
+    manifest_tmp = os.path.join(directory, f"{MANIFEST_FILE}.tmp")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    # Embeddings first, manifest last: a manifest always describes a complete .npy
+    os.replace(npy_tmp, os.path.join(directory, EMBEDDINGS_FILE))
+    os.replace(manifest_tmp, os.path.join(directory, MANIFEST_FILE))
+
+
+def _read_artifact(directory: str) -> Dict[str, Tuple[str, np.ndarray]]:
+    """Return name -> (text hash, vector) from a valid artifact, or {} if missing/stale."""
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    npy_path = os.path.join(directory, EMBEDDINGS_FILE)
+    if not (os.path.isfile(manifest_path) and os.path.isfile(npy_path)):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != ARTIFACT_VERSION or manifest.get("model") != EMBEDDING_MODEL:
+        print("Core clause artifact is stale (format or embedding model changed); ignoring it.")
+        return {}
+    matrix = np.load(npy_path, mmap_mode="r")
+    entries = manifest.get("clauses", [])
+    if matrix.ndim != 2 or matrix.shape[0] != len(entries):
+        print("Core clause artifact does not match its manifest; ignoring it.")
+        return {}
+    # Copy the (small) rows out so the file can be replaced while we keep serving
+    return {
+        entry["name"]: (entry["text_sha256"], np.array(matrix[i], dtype=np.float32))
+        for i, entry in enumerate(entries)
+    }
+
+
+def load_core_clause_embeddings(
+    clauses: Dict[str, str],
+    directory: str = CORE_CLAUSES_ARTIFACT_DIR,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Embeddings for every clause: from the artifact when up to date, else from the API.
+
+    If anything had to be embedded, the artifact is rewritten so the next start is fast.
+    If that embedding call fails, the clauses the artifact still covers are returned on
+    their own, the others are listed in info["missing"], and the artifact is left as is.
+    Returns (name -> embedding, info about what happened).
+    """
+    try:
+        stored = _read_artifact(directory)
+    except Exception as e:
+        print(f"Warning: failed to read core clause artifact: {e}")
+        stored = {}
+
+    result: Dict[str, np.ndarray] = {}
+    to_embed: Dict[str, str] = {}
+    for name, text in clauses.items():
+        hit = stored.get(name)
+        if hit is not None and hit[0] == _text_hash(text):
+            result[name] = hit[1]
+        else:
+            to_embed[name] = text
+
+    missing: List[str] = []
+    if to_embed:
+        try:
+            vectors = get_embeddings(list(to_embed.values()))
+        except Exception as e:
+            if not result:
+                raise
+            # Serve the clauses the artifact still covers rather than none at all
+            print(f"Warning: failed to embed {len(to_embed)} new/changed core clauses: {e}")
+            missing = list(to_embed.keys())
+        else:
+            for name, vector in zip(to_embed.keys(), vectors):
+                result[name] = np.asarray(vector, dtype=np.float32)
+            try:
+                ordered = {name: clauses[name] for name in clauses}
+                write_core_clause_artifact(ordered, [result[name] for name in ordered], directory)
+            except Exception as e:
+                print(f"Warning: failed to refresh core clause artifact: {e}")
+
+    # Keep the CORE_CLAUSES order
+    result = {name: result[name] for name in clauses if name in result}
+    info = {
+        "from_artifact": len(clauses) - len(to_embed),
+        "embedded": len(to_embed) - len(missing),
+        "missing": missing,
+    }
+    return result, info
+
+
+def publish_core_clauses(app_state: Dict[str, Any], embeddings: Dict[str, np.ndarray]) -> None:
+    """Make a clause set live: the raw embeddings plus the detector built from them."""
+    # Build first, then swap both keys, so requests never see a half-updated pair
+    detector = ClauseDetector(embeddings)
+    app_state["core_embeddings"] = embeddings
+    app_state["clause_detector"] = detector
+
+
+def _files_signature(directory: str) -> Tuple[Optional[float], ...]:
+    paths = (
+        os.path.join(directory, MANIFEST_FILE),
+        os.path.join(directory, EMBEDDINGS_FILE),
+        NORMAL_DATA_FILE,
+    )
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+async def watch_core_clauses(app_state: Dict[str, Any], directory: str = CORE_CLAUSES_ARTIFACT_DIR) -> None:
+    """Poll the artifact and normal_data.py; on change, reload and swap core_embeddings."""
+    if CORE_CLAUSES_RELOAD_INTERVAL_S <= 0:
+        return
+    # Clauses that could not be embedded at startup are retried on the first poll
+    last_signature = None if app_state.get("core_clauses_missing") else _files_signature(directory)
+    while True:
+        await asyncio.sleep(CORE_CLAUSES_RELOAD_INTERVAL_S)
+        signature = _files_signature(directory)
+        if signature == last_signature:
+            continue
+        try:
+            clauses = await run_blocking(read_core_clauses)
+            embeddings, info = await run_blocking(load_core_clause_embeddings, clauses, directory)
+            publish_core_clauses(app_state, embeddings)
+            app_state["core_clauses_missing"] = info["missing"]
+            print(
+                f"Reloaded {len(embeddings)} core clauses "
+                f"({info['from_artifact']} from artifact, {info['embedded']} re-embedded, "
+                f"{len(info['missing'])} missing)"
+            )
+        except Exception as e:
+            print(f"Warning: core clause reload failed, keeping the previous set: {e}")
+        # Our own rewrite of the artifact changes the mtimes; don't treat it as a new change.
+        # With clauses still missing, leave the signature unset so the next poll retries them.
+        last_signature = None if app_state.get("core_clauses_missing") else _files_signature(directory)
@@ -0,0 +1,156 @@
+"""
+Micro-batching of query embeddings.
+
+Every chat question needs one embedding, and sent one by one they become hundreds of
+single-text Vertex AI requests per second at peak, which runs into per-minute request
+quotas although one request may carry 250 texts. The batcher collects the questions that
+arrive within a short window (or until the batch is full), embeds them with one call, and
+hands each caller its own vector.
+
+- A caller waits at most the window (plus the API call) before its batch is sent.
+- Up to `max_in_flight` batches may be with the API at once, so one slow call does not
+  hold up the next batch.
+- Batch sizes, flush latency (the API call) and queue wait (time before the batch was
+  sent) are counted for /healthz; batch sizes and queue waits also go to /metrics.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Support both package and script execution imports
+try:
+    from .metrics import QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_FAILED_BATCHES, QUERY_EMBED_QUEUE_WAIT_SECONDS
+except ImportError:
+    from utils.metrics import QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_FAILED_BATCHES, QUERY_EMBED_QUEUE_WAIT_SECONDS
+
+
+class _Metric:
+    """Count, mean and maximum of one measurement."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self, scale: float = 1.0, digits: int = 2) -> Dict[str, Any]:
+        return {
+            "mean": round(self.total / self.count * scale, digits) if self.count else 0.0,
+            "max": round(self.max * scale, digits),
+        }
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed: Callable[[List[str]], List[List[float]]],
+        window_s: float,
+        max_batch: int,
+        max_in_flight: int = 4,
+    ) -> None:
+        self._embed = embed
+        self.window_s = max(0.0, window_s)
+        self.max_batch = max(1, max_batch)
+        self._cond = threading.Condition()
+        # (text, caller's future, time it was queued)
+        self._pending: List[Tuple[str, "Future[List[float]]", float]] = []
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._flush_pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="query-embed")
+        self.requests = 0
+        self.failed_batches = 0
+        self._batch_size = _Metric()
+        self._flush_latency = _Metric()
+        self._queue_wait = _Metric()
+
+    def submit(self, text: str) -> "Future[List[float]]":
+        """Queue one text; the future resolves to its embedding once its batch returns."""
+        future: "Future[List[float]]" = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Query embedding batcher is closed")
+            self._pending.append((text, future, time.perf_counter()))
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="query-embed-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def _collect(self) -> None:
+        """Wait for the first text, then until the window ends or the batch is full, and send it."""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0][2] + self.window_s
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+            try:
+                self._flush_pool.submit(self._flush, batch)
+            except RuntimeError as e:
+                # Pool already shut down: fail the callers instead of leaving them waiting
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def _flush(self, batch: List[Tuple[str, "Future[List[float]]", float]]) -> None:
+        started = time.perf_counter()
+        try:
+            vectors = self._embed([text for text, _, _ in batch])
+        except Exception as e:
+            with self._cond:
+                self.failed_batches += 1
+            QUERY_EMBED_FAILED_BATCHES.inc()
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        with self._cond:
+            self._batch_size.add(len(batch))
+            self._flush_latency.add(finished - started)
+            for _, _, queued_at in batch:
+                self._queue_wait.add(started - queued_at)
+        QUERY_EMBED_BATCH_SIZE.observe(len(batch))
+        for _, _, queued_at in batch:
+            QUERY_EMBED_QUEUE_WAIT_SECONDS.observe(started - queued_at)
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def close(self, wait: bool = True) -> None:
+        """Send what is still queued, then stop the collector and the flush pool."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._flush_pool.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "batches": self._batch_size.count,
+                "failed_batches": self.failed_batches,
+                "pending": len(self._pending),
+                "window_ms": round(self.window_s * 1000, 2),
+                "max_batch": self.max_batch,
+                "batch_size": self._batch_size.to_dict(),
+                "flush_latency_ms": self._flush_latency.to_dict(scale=1000),
+                "queue_wait_ms": self._queue_wait.to_dict(scale=1000),
+            }
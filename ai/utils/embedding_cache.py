@@ -0,0 +1,166 @@
+"""
+Content-addressed cache for text embeddings.
+
+Most rental agreements share the same boilerplate, so the same chunk text is embedded
+again and again. We remember each embedding under a hash of (model name, normalized
+text) and only call Vertex AI for texts we have never seen.
+
+Two tiers:
+- memory: a bounded LRU of float32 vectors (fast, per worker)
+- disk: a local SQLite file (survives restarts, shared by workers on the same machine)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different copies of a clause share one entry."""
+    return " ".join((text or "").split())
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (LRU memory + SQLite) embedding cache with hit/miss/eviction counters.
+
+    The lock only guards the memory tier and the counters. SQLite reads and writes run
+    outside it, each thread on its own connection (WAL mode lets readers carry on while
+    another thread writes), so a slow disk never holds up memory hits.
+    """
+
+    def __init__(self, db_path: Optional[str], max_memory_items: int) -> None:
+        self.max_memory_items = max(0, max_memory_items)
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_path: Optional[str] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                conn = sqlite3.connect(db_path, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                conn.commit()
+                conn.close()
+                self._db_path = db_path
+            except Exception as e:
+                # The memory tier still works without the disk tier
+                print(f"Warning: embedding cache disk tier disabled ({db_path}): {e}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's SQLite connection (opened on first use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert into the memory tier (caller holds the lock)."""
+        if self.max_memory_items == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        try:
+            conn = self._connection()
+            # SQLite caps bound variables per statement, so look up in slices
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: failed to read embeddings from disk cache: {e}")
+        return found
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Look up keys in memory, then on disk. Missing keys are simply absent from the result."""
+        found: Dict[str, np.ndarray] = {}
+        pending: List[str] = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    pending.append(key)
+        if not pending:
+            return found
+
+        from_disk = self._read_disk(pending) if self._db_path is not None else {}
+        with self._lock:
+            for key, vector in from_disk.items():
+                found[key] = vector
+                self._remember(key, vector)
+            self.disk_hits += len(from_disk)
+            self.misses += len(pending) - len(from_disk)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        if self._db_path is not None:
+            try:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(v, dtype=np.float32).tobytes()) for key, v in items.items()],
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"Warning: failed to write embeddings to disk cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+                "disk_enabled": self._db_path is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db_path = None
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -1,62 +1,174 @@
-from typing import List
-# Support both package and script execution imports
-try:
-    from ..config import EMBEDDING_MODEL, CHUNK_SIZE, PROJECT_ID, LOCATION
-except ImportError:
-    from config import EMBEDDING_MODEL, CHUNK_SIZE, PROJECT_ID, LOCATION
-import time
-import vertexai
-from vertexai.language_models import TextEmbeddingModel
-
-def chunk_text(text: str, chunk_size: int = 0) -> List[str]:
-    """Split long text into smaller pieces (chunks) for better search and processing."""
-    if chunk_size == 0:
-        chunk_size = CHUNK_SIZE
-    
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size):
-        chunk = " ".join(words[i:i + chunk_size])
-        if chunk.strip():
-            chunks.append(chunk)
-    return chunks
-
-def get_embeddings(chunks: List[str]) -> List[List[float]]:
-    """Turn text chunks into numeric vectors (embeddings) using Google Vertex AI.
-
-    We send data in batches (max 250 each) and retry automatically on temporary errors.
-    """
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-    model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
-    # Filter out empty strings to avoid unnecessary calls
-    inputs = [c if c is not None else "" for c in chunks]
-
-    MAX_PER_REQUEST = 250
-    all_results = []
-    for i in range(0, len(inputs), MAX_PER_REQUEST):
-        batch = inputs[i : i + MAX_PER_REQUEST]
-        # Retry loop with exponential backoff for transient errors
-        attempts = 0
-        while True:
-            try:
-                batch_results = model.get_embeddings(texts=batch)  # type: ignore[arg-type]
-                all_results.extend(batch_results)
-                break
-            except Exception as e:
-                attempts += 1
-                if attempts >= 5:
-                    raise
-                # Backoff: 1s, 2s, 4s, 8s
-                sleep_s = min(8, 2 ** (attempts - 1))
-                # Optional: log the transient error
-                print(f"Embedding batch failed (attempt {attempts}) due to {e}. Retrying in {sleep_s}s...")
-                time.sleep(sleep_s)
-
-    return [r.values for r in all_results]
-
-def get_embedding_for_query(text: str) -> List[float]:
-    """Turn a single question into a numeric vector so we can find matching text."""
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-    model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
-    result = model.get_embeddings(texts=[text or ""])  # type: ignore[arg-type]
-    return result[0].values
\ No newline at end of file
+from typing import Any, Dict, List, Optional
+# Support both package and script execution imports
+try:
+    from ..config import CHUNK_SIZE, EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS
+    from ..config import QUERY_EMBED_BATCH_WINDOW_MS, QUERY_EMBED_MAX_BATCH, QUERY_EMBED_MAX_IN_FLIGHT
+    from .client_registry import get_embedding_model
+    from .embedding_cache import EmbeddingCache, embedding_key
+    from .embedding_batcher import EmbeddingBatcher
+    from .metrics import track_call, EXTERNAL_RETRIES
+except ImportError:
+    from config import CHUNK_SIZE, EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS
+    from config import QUERY_EMBED_BATCH_WINDOW_MS, QUERY_EMBED_MAX_BATCH, QUERY_EMBED_MAX_IN_FLIGHT
+    from utils.client_registry import get_embedding_model
+    from utils.embedding_cache import EmbeddingCache, embedding_key
+    from utils.embedding_batcher import EmbeddingBatcher
+    from utils.metrics import track_call, EXTERNAL_RETRIES
+import threading
+import time
+import numpy as np
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+_query_batcher: Optional[EmbeddingBatcher] = None
+_query_batcher_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache (memory LRU + optional SQLite file)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS)
+    return _cache
+
+
+def get_embedding_cache_stats() -> Dict[str, Any]:
+    return get_embedding_cache().stats()
+
+
+def close_embedding_cache() -> None:
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+
+
+def chunk_text(text: str, chunk_size: int = 0) -> List[str]:
+    """Split long text into smaller pieces (chunks) for better search and processing."""
+    if chunk_size == 0:
+        chunk_size = CHUNK_SIZE
+    
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size):
+        chunk = " ".join(words[i:i + chunk_size])
+        if chunk.strip():
+            chunks.append(chunk)
+    return chunks
+
+def _embed_uncached(texts: List[str]) -> List[List[float]]:
+    """Call Vertex AI for texts that are not in the cache.
+
+    We send data in batches (max 250 each) and retry automatically on temporary errors.
+    """
+    model = get_embedding_model()
+
+    MAX_PER_REQUEST = 250
+    all_results = []
+    for i in range(0, len(texts), MAX_PER_REQUEST):
+        batch = texts[i : i + MAX_PER_REQUEST]
+        # Retry loop with exponential backoff for transient errors
+        attempts = 0
+        while True:
+            try:
+                with track_call("vertex_embeddings"):
+                    batch_results = model.get_embeddings(texts=batch)  # type: ignore[arg-type]
+                all_results.extend(batch_results)
+                break
+            except Exception as e:
+                attempts += 1
+                if attempts >= 5:
+                    raise
+                EXTERNAL_RETRIES.labels("vertex_embeddings").inc()
+                # Backoff: 1s, 2s, 4s, 8s
+                sleep_s = min(8, 2 ** (attempts - 1))
+                # Optional: log the transient error
+                print(f"Embedding batch failed (attempt {attempts}) due to {e}. Retrying in {sleep_s}s...")
+                time.sleep(sleep_s)
+
+    return [r.values for r in all_results]
+
+
+def get_embeddings(chunks: List[str]) -> List[List[float]]:
+    """Turn text chunks into numeric vectors (embeddings) using Google Vertex AI.
+
+    Embeddings we have computed before (same model, same text) come from the cache;
+    only the remaining texts are sent to Vertex AI, each distinct text once.
+    """
+    inputs = [c if c is not None else "" for c in chunks]
+    if not inputs:
+        return []
+    cache = get_embedding_cache()
+    keys = [embedding_key(EMBEDDING_MODEL, text) for text in inputs]
+    found = cache.get_many(keys)
+
+    # Distinct texts that still need an API call (repeated boilerplate is sent once)
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, inputs):
+        if key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        vectors = _embed_uncached(list(missing.values()))
+        fresh = {key: np.asarray(v, dtype=np.float32) for key, v in zip(missing.keys(), vectors)}
+        cache.put_many(fresh)
+        found.update(fresh)
+
+    return [found[key].tolist() for key in keys]
+
+
+def _embed_queries(texts: List[str]) -> List[List[float]]:
+    """Embed a batch of questions that already missed the cache (identical ones sent once)."""
+    keys = [embedding_key(EMBEDDING_MODEL, text) for text in texts]
+    distinct = dict(zip(keys, texts))
+    vectors = _embed_uncached(list(distinct.values()))
+    fresh = {key: np.asarray(v, dtype=np.float32) for key, v in zip(distinct.keys(), vectors)}
+    get_embedding_cache().put_many(fresh)
+    return [fresh[key].tolist() for key in keys]
+
+
+def _get_query_batcher() -> EmbeddingBatcher:
+    global _query_batcher
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = EmbeddingBatcher(
+                    _embed_queries,
+                    QUERY_EMBED_BATCH_WINDOW_MS / 1000.0,
+                    QUERY_EMBED_MAX_BATCH,
+                    QUERY_EMBED_MAX_IN_FLIGHT,
+                )
+    return _query_batcher
+
+
+def get_query_batcher_stats() -> Optional[Dict[str, Any]]:
+    """Batch size, flush latency and queue wait of query embeddings (None before the first query)."""
+    with _query_batcher_lock:
+        return _query_batcher.stats() if _query_batcher is not None else None
+
+
+def shutdown_query_batcher(wait: bool = True) -> None:
+    """Send any queued questions and stop the batcher (called on app shutdown)."""
+    global _query_batcher
+    with _query_batcher_lock:
+        if _query_batcher is not None:
+            _query_batcher.close(wait=wait)
+            _query_batcher = None
+
+
+def get_embedding_for_query(text: str) -> List[float]:
+    """Turn a single question into a numeric vector so we can find matching text.
+
+    Questions seen before come straight from the cache; the others wait up to
+    QUERY_EMBED_BATCH_WINDOW_MS and are embedded together with concurrent questions.
+    """
+    text = text or ""
+    if QUERY_EMBED_BATCH_WINDOW_MS <= 0:
+        return get_embeddings([text])[0]
+    key = embedding_key(EMBEDDING_MODEL, text)
+    cached = get_embedding_cache().get_many([key])
+    if key in cached:
+        return cached[key].tolist()
+    return _get_query_batcher().embed(text)
@@ -0,0 +1,163 @@
+"""
+In-process job queue for long-running document processing.
+
+Processing a lease (OCR, embeddings, Gemini, translation, TTS) can take tens of seconds,
+which is longer than proxies and load balancers like to keep a request open. In job mode
+the upload is accepted straight away and given a job ID; a fixed number of worker tasks
+take jobs from a bounded queue and run the pipeline, and clients poll for the status.
+
+- The number of workers caps how many documents are processed at once, independently of
+  how many HTTP requests the server accepts.
+- When the queue is full, new jobs are rejected immediately (JobQueueFull) instead of
+  waiting, so callers can retry later or elsewhere.
+- Each job records which stage is running and how long each finished stage took.
+- Finished jobs are kept for JOB_RESULT_TTL_S seconds so clients can fetch the result;
+  older ones are forgotten whenever a job is submitted, finishes or is looked up.
+"""
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class PipelineProgress:
+    """Receives stage events from the processing pipeline. The base class ignores them."""
+
+    def stage_started(self, stage: str) -> None:
+        pass
+
+    def stage_finished(self, stage: str, seconds: float, data: Dict[str, Any]) -> None:
+        pass
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its maximum depth."""
+
+
+class Job(PipelineProgress):
+    """One queued document: its state, per-stage timings, and the result or error."""
+
+    def __init__(self, run: Callable[["Job"], Awaitable[Any]]) -> None:
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued -> running -> succeeded / failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.stage: Optional[str] = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._run: Optional[Callable[["Job"], Awaitable[Any]]] = run
+
+    def stage_started(self, stage: str) -> None:
+        self.stage = stage
+        self.stages[stage] = {"status": "running", "seconds": None}
+
+    def stage_finished(self, stage: str, seconds: float, data: Dict[str, Any]) -> None:
+        self.stages[stage] = {"status": "done", "seconds": round(seconds, 3)}
+        # Several stages run concurrently; show one that is still going, if any
+        if self.stage == stage:
+            running = [name for name, info in self.stages.items() if info["status"] == "running"]
+            self.stage = running[-1] if running else stage
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+            "elapsed_seconds": round(now - (self.started_at or now), 3),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Bounded queue of jobs served by a fixed pool of asyncio worker tasks."""
+
+    def __init__(self, workers: int, max_depth: int, result_ttl_s: float) -> None:
+        self.worker_count = max(1, workers)
+        self.max_depth = max(1, max_depth)
+        self.result_ttl_s = max(0.0, result_ttl_s)
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._jobs: Dict[str, Job] = {}
+        # (finished_at, job_id) in the order jobs finished, so pruning only looks at expired ones
+        self._finished: Deque[Tuple[float, str]] = deque()
+        self.rejected = 0
+
+    def start(self) -> None:
+        """Create the queue and worker tasks (must be called from the running event loop)."""
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.worker_count)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, run: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Queue run(job) and return the job at once; raise JobQueueFull when saturated."""
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        self._prune()
+        job = Job(run)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFull(f"Job queue is full ({self.max_depth} waiting)")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl_s
+        while self._finished and self._finished[0][0] < cutoff:
+            _, job_id = self._finished.popleft()
+            self._jobs.pop(job_id, None)
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            run, job._run = job._run, None  # drop the upload bytes once the job is done
+            try:
+                job.result = await run(job)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Server shutting down"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(getattr(e, "detail", "") or e)
+            finally:
+                job.finished_at = time.time()
+                self._finished.append((job.finished_at, job.id))
+                self._queue.task_done()
+            self._prune()
+
+    def stats(self) -> Dict[str, Any]:
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.status] = states.get(job.status, 0) + 1
+        return {
+            "workers": self.worker_count,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_depth": self.max_depth,
+            "rejected": self.rejected,
+            "jobs": states,
+        }
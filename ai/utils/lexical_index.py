@@ -0,0 +1,134 @@
+"""
+Local lexical (keyword) search over a document's chunks with BM25.
+
+Legal questions often contain exact terms ("Rs.40,000", "5th of every month", a clause
+title) that keyword matching finds better than embeddings, and it needs no network call.
+Each document gets a small inverted index (term -> chunk ids and counts) built from its
+chunks; a query scores only the chunks that contain one of its terms.
+
+- Amounts are indexed without separators, so "Rs.40,000", "Rs 40000" and "40,000" match.
+- Ordinals stay whole ("5th"), other text is split into lowercase words minus stop words.
+- reciprocal_rank_fusion merges the lexical ranking with the vector ranking.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Support both package and script execution imports
+try:
+    from .metrics import SEARCH_SECONDS
+except ImportError:
+    from utils.metrics import SEARCH_SECONDS
+
+# Standard BM25 parameters: term-frequency saturation and length normalization
+_K1 = 1.5
+_B = 0.75
+
+_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*(?:st|nd|rd|th)?|[a-z]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my "
+    "of on or shall should that the their there this to was what when where which who "
+    "will with would you your".split()
+)
+
+_stats_lock = threading.Lock()
+_stats = {"builds": 0, "build_ms": 0.0, "queries": 0, "query_ms": 0.0}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token[0].isdigit():
+            # "40,000" and "40000" are the same amount; "12.5" keeps its decimal point
+            token = token.replace(",", "")
+            if token.count(".") > 1:
+                token = token.replace(".", "")
+            tokens.append(token)
+        elif token not in _STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index over one document's chunks, scored with Okapi BM25."""
+
+    def __init__(self, chunks: Sequence[str]) -> None:
+        started = time.perf_counter()
+        self.size = len(chunks)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for chunk_id in range(self.size):
+            counts = Counter(tokenize(chunks[chunk_id]))
+            lengths[chunk_id] = sum(counts.values())
+            for term, count in counts.items():
+                ids, freqs = postings.setdefault(term, ([], []))
+                ids.append(chunk_id)
+                freqs.append(count)
+        self._postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(freqs, dtype=np.float32))
+            for term, (ids, freqs) in postings.items()
+        }
+        average = float(lengths.mean()) if self.size else 0.0
+        # Per-chunk part of the BM25 denominator, computed once
+        self._norm = _K1 * (1 - _B + _B * lengths / average) if average > 0 else np.full(self.size, _K1, dtype=np.float32)
+        with _stats_lock:
+            _stats["builds"] += 1
+            _stats["build_ms"] += (time.perf_counter() - started) * 1000
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory use (posting arrays plus a rough per-term overhead)."""
+        postings = sum(ids.nbytes + freqs.nbytes + 100 for ids, freqs in self._postings.values())
+        return postings + int(self._norm.nbytes)
+
+    def _idf(self, document_frequency: int) -> float:
+        return math.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query: str, top_k: int) -> List[int]:
+        """Ids of the best matching chunks, best first (only chunks sharing a term with the query)."""
+        started = time.perf_counter()
+        scores = np.zeros(self.size, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, freqs = posting
+            scores[ids] += self._idf(len(ids)) * freqs * (_K1 + 1) / (freqs + self._norm[ids])
+            matched = True
+        ranking: List[int] = []
+        if matched and top_k > 0:
+            top_k = min(top_k, self.size)
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            ranking = [int(i) for i in candidates[np.argsort(-scores[candidates])] if scores[i] > 0]
+        elapsed = time.perf_counter() - started
+        SEARCH_SECONDS.labels("lexical").observe(elapsed)
+        with _stats_lock:
+            _stats["queries"] += 1
+            _stats["query_ms"] += elapsed * 1000
+        return ranking
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merge several best-first rankings: each id scores sum(1 / (k + rank)) over the lists."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
+
+
+def get_lexical_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        builds, queries = _stats["builds"], _stats["queries"]
+        return {
+            "builds": builds,
+            "build_ms_mean": round(_stats["build_ms"] / builds, 3) if builds else 0.0,
+            "queries": queries,
+            "query_ms_mean": round(_stats["query_ms"] / queries, 3) if queries else 0.0,
+        }
@@ -0,0 +1,179 @@
+"""
+Prometheus metrics for the AI backend (served at /metrics).
+
+What is measured:
+- every pipeline stage (OCR, embeddings, clauses, indexing, summary, translation, audio)
+- every chat step (question embedding, retrieval, answer, translation, audio)
+- every call to a Google service (Document AI, Vision, Vertex embeddings, Gemini,
+  Translation, TTS, Cloud Storage), with its outcome, plus embedding retries
+- Gemini attempts per model and outcome, and which model answered
+- chunk retrieval (vector and keyword search) latency, and the size of the document store
+- query embedding batches: how many questions each carried and how long they waited
+- HTTP requests in flight and their latency per route
+
+Updating a counter or histogram is a lock and a few additions, so this stays on in
+production. Values are per worker process.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Match
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Seconds: from a fast cache hit to a slow Gemini or OCR call
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Seconds: local index lookups are sub-millisecond to a few milliseconds
+_SEARCH_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+# Seconds a question waits for its embedding batch to be sent: about the batching window
+_QUEUE_WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.015, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Texts per embedding call (Vertex AI takes at most 250)
+_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 250)
+
+STAGE_SECONDS = Histogram(
+    "legalsense_stage_seconds", "Duration of each document pipeline stage",
+    ["stage", "cached"], buckets=_LATENCY_BUCKETS,
+)
+CHAT_STAGE_SECONDS = Histogram(
+    "legalsense_chat_stage_seconds", "Duration of each chat step",
+    ["stage"], buckets=_LATENCY_BUCKETS,
+)
+PIPELINE_SECONDS = Histogram(
+    "legalsense_pipeline_seconds", "Duration of the whole document pipeline",
+    ["cached"], buckets=_LATENCY_BUCKETS,
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "legalsense_external_call_seconds", "Latency of calls to Google services",
+    ["service", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+EXTERNAL_RETRIES = Counter(
+    "legalsense_external_retries_total", "Calls to Google services that were retried", ["service"],
+)
+GEMINI_ATTEMPTS = Counter(
+    "legalsense_gemini_attempts_total",
+    "Gemini attempts by model and outcome (answered, failed, timed_out, skipped, hedged)",
+    ["model", "outcome"],
+)
+GEMINI_ANSWER_SECONDS = Histogram(
+    "legalsense_gemini_answer_seconds", "Time until a Gemini model answered (first token when streaming)",
+    ["model"], buckets=_LATENCY_BUCKETS,
+)
+GEMINI_ALL_FAILED = Counter(
+    "legalsense_gemini_all_models_failed_total", "Gemini requests where no model answered",
+)
+QUERY_EMBED_BATCH_SIZE = Histogram(
+    "legalsense_query_embed_batch_size", "Chat questions embedded per Vertex AI call",
+    buckets=_BATCH_SIZE_BUCKETS,
+)
+QUERY_EMBED_QUEUE_WAIT_SECONDS = Histogram(
+    "legalsense_query_embed_queue_wait_seconds", "Time a chat question waited before its embedding batch was sent",
+    buckets=_QUEUE_WAIT_BUCKETS,
+)
+QUERY_EMBED_FAILED_BATCHES = Counter(
+    "legalsense_query_embed_failed_batches_total", "Query embedding batches whose Vertex AI call failed",
+)
+SEARCH_SECONDS = Histogram(
+    "legalsense_search_seconds", "Chunk retrieval latency within one document",
+    ["kind"], buckets=_SEARCH_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge(
+    "legalsense_http_requests_in_progress", "HTTP requests being handled", ["route"],
+)
+HTTP_SECONDS = Histogram(
+    "legalsense_http_request_seconds", "HTTP request latency (until the response body is sent)",
+    ["route", "method", "status"], buckets=_LATENCY_BUCKETS,
+)
+BLOCKING_IN_FLIGHT = Gauge(
+    "legalsense_blocking_calls_in_flight", "Blocking SDK calls queued or running in the shared thread pool",
+)
+DOCUMENTS = Gauge("legalsense_documents", "Documents known to the document store")
+INDEXED_CHUNKS = Gauge("legalsense_indexed_chunks", "Chunks (vectors) indexed across all documents")
+DOCUMENT_MEMORY_BYTES = Gauge("legalsense_document_memory_bytes", "Estimated memory of loaded documents")
+JOBS_QUEUED = Gauge("legalsense_jobs_queued", "Documents waiting in the job queue")
+
+
+@contextmanager
+def track_call(service: str) -> Iterator[None]:
+    """Time one call to an external service, labelled ok or error."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        EXTERNAL_CALL_SECONDS.labels(service, outcome).observe(time.perf_counter() - started)
+
+
+def observe_call(service: str, seconds: float, ok: bool) -> None:
+    """Record a call timed by hand (e.g. a stream, where only the upstream part counts)."""
+    EXTERNAL_CALL_SECONDS.labels(service, "ok" if ok else "error").observe(seconds)
+
+
+def observe_stage(stage: str, seconds: float, cached: bool) -> None:
+    STAGE_SECONDS.labels(stage, "true" if cached else "false").observe(seconds)
+
+
+def bind_app_state(state: Dict[str, Any]) -> None:
+    """Read store and queue sizes from the app state at scrape time (no bookkeeping per request)."""
+
+    def reader(key: str, read: Callable[[Any], float]) -> Callable[[], float]:
+        def value() -> float:
+            obj = state.get(key)
+            return float(read(obj)) if obj is not None else 0.0
+        return value
+
+    DOCUMENTS.set_function(reader("document_store", len))
+    INDEXED_CHUNKS.set_function(reader("document_store", lambda store: store.total_chunks()))
+    DOCUMENT_MEMORY_BYTES.set_function(
+        reader("document_store", lambda store: store.memory_stats()["bytes_in_use"])
+    )
+    JOBS_QUEUED.set_function(reader("job_queue", lambda jobs: jobs.stats()["queued"]))
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
+
+
+def _route_of(scope: Dict[str, Any]) -> str:
+    """Path template of the matching route (e.g. /api/jobs/{job_id}), to keep labels bounded."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "other")
+    return "other"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting in-flight requests and timing them per route.
+
+    Timing ends when the last body chunk is sent, so streamed responses are measured in full.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = _route_of(scope)
+        status = {"code": 500}
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            HTTP_SECONDS.labels(route, scope.get("method", ""), str(status["code"])).observe(
+                time.perf_counter() - started
+            )
@@ -1,38 +1,155 @@
-from google.cloud import documentai_v1 as documentai
-from google.cloud import vision
-
-# Support running as a package (ai.utils) or directly from the ai/ folder
-try:  # package import
-    from ..config import PROJECT_ID, DOCAI_LOCATION, PROCESSOR_ID
-except ImportError:  # direct script import fallback
-    from config import PROJECT_ID, DOCAI_LOCATION, PROCESSOR_ID
-
-def extract_text_from_document(file_bytes: bytes) -> str:
-    """Extract text from a PDF (helper kept for backwards compatibility)."""
-    # Document AI is used primarily for PDFs and similar docs
-    return extract_text_from_pdf(file_bytes)
-
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    """Extract text from a PDF using Google Cloud Document AI (server-side OCR)."""
-    client = documentai.DocumentProcessorServiceClient()
-    name = client.processor_path(PROJECT_ID, DOCAI_LOCATION, PROCESSOR_ID)
-    
-    raw_document = documentai.RawDocument(
-        content=file_bytes, 
-        mime_type="application/pdf"
-    )
-    
-    request = documentai.ProcessRequest(name=name, raw_document=raw_document)
-    result = client.process_document(request=request)
-    
-    return result.document.text.strip()
-
-def extract_text_from_image(file_bytes: bytes) -> str:
-    """Extract text from an image using Google Cloud Vision API (good for photos/scans)."""
-    client = vision.ImageAnnotatorClient()
-    image = vision.Image(content=file_bytes)
-    
-    # Use DOCUMENT_TEXT_DETECTION for dense text, like in a document image
-    response = client.document_text_detection(image=image)  # type: ignore[attr-defined]
-    
-    return response.full_text_annotation.text.strip()
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from google.cloud import documentai_v1 as documentai
+from google.cloud import vision
+from pypdf import PdfReader, PdfWriter
+
+# Support running as a package (ai.utils) or directly from the ai/ folder
+try:  # package import
+    from ..config import (
+        PROJECT_ID,
+        DOCAI_LOCATION,
+        PROCESSOR_ID,
+        OCR_TEXT_LAYER_MIN_CHARS,
+        OCR_PAGES_PER_REQUEST,
+        OCR_MAX_CONCURRENCY,
+    )
+    from .client_registry import get_docai_client, get_vision_client
+    from .metrics import track_call
+except ImportError:  # direct script import fallback
+    from config import (
+        PROJECT_ID,
+        DOCAI_LOCATION,
+        PROCESSOR_ID,
+        OCR_TEXT_LAYER_MIN_CHARS,
+        OCR_PAGES_PER_REQUEST,
+        OCR_MAX_CONCURRENCY,
+    )
+    from utils.client_registry import get_docai_client, get_vision_client
+    from utils.metrics import track_call
+
+# Dedicated pool for page-range OCR calls. It is shared by all requests, so the number
+# of Document AI calls in flight never exceeds OCR_MAX_CONCURRENCY. (The callers already
+# run in the shared blocking executor; submitting back into it could deadlock.)
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+_ocr_executor_lock = threading.Lock()
+
+
+def _get_ocr_executor() -> ThreadPoolExecutor:
+    global _ocr_executor
+    if _ocr_executor is None:
+        with _ocr_executor_lock:
+            if _ocr_executor is None:
+                _ocr_executor = ThreadPoolExecutor(
+                    max_workers=max(1, OCR_MAX_CONCURRENCY),
+                    thread_name_prefix="ocr",
+                )
+    return _ocr_executor
+
+
+def shutdown_ocr_executor(wait: bool = True) -> None:
+    """Stop the page-range OCR pool (called on app shutdown)."""
+    global _ocr_executor
+    with _ocr_executor_lock:
+        if _ocr_executor is not None:
+            _ocr_executor.shutdown(wait=wait)
+            _ocr_executor = None
+
+
+def extract_text_from_document(file_bytes: bytes) -> str:
+    """Extract text from a PDF (helper kept for backwards compatibility)."""
+    # Document AI is used primarily for PDFs and similar docs
+    return extract_text_from_pdf(file_bytes)
+
+
+def _docai_ocr(file_bytes: bytes) -> str:
+    """Run one synchronous Document AI request on a (small) PDF."""
+    client = get_docai_client()
+    name = client.processor_path(PROJECT_ID, DOCAI_LOCATION, PROCESSOR_ID)
+    
+    raw_document = documentai.RawDocument(
+        content=file_bytes, 
+        mime_type="application/pdf"
+    )
+    
+    request = documentai.ProcessRequest(name=name, raw_document=raw_document)
+    with track_call("documentai"):
+        result = client.process_document(request=request)
+    
+    return result.document.text.strip()
+
+
+def _page_text_layer(page) -> str:
+    """Embedded text of a page, or "" if it has none worth using (e.g. a scan)."""
+    try:
+        text = (page.extract_text() or "").strip()
+    except Exception:
+        return ""
+    return text if len(text) >= OCR_TEXT_LAYER_MIN_CHARS else ""
+
+
+def _ocr_ranges(missing: List[int]) -> List[Tuple[int, int]]:
+    """Group page numbers needing OCR into contiguous [start, end) ranges of bounded size."""
+    ranges: List[Tuple[int, int]] = []
+    per_request = max(1, OCR_PAGES_PER_REQUEST)
+    for page in missing:
+        if ranges and ranges[-1][1] == page and page - ranges[-1][0] < per_request:
+            ranges[-1] = (ranges[-1][0], page + 1)
+        else:
+            ranges.append((page, page + 1))
+    return ranges
+
+
+def _range_pdf(reader: PdfReader, start: int, end: int) -> bytes:
+    writer = PdfWriter()
+    for i in range(start, end):
+        writer.add_page(reader.pages[i])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    """Extract text from a PDF, page by page.
+
+    Pages with an embedded text layer (born-digital PDFs) are read locally. The other
+    pages are sent to Google Cloud Document AI in page ranges, several ranges at a time,
+    and the text is put back together in page order. If the PDF cannot be parsed locally
+    the whole file goes to Document AI in one request, as before.
+    """
+    try:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        pages = list(reader.pages)
+    except Exception as e:
+        print(f"Warning: could not parse PDF locally, using whole-document OCR: {e}")
+        return _docai_ocr(file_bytes)
+
+    page_texts = [_page_text_layer(page) for page in pages]
+    missing = [i for i, text in enumerate(page_texts) if not text]
+    if missing:
+        ranges = _ocr_ranges(missing)
+        try:
+            range_pdfs = [_range_pdf(reader, start, end) for start, end in ranges]
+        except Exception as e:
+            print(f"Warning: could not split PDF into page ranges, using whole-document OCR: {e}")
+            return _docai_ocr(file_bytes)
+        # map() keeps results in submission (page) order
+        for (start, _), text in zip(ranges, _get_ocr_executor().map(_docai_ocr, range_pdfs)):
+            page_texts[start] = text
+
+    return "\n".join(text for text in page_texts if text).strip()
+
+
+def extract_text_from_image(file_bytes: bytes) -> str:
+    """Extract text from an image using Google Cloud Vision API (good for photos/scans)."""
+    client = get_vision_client()
+    image = vision.Image(content=file_bytes)
+    
+    # Use DOCUMENT_TEXT_DETECTION for dense text, like in a document image
+    with track_call("vision"):
+        response = client.document_text_detection(image=image)  # type: ignore[attr-defined]
+    
+    return response.full_text_annotation.text.strip()
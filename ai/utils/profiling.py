@@ -0,0 +1,143 @@
+"""
+On-demand profiling of single requests, without redeploying.
+
+A request to one of PROFILE_PATHS is profiled when it carries the header
+`X-Profile-Token: <PROFILE_TOKEN>`, or when it is one of the next N requests after an
+admin call to POST /admin/profiling?count=N. The profile is saved in PROFILE_DIR and
+the response names the file in an `X-Profile-File` header.
+
+- With pyinstrument installed, its sampling profiler is used (async-aware) and an HTML
+  report is saved.
+- Otherwise cProfile is used and a .prof file is saved (open with pstats or snakeviz).
+  cProfile sees the event loop thread only, so other requests running at the same time
+  show up too, and blocking SDK calls appear as time spent awaiting the thread pool.
+
+Only one request is profiled at a time; with PROFILE_TOKEN empty, profiling is off.
+"""
+import cProfile
+import hmac
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument  # optional
+except ImportError:
+    _Pyinstrument = None
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, token: str, paths: List[str]) -> None:
+        self.directory = directory
+        self.token = token
+        self.paths = paths
+        self.kind = "pyinstrument" if _Pyinstrument is not None else "cprofile"
+        self._lock = threading.Lock()
+        self._armed = 0
+        self._busy = False
+        self.saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token and self.directory)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and bool(token) and hmac.compare_digest(token or "", self.token)
+
+    def arm(self, count: int) -> int:
+        """Profile the next `count` matching requests; returns how many are armed."""
+        with self._lock:
+            self._armed = max(0, count)
+            return self._armed
+
+    def _claim(self, scope: Dict[str, Any]) -> bool:
+        """Should this request be profiled? Takes the single profiling slot if so."""
+        if not self.enabled or not any(scope.get("path", "").startswith(p) for p in self.paths):
+            return False
+        header = dict(scope.get("headers") or []).get(b"x-profile-token", b"").decode("latin-1")
+        with self._lock:
+            if self._busy:
+                return False
+            if self.authorized(header):
+                self._busy = True
+            elif self._armed > 0:
+                self._armed -= 1
+                self._busy = True
+            return self._busy
+
+    def _start(self) -> Any:
+        """Start a profiler session, or release the slot and return None if that fails."""
+        try:
+            if _Pyinstrument is not None:
+                session = _Pyinstrument(async_mode="enabled")
+                session.start()
+            else:
+                session = cProfile.Profile()
+                session.enable()
+            return session
+        except Exception as e:
+            print(f"Warning: could not start the profiler: {e}")
+            with self._lock:
+                self._busy = False
+            return None
+
+    def _finish(self, session: Any, file_name: str) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, file_name)
+            if _Pyinstrument is not None:
+                session.stop()
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(session.output_html())
+            else:
+                session.disable()
+                session.dump_stats(path)
+            self.saved += 1
+        except Exception as e:
+            print(f"Warning: failed to save profile {file_name}: {e}")
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "kind": self.kind, "armed": self._armed, "saved": self.saved}
+
+
+def _file_name(scope: Dict[str, Any], kind: str) -> str:
+    route = re.sub(r"[^A-Za-z0-9]+", "-", scope.get("path", "")).strip("-") or "root"
+    extension = "html" if kind == "pyinstrument" else "prof"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{uuid.uuid4().hex[:8]}.{extension}"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running selected requests (see RequestProfiler) under a profiler."""
+
+    def __init__(self, app: Any, profiler: RequestProfiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self.profiler._claim(scope):
+            await self.app(scope, receive, send)
+            return
+        file_name = _file_name(scope, self.profiler.kind)
+
+        async def send_with_name(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers: List[Tuple[bytes, bytes]] = list(message.get("headers") or [])
+                headers.append((b"x-profile-file", file_name.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        session = self.profiler._start()
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            self.profiler._finish(session, file_name)
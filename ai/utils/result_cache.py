@@ -0,0 +1,236 @@
+"""
+Cache of processing results for whole uploads, keyed by a SHA-256 of the file bytes.
+
+The same PDF is often uploaded more than once (retries, shared agreements, switching
+language). Instead of paying for OCR, embeddings, Gemini, translation and TTS again,
+we keep each stage's output on local disk:
+
+- <hash>/stages.json      OCR text, chunks, English summary, document_id
+- <hash>/embeddings.npy   chunk embeddings (float32)
+- <hash>/lang-<code>.json translated summary / suspicion note and audio URL per language
+
+A re-upload costs a hash and a lookup; a new language only redoes translation and TTS.
+The folder is capped at a total size; the least recently used uploads are evicted first.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_STAGES_FILE = "stages.json"
+_EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path):
+            total += os.path.getsize(file_path)
+    return total
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Unique temp name: two threads may write the same file at once
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class DocumentResultCache:
+    """Size-bounded, LRU-evicted on-disk cache of per-upload stage results.
+
+    The lock only guards the bookkeeping (which entries exist, their sizes and last use).
+    Files are read and written outside it, so uploads of different documents do not wait
+    on each other's disk I/O; writes to one entry are serialised by a per-entry lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        # Striped write locks (by key), so read-modify-write of one entry is not lost
+        self._write_locks = [threading.Lock() for _ in range(64)]
+        # hash -> (size in bytes, last access time); rebuilt from disk at startup
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self.hits = 0
+        self.language_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(os.path.join(path, _STAGES_FILE)):
+                self._entries[name] = (_dir_size(path), os.path.getmtime(path))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _write_lock(self, key: str) -> threading.Lock:
+        return self._write_locks[hash(key) % len(self._write_locks)]
+
+    @staticmethod
+    def _language_file(language: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", (language or "en").strip().lower())
+        return f"lang-{safe}.json"
+
+    def _touch(self, key: str) -> None:
+        """Mark an entry as recently used (caller holds the lock)."""
+        size, _ = self._entries.get(key, (0, 0.0))
+        self._entries[key] = (size, time.time())
+
+    def _account(self, key: str) -> List[str]:
+        """Refresh an entry's size and pick old entries to evict while over budget (caller
+        holds the lock). Returns the folders to delete once the lock is released."""
+        self._entries[key] = (_dir_size(self._path(key)), time.time())
+        total = sum(size for size, _ in self._entries.values())
+        victims: List[str] = []
+        for victim, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if victim == key:
+                continue
+            victims.append(self._path(victim))
+            del self._entries[victim]
+            total -= size
+            self.evictions += 1
+        return victims
+
+    @staticmethod
+    def _remove(paths: List[str]) -> None:
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _mark_used(self, key: str) -> None:
+        # Keeps the LRU order across restarts (entries are reloaded by folder mtime)
+        now = time.time()
+        try:
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+
+    def get_stages(self, key: str) -> Optional[Tuple[Dict[str, Any], np.ndarray]]:
+        """Return (stage results, chunk embeddings) for an upload, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+        path = self._path(key)
+        try:
+            stages = _read_json(os.path.join(path, _STAGES_FILE))
+            embeddings = np.load(os.path.join(path, _EMBEDDINGS_FILE))
+        except Exception as e:
+            with self._lock:
+                # Gone meanwhile (evicted) is a plain miss; otherwise the entry is broken
+                broken = self._entries.pop(key, None) is not None
+                self.misses += 1
+            if broken:
+                print(f"Warning: dropping unreadable result cache entry {key}: {e}")
+                shutil.rmtree(path, ignore_errors=True)
+            return None
+        with self._lock:
+            self.hits += 1
+            self._touch(key)
+        self._mark_used(key)
+        return stages, embeddings
+
+    def put_stages(self, key: str, stages: Dict[str, Any], embeddings: np.ndarray) -> None:
+        path = self._path(key)
+        with self._write_lock(key):
+            try:
+                os.makedirs(path, exist_ok=True)
+                tmp_npy = os.path.join(path, f"{_EMBEDDINGS_FILE}.{threading.get_ident()}.tmp.npy")
+                np.save(tmp_npy, np.asarray(embeddings, dtype=np.float32))
+                os.replace(tmp_npy, os.path.join(path, _EMBEDDINGS_FILE))
+                # stages.json last: its presence marks the entry as complete
+                _write_atomic(os.path.join(path, _STAGES_FILE), json.dumps(stages).encode("utf-8"))
+            except OSError as e:
+                print(f"Warning: failed to write result cache entry {key}: {e}")
+                return
+            with self._lock:
+                victims = self._account(key)
+        self._remove(victims)
+
+    def get_summary(self, key: str) -> Optional[str]:
+        """English summary of an upload (no embeddings loaded), or None if it is not cached."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+        try:
+            return _read_json(os.path.join(self._path(key), _STAGES_FILE)).get("summary")
+        except (OSError, ValueError):
+            return None
+
+    def get_language(self, key: str, language: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+        try:
+            data = _read_json(os.path.join(self._path(key), self._language_file(language)))
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.language_hits += 1
+            self._touch(key)
+        self._mark_used(key)
+        return data
+
+    def put_language(self, key: str, language: str, data: Dict[str, Any]) -> None:
+        self._write_language(key, language, data, merge=False)
+
+    def update_language(self, key: str, language: str, values: Dict[str, Any]) -> None:
+        """Merge values (e.g. an audio URL made later) into an upload's language entry."""
+        self._write_language(key, language, values, merge=True)
+
+    def _write_language(self, key: str, language: str, values: Dict[str, Any], merge: bool) -> None:
+        """Write (or merge into) an existing entry's language file; no-op for unknown keys."""
+        with self._lock:
+            if key not in self._entries:
+                return
+        path = os.path.join(self._path(key), self._language_file(language))
+        with self._write_lock(key):
+            try:
+                data = dict(values)
+                if merge:
+                    try:
+                        data = {**_read_json(path), **values}
+                    except (OSError, ValueError):
+                        pass
+                _write_atomic(path, json.dumps(data).encode("utf-8"))
+            except OSError as e:
+                # e.g. the entry was evicted meanwhile
+                print(f"Warning: failed to write result cache language entry {key}/{language}: {e}")
+                return
+            with self._lock:
+                if key not in self._entries:
+                    return
+                victims = self._account(key)
+        self._remove(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for size, _ in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "language_hits": self.language_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,101 +1,509 @@
-"""
-Summarization and Q&A helpers using Gemini (Vertex AI).
-
-Non-technical summary:
-- We build clear prompts and ask the model to summarize or answer questions.
-- Answers are grounded in the provided text only; we also add a disclaimer.
-- If the model is temporarily unavailable, we return simple fallback text instead.
-"""
-from typing import List, Optional
-# Support both package and script execution imports
-try:
-    from ..config import (
-        PROJECT_ID,
-        LOCATION,
-        DISCLAIMER_TEXT,
-        SUMMARY_PROMPT_TEMPLATE,
-        QA_PROMPT_TEMPLATE,
-    )
-except ImportError:
-    from config import (
-        PROJECT_ID,
-        LOCATION,
-        DISCLAIMER_TEXT,
-        SUMMARY_PROMPT_TEMPLATE,
-        QA_PROMPT_TEMPLATE,
-    )
-import vertexai
-from vertexai.generative_models import GenerativeModel
-
-def _generate_with_gemini_models(prompt: str) -> Optional[str]:
-    """Generate text using Gemini models via Vertex AI (tries a few model sizes)."""
-    vertexai.init(project=PROJECT_ID, location=LOCATION)
-    candidate_models = [
-        "gemini-2.5-pro",
-        "gemini-2.5-flash",
-        "gemini-2.5-flash-lite",
-    ]
-    for model_name in candidate_models:
-        try:
-            model = GenerativeModel(model_name)
-            resp = model.generate_content(prompt, generation_config={"temperature": 0.2})
-            text = getattr(resp, "text", "").strip()
-            if text:
-                return text
-        except Exception as e:
-            print(f"Gemini attempt with {model_name} failed: {e}")
-    return None
-
-
-def generate_summary(relevant_chunks: List[str]) -> str:
-    """Create a plain-language summary from document excerpts.
-
-    We insert up to ~8k characters of context into the prompt template and
-    append a disclaimer to the result. If anything fails, we return a minimal
-    fallback so the user still gets a response.
-    """
-
-    # Join the relevant chunks to form the context for the prompt (limit size defensively)
-    max_chars = 8000
-    joined = "\n\n".join(relevant_chunks)
-    document_context = joined[:max_chars]
-
-    # Build prompt via configurable template
-    try:
-        prompt = SUMMARY_PROMPT_TEMPLATE.format(context=document_context)
-    except Exception:
-        # Fallback to a minimal prompt if formatting fails due to bad template
-        prompt = f"Summarize the following excerpts for a non-expert.\n\n{document_context}"
-
-    text = _generate_with_gemini_models(prompt)
-    if text:
-        return f"{text}\n\n{DISCLAIMER_TEXT}"
-
-    # Final fallback: provide a simple heuristic summary if all model calls fail
-    try:
-        first_part = document_context.split(". ")[:3]
-        fallback = ". ".join(first_part).strip()
-        final = fallback if fallback else "Summary generation failed."
-        return f"{final}\n\n{DISCLAIMER_TEXT}"
-    except Exception:
-        return "Summary generation failed."
-
-
-def generate_grounded_answer(relevant_chunks: List[str], question: str) -> str:
-    """Answer a question using only the provided document excerpts (no outside info)."""
-    max_chars = 8000
-    context = "\n\n".join(relevant_chunks)[:max_chars]
-    try:
-        prompt = QA_PROMPT_TEMPLATE.format(question=question, context=context)
-    except Exception:
-        prompt = (
-            f"Answer the question using ONLY these excerpts. If unknown, say: I cannot answer this question based on the document.\n\n"
-            f"Question: {question}\n\n"
-            f"Excerpts:\n{context}"
-        )
-
-    text = _generate_with_gemini_models(prompt)
-    if text:
-        return f"{text}\n\n{DISCLAIMER_TEXT}"
-    # Minimal fallback if all attempts fail
-    return f"I cannot answer this question based on the document.\n\n{DISCLAIMER_TEXT}"
\ No newline at end of file
+"""
+Summarization and Q&A helpers using Gemini (Vertex AI).
+
+Non-technical summary:
+- We build clear prompts and ask the model to summarize or answer questions.
+- Answers are grounded in the provided text only; we also add a disclaimer.
+- If the model is temporarily unavailable, we return simple fallback text instead.
+- Answers can also be streamed piece by piece as the model writes them.
+- Long documents are summarised in two steps: parts are condensed into notes at the same
+  time, then the notes are turned into the final summary.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Dict, Iterator, List, Optional
+# Support both package and script execution imports
+try:
+    from ..config import (
+        DISCLAIMER_TEXT,
+        SUMMARY_PROMPT_TEMPLATE,
+        QA_PROMPT_TEMPLATE,
+        MAP_SUMMARY_PROMPT_TEMPLATE,
+        SUMMARY_SINGLE_CALL_CHARS,
+        SUMMARY_GROUP_CHARS,
+        SUMMARY_MAX_CONCURRENCY,
+        GEMINI_MODELS,
+        GEMINI_TIMEOUT_S,
+        GEMINI_MODEL_TIMEOUTS,
+        GEMINI_DEADLINE_S,
+        GEMINI_HEDGE_DELAY_S,
+        GEMINI_BREAKER_FAILURES,
+        GEMINI_BREAKER_COOLDOWN_S,
+        GEMINI_MAX_CONCURRENCY,
+    )
+    from .client_registry import get_generative_model
+    from .circuit_breaker import CircuitBreaker
+    from .metrics import track_call, observe_call, GEMINI_ATTEMPTS, GEMINI_ANSWER_SECONDS, GEMINI_ALL_FAILED
+except ImportError:
+    from config import (
+        DISCLAIMER_TEXT,
+        SUMMARY_PROMPT_TEMPLATE,
+        QA_PROMPT_TEMPLATE,
+        MAP_SUMMARY_PROMPT_TEMPLATE,
+        SUMMARY_SINGLE_CALL_CHARS,
+        SUMMARY_GROUP_CHARS,
+        SUMMARY_MAX_CONCURRENCY,
+        GEMINI_MODELS,
+        GEMINI_TIMEOUT_S,
+        GEMINI_MODEL_TIMEOUTS,
+        GEMINI_DEADLINE_S,
+        GEMINI_HEDGE_DELAY_S,
+        GEMINI_BREAKER_FAILURES,
+        GEMINI_BREAKER_COOLDOWN_S,
+        GEMINI_MAX_CONCURRENCY,
+    )
+    from utils.client_registry import get_generative_model
+    from utils.circuit_breaker import CircuitBreaker
+    from utils.metrics import track_call, observe_call, GEMINI_ATTEMPTS, GEMINI_ANSWER_SECONDS, GEMINI_ALL_FAILED
+
+# Tried in order until one of them answers
+CANDIDATE_MODELS = GEMINI_MODELS
+
+NO_ANSWER_TEXT = "I cannot answer this question based on the document."
+
+# One breaker per model: a model that keeps failing is skipped for a cool-down period
+_breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN_S) for name in CANDIDATE_MODELS
+}
+
+# Which model answered, how often models failed/timed out, and how often we hedged
+_stats_lock = threading.Lock()
+_model_stats: Dict[str, Dict[str, float]] = {}
+_fallback_count = 0
+
+# Gemini calls run on their own pool so a call we stopped waiting for (timeout, or a hedged
+# call that lost) never holds up the shared executor; it just finishes in the background.
+_gemini_executor: Optional[ThreadPoolExecutor] = None
+_gemini_executor_lock = threading.Lock()
+
+# Map step of long-document summaries: one pool for all documents, so at most
+# SUMMARY_MAX_CONCURRENCY parts are condensed at once however many documents are in flight
+_summary_executor: Optional[ThreadPoolExecutor] = None
+_summary_executor_lock = threading.Lock()
+
+
+def _get_gemini_executor() -> ThreadPoolExecutor:
+    global _gemini_executor
+    if _gemini_executor is None:
+        with _gemini_executor_lock:
+            if _gemini_executor is None:
+                _gemini_executor = ThreadPoolExecutor(
+                    max_workers=max(1, GEMINI_MAX_CONCURRENCY), thread_name_prefix="gemini"
+                )
+    return _gemini_executor
+
+
+def shutdown_gemini_executor(wait: bool = True) -> None:
+    """Stop the Gemini call pool (called on app shutdown)."""
+    global _gemini_executor
+    with _gemini_executor_lock:
+        if _gemini_executor is not None:
+            _gemini_executor.shutdown(wait=wait)
+            _gemini_executor = None
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    global _summary_executor
+    if _summary_executor is None:
+        with _summary_executor_lock:
+            if _summary_executor is None:
+                _summary_executor = ThreadPoolExecutor(
+                    max_workers=max(1, SUMMARY_MAX_CONCURRENCY), thread_name_prefix="summary-map"
+                )
+    return _summary_executor
+
+
+def shutdown_summary_executor(wait: bool = True) -> None:
+    """Stop the summary map pool (called on app shutdown)."""
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is not None:
+            _summary_executor.shutdown(wait=wait)
+            _summary_executor = None
+
+
+def _record(model_name: str, outcome: str, seconds: Optional[float] = None) -> None:
+    """Count an outcome (answered, failed, timed_out, skipped, hedged) for a model."""
+    GEMINI_ATTEMPTS.labels(model_name, outcome).inc()
+    if seconds is not None and outcome == "answered":
+        GEMINI_ANSWER_SECONDS.labels(model_name).observe(seconds)
+    with _stats_lock:
+        stats = _model_stats.setdefault(model_name, {})
+        stats[outcome] = stats.get(outcome, 0) + 1
+        if seconds is not None and outcome == "answered":
+            stats["answer_seconds_total"] = stats.get("answer_seconds_total", 0.0) + seconds
+
+
+def get_gemini_stats() -> Dict[str, Any]:
+    """Per-model counters and breaker state (reported on /healthz)."""
+    with _stats_lock:
+        models = {name: dict(stats) for name, stats in _model_stats.items()}
+        fallbacks = _fallback_count
+    for name, breaker in _breakers.items():
+        models.setdefault(name, {})["breaker"] = breaker.stats()
+    return {"models": models, "fallbacks": fallbacks}
+
+
+def _model_timeout(model_name: str) -> float:
+    return GEMINI_MODEL_TIMEOUTS.get(model_name, GEMINI_TIMEOUT_S)
+
+
+def _usable_models() -> Iterator[str]:
+    """Models in order, skipping those whose breaker is open.
+
+    Breakers are asked lazily, right before a model would be called, so a half-open
+    model is only marked as "trial in progress" when it is actually tried. If every
+    breaker is open nothing is yielded and callers fall back at once; after a cool-down
+    each breaker lets a single trial call through.
+    """
+    for name in CANDIDATE_MODELS:
+        if _breakers[name].allow():
+            yield name
+        else:
+            _record(name, "skipped")
+
+
+def _call_model(model_name: str, prompt: str) -> str:
+    model = get_generative_model(model_name)
+    with track_call("gemini"):
+        resp = model.generate_content(prompt, generation_config={"temperature": 0.2})
+    return getattr(resp, "text", "").strip()
+
+
+def _generate_with_gemini_models(prompt: str, deadline_s: float = GEMINI_DEADLINE_S) -> Optional[str]:
+    """Generate text using Gemini models via Vertex AI (tries a few model sizes).
+
+    Each model gets its own timeout, and the whole call is bounded by `deadline_s`.
+    A model that fails or times out hands over to the next one straight away; with
+    hedging enabled, the next model is also started when the current one is slow, and
+    whichever answers first wins. Models with an open circuit breaker are skipped.
+    """
+    global _fallback_count
+    models = _usable_models()
+    executor = _get_gemini_executor()
+    deadline = time.monotonic() + max(0.0, deadline_s)
+    pending: Dict[Future, Dict[str, Any]] = {}  # future -> attempt (model, started, settled)
+    exhausted = False
+    settle_lock = threading.Lock()
+
+    def claim(attempt: Dict[str, Any]) -> bool:
+        """True for the first caller only: an attempt's outcome is recorded exactly once."""
+        with settle_lock:
+            if attempt["settled"]:
+                return False
+            attempt["settled"] = True
+            return True
+
+    def time_out(attempt: Dict[str, Any]) -> None:
+        if claim(attempt):
+            _breakers[attempt["model"]].record_failure()
+            _record(attempt["model"], "timed_out")
+            print(f"Gemini attempt with {attempt['model']} timed out after {_model_timeout(attempt['model'])}s")
+
+    def settle(future: Future, attempt: Dict[str, Any]) -> None:
+        """Feed every attempt's outcome to its breaker, even one we stopped waiting for."""
+        if not claim(attempt):
+            return  # already counted as timed out
+        breaker = _breakers[attempt["model"]]
+        try:
+            if future.result():
+                breaker.record_success()
+                return
+        except Exception as e:
+            print(f"Gemini attempt with {attempt['model']} failed: {e}")
+        breaker.record_failure()
+        _record(attempt["model"], "failed")
+
+    def launch(hedged: bool = False) -> None:
+        nonlocal exhausted
+        model_name = next(models, None)
+        if model_name is None:
+            exhausted = True
+            return
+        if hedged:
+            _record(model_name, "hedged")
+        attempt = {"model": model_name, "started": time.monotonic(), "settled": False}
+        future = executor.submit(_call_model, model_name, prompt)
+        pending[future] = attempt
+        future.add_done_callback(lambda f: settle(f, attempt))
+
+    launch()
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        # Wake up for whichever comes first: an answer, a model timeout, the hedge delay, the deadline
+        latest_start = max(attempt["started"] for attempt in pending.values())
+        wake_at = [deadline] + [a["started"] + _model_timeout(a["model"]) for a in pending.values()]
+        if GEMINI_HEDGE_DELAY_S > 0 and not exhausted:
+            wake_at.append(latest_start + GEMINI_HEDGE_DELAY_S)
+        done, _ = wait(list(pending), timeout=max(0.0, min(wake_at) - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            attempt = pending.pop(future)
+            text = future.result() if future.exception() is None else ""
+            if text:
+                _record(attempt["model"], "answered", time.monotonic() - attempt["started"])
+                return text
+
+        now = time.monotonic()
+        for future, attempt in list(pending.items()):
+            # A call that finished just now is picked up by the next wait() instead
+            if not future.done() and now - attempt["started"] >= _model_timeout(attempt["model"]):
+                # Stop waiting; the call finishes on its own in the background
+                del pending[future]
+                time_out(attempt)
+
+        if not exhausted:
+            if not pending:
+                launch()
+            elif GEMINI_HEDGE_DELAY_S > 0 and now - max(a["started"] for a in pending.values()) >= GEMINI_HEDGE_DELAY_S:
+                launch(hedged=True)
+
+    # Deadline reached with calls still running: count them as timed out
+    for attempt in pending.values():
+        time_out(attempt)
+    GEMINI_ALL_FAILED.inc()
+    with _stats_lock:
+        _fallback_count += 1
+    return None
+
+
+_STREAM_END = object()
+
+
+def _open_stream(model_name: str, prompt: str) -> Iterator[Any]:
+    model = get_generative_model(model_name)
+    return iter(model.generate_content(prompt, generation_config={"temperature": 0.2}, stream=True))
+
+
+def _chunk_text(resp: Any) -> str:
+    try:
+        return resp.text
+    except Exception:
+        # e.g. a final chunk carrying only safety/finish metadata
+        return ""
+
+
+def _stream_with_gemini_models(prompt: str) -> Iterator[str]:
+    """Stream text pieces from the first Gemini model that starts answering.
+
+    A model that fails, or sends no text within its timeout, is skipped for the next one.
+    Once text has been sent we cannot take it back, so a failure mid-answer, or a gap
+    between chunks longer than the model's timeout, just ends the stream. Either way the
+    model's breaker hears about it. Calls run on the Gemini pool so a stalled stream is
+    left to finish in the background.
+
+    The Gemini call latency metric gets the time to the first piece for an answer, and the
+    time spent waiting on Gemini for a failure; time our consumer takes to send the pieces
+    on is not counted.
+    """
+    global _fallback_count
+    executor = _get_gemini_executor()
+    for model_name in _usable_models():
+        breaker = _breakers[model_name]
+        timeout = _model_timeout(model_name)
+        sent_any = False
+        started = fetch_started = time.monotonic()
+        upstream_s = 0.0  # waiting on Gemini only
+        first_piece_s = 0.0
+        answered = False
+        try:
+            # The first piece must arrive within the timeout (counting the call itself),
+            # and after that every next one
+            wait_until = started + timeout
+            responses = executor.submit(_open_stream, model_name, prompt).result(timeout=timeout)
+            upstream_s = time.monotonic() - started
+            while True:
+                fetch_started = time.monotonic()
+                resp = executor.submit(next, responses, _STREAM_END).result(
+                    timeout=max(0.0, wait_until - time.monotonic())
+                )
+                upstream_s += time.monotonic() - fetch_started
+                if resp is _STREAM_END:
+                    break
+                piece = _chunk_text(resp)
+                if not piece:
+                    continue
+                if not sent_any:
+                    first_piece_s = time.monotonic() - started
+                    breaker.record_success()
+                    _record(model_name, "answered", first_piece_s)
+                    sent_any = True
+                try:
+                    yield piece
+                except GeneratorExit:
+                    answered = True
+                    return  # the client stopped reading; not the model's fault
+                wait_until = time.monotonic() + timeout
+            if sent_any:
+                answered = True
+                return
+            breaker.record_failure()
+            _record(model_name, "failed")
+        except FutureTimeoutError:
+            upstream_s += time.monotonic() - fetch_started
+            print(f"Gemini streaming attempt with {model_name} stalled for {timeout}s")
+            breaker.record_failure()
+            _record(model_name, "timed_out")
+            if sent_any:
+                return
+        except Exception as e:
+            upstream_s += time.monotonic() - fetch_started
+            print(f"Gemini streaming attempt with {model_name} failed: {e}")
+            breaker.record_failure()
+            _record(model_name, "failed")
+            if sent_any:
+                return
+        finally:
+            observe_call("gemini", first_piece_s if answered else upstream_s, ok=answered)
+    GEMINI_ALL_FAILED.inc()
+    with _stats_lock:
+        _fallback_count += 1
+
+
+def _group_chunks(chunks: List[str], max_chars: int) -> List[str]:
+    """Pack chunks, in order, into groups of at most max_chars characters each."""
+    groups: List[str] = []
+    current: List[str] = []
+    size = 0
+    for chunk in chunks:
+        chunk = chunk[:max_chars]
+        if current and size + len(chunk) + 2 > max_chars:
+            groups.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(chunk)
+        size += len(chunk) + 2
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+def _condense_group(group: str, part: int, parts: int) -> str:
+    """Map step: turn one group of excerpts into compact notes."""
+    try:
+        prompt = MAP_SUMMARY_PROMPT_TEMPLATE.format(context=group, part=part, parts=parts)
+    except Exception:
+        prompt = f"Write compact bullet notes of the material terms in these excerpts.\n\n{group}"
+    notes = _generate_with_gemini_models(prompt)
+    if notes:
+        return notes
+    # Keep something from this part rather than silently dropping it
+    return group[:1000]
+
+
+def _condense_long_document(chunks: List[str], info: Optional[Dict[str, Any]] = None) -> str:
+    """Condense a long document into notes that fit one summary prompt.
+
+    Groups are condensed concurrently (at most SUMMARY_MAX_CONCURRENCY at a time across all
+    documents), so the time
+    taken follows the slowest group rather than the document length. While the notes are
+    still too long they are condensed again. Only if a round no longer makes them shorter
+    (e.g. every model failed and the parts were kept as they were) are they cut to fit;
+    that is logged, and `info` gets the number of rounds and the characters cut.
+    """
+    group_chars = max(1000, SUMMARY_GROUP_CHARS)
+    texts = chunks
+    size = sum(len(text) + 2 for text in texts)
+    rounds = 0
+    while True:
+        groups = _group_chunks(texts, group_chars)
+        # Separate pool: this runs inside the shared executor, which must not wait on itself
+        notes = list(_get_summary_executor().map(
+            _condense_group, groups, range(1, len(groups) + 1), [len(groups)] * len(groups)
+        ))
+        rounds += 1
+        texts = [f"Part {i} notes:\n{text}" for i, text in enumerate(notes, start=1)]
+        new_size = sum(len(text) + 2 for text in texts)
+        if new_size <= group_chars or new_size >= size:
+            break
+        size = new_size
+
+    joined = "\n\n".join(texts)
+    truncated = max(0, len(joined) - group_chars)
+    if truncated:
+        print(
+            f"Warning: summary notes are still {len(joined)} characters after {rounds} rounds; "
+            f"cutting the last {truncated} characters"
+        )
+    if info is not None:
+        info["condense_rounds"] = rounds
+        info["truncated_chars"] = truncated
+    return joined[:group_chars]
+
+
+def generate_summary(relevant_chunks: List[str], info: Optional[Dict[str, Any]] = None) -> str:
+    """Create a plain-language summary from document excerpts.
+
+    Short documents (up to SUMMARY_SINGLE_CALL_CHARS) go into the prompt template in one
+    call. Longer ones are first condensed part by part (see _condense_long_document), so
+    the summary covers the whole agreement and not just its beginning; `info`, if given,
+    receives how many condense rounds that took and whether the notes had to be cut. A
+    disclaimer is appended; if anything fails, we return a minimal fallback so the user
+    still gets a response.
+    """
+
+    # Join the relevant chunks to form the context for the prompt
+    joined = "\n\n".join(relevant_chunks)
+    if len(joined) <= SUMMARY_SINGLE_CALL_CHARS:
+        document_context = joined
+    else:
+        document_context = _condense_long_document(relevant_chunks, info)
+
+    # Build prompt via configurable template
+    try:
+        prompt = SUMMARY_PROMPT_TEMPLATE.format(context=document_context)
+    except Exception:
+        # Fallback to a minimal prompt if formatting fails due to bad template
+        prompt = f"Summarize the following excerpts for a non-expert.\n\n{document_context}"
+
+    text = _generate_with_gemini_models(prompt)
+    if text:
+        return f"{text}\n\n{DISCLAIMER_TEXT}"
+
+    # Final fallback: provide a simple heuristic summary if all model calls fail
+    try:
+        first_part = document_context.split(". ")[:3]
+        fallback = ". ".join(first_part).strip()
+        final = fallback if fallback else "Summary generation failed."
+        return f"{final}\n\n{DISCLAIMER_TEXT}"
+    except Exception:
+        return "Summary generation failed."
+
+
+def _build_qa_prompt(relevant_chunks: List[str], question: str) -> str:
+    max_chars = 8000
+    context = "\n\n".join(relevant_chunks)[:max_chars]
+    try:
+        return QA_PROMPT_TEMPLATE.format(question=question, context=context)
+    except Exception:
+        return (
+            f"Answer the question using ONLY these excerpts. If unknown, say: {NO_ANSWER_TEXT}\n\n"
+            f"Question: {question}\n\n"
+            f"Excerpts:\n{context}"
+        )
+
+
+def generate_grounded_answer(relevant_chunks: List[str], question: str) -> str:
+    """Answer a question using only the provided document excerpts (no outside info)."""
+    text = _generate_with_gemini_models(_build_qa_prompt(relevant_chunks, question))
+    if text:
+        return f"{text}\n\n{DISCLAIMER_TEXT}"
+    # Minimal fallback if all attempts fail
+    return f"{NO_ANSWER_TEXT}\n\n{DISCLAIMER_TEXT}"
+
+
+def stream_grounded_answer(relevant_chunks: List[str], question: str) -> Iterator[str]:
+    """Like generate_grounded_answer, but yields the answer in pieces as Gemini writes it.
+
+    Joining every piece gives the same shape of text as generate_grounded_answer
+    (answer, blank line, disclaimer).
+    """
+    answered = False
+    for piece in _stream_with_gemini_models(_build_qa_prompt(relevant_chunks, question)):
+        answered = True
+        yield piece
+    if not answered:
+        yield NO_ANSWER_TEXT
+    yield f"\n\n{DISCLAIMER_TEXT}"
\ No newline at end of file
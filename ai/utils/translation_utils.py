@@ -1,61 +1,175 @@
-"""
-Translation helpers using Google Cloud Translation (v2 API).
-
-We normalize language codes and translate long texts in manageable chunks
-to avoid size limits.
-"""
-from google.cloud import translate_v2 as translate
-from typing import List
-
-
-def _normalize_lang(code: str) -> str:
-    if not code:
-        return "en"
-    code = code.strip().lower()
-    # Map common aliases
-    aliases = {
-        "en-us": "en",
-        "en-gb": "en",
-        "hi-in": "hi",
-        "zh-cn": "zh",
-        "zh-hans": "zh",
-        "zh-hant": "zh-TW",
-    }
-    return aliases.get(code, code)
-
-
-def _chunk_text(text: str, max_len: int = 4000) -> List[str]:
-    if len(text) <= max_len:
-        return [text]
-    # naive splitting on sentence boundaries when possible
-    parts: List[str] = []
-    buf = []
-    count = 0
-    for token in text.split(" "):
-        if count + len(token) + 1 > max_len:
-            parts.append(" ".join(buf))
-            buf = [token]
-            count = len(token)
-        else:
-            buf.append(token)
-            count += len(token) + 1
-    if buf:
-        parts.append(" ".join(buf))
-    return parts
-
-
-def translate_text(text: str, target_language: str) -> str:
-    """Translate text into the requested language using Google Cloud Translation (v2)."""
-    if not text:
-        return text
-    lang = _normalize_lang(target_language)
-    if lang in ("en", "auto", ""):
-        return text
-
-    client = translate.Client()
-    # Translate in chunks and rejoin to avoid long payload issues
-    translated_chunks: List[str] = []
-    for chunk in _chunk_text(text):
-        result = client.translate(chunk, target_language=lang)
-        translated_chunks.append(result.get("translatedText", chunk))
-    return "".join(translated_chunks)
\ No newline at end of file
+"""
+Translation helpers using Google Cloud Translation (v2 API).
+
+We normalize language codes and translate long texts in manageable chunks
+to avoid size limits.
+
+Every text of a request is split into segments (the trailing disclaimer becomes its own
+segment), and all segments we have not translated before go to the API in one batched
+call. Results are remembered in a bounded in-memory cache keyed by (text hash, language),
+so the disclaimer and our fixed replies are only translated once per language.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+# Support both package and script execution imports
+try:
+    from ..config import DISCLAIMER_TEXT, TRANSLATION_CACHE_ITEMS
+    from .client_registry import get_translate_client
+    from .metrics import track_call
+except ImportError:
+    from config import DISCLAIMER_TEXT, TRANSLATION_CACHE_ITEMS
+    from utils.client_registry import get_translate_client
+    from utils.metrics import track_call
+
+# Translation v2 accepts at most 128 segments per request; keep the payload modest too
+_MAX_SEGMENTS_PER_CALL = 128
+_MAX_CHARS_PER_CALL = 30000
+
+_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "api_calls": 0, "evictions": 0}
+
+
+def _normalize_lang(code: str) -> str:
+    if not code:
+        return "en"
+    code = code.strip().lower()
+    # Map common aliases
+    aliases = {
+        "en-us": "en",
+        "en-gb": "en",
+        "hi-in": "hi",
+        "zh-cn": "zh",
+        "zh-hans": "zh",
+        "zh-hant": "zh-TW",
+    }
+    return aliases.get(code, code)
+
+
+def _chunk_text(text: str, max_len: int = 4000) -> List[str]:
+    if len(text) <= max_len:
+        return [text]
+    # naive splitting on sentence boundaries when possible
+    parts: List[str] = []
+    buf = []
+    count = 0
+    for token in text.split(" "):
+        if count + len(token) + 1 > max_len:
+            parts.append(" ".join(buf))
+            buf = [token]
+            count = len(token)
+        else:
+            buf.append(token)
+            count += len(token) + 1
+    if buf:
+        parts.append(" ".join(buf))
+    return parts
+
+
+def _segments(text: str) -> Tuple[List[str], List[str]]:
+    """Split text into segments plus the joiners that go between them.
+
+    text == segments[0] + joiners[0] + segments[1] + ... (up to chunk-boundary spaces).
+    A trailing DISCLAIMER_TEXT becomes its own segment so it is shared across texts.
+    """
+    body, separator, tail = text, "", ""
+    if DISCLAIMER_TEXT and text != DISCLAIMER_TEXT and text.endswith(DISCLAIMER_TEXT):
+        head = text[: -len(DISCLAIMER_TEXT)]
+        body = head.rstrip()
+        separator = head[len(body):]
+        tail = DISCLAIMER_TEXT
+    segments = _chunk_text(body) if body else []
+    joiners = [" "] * max(0, len(segments) - 1)
+    if tail:
+        if segments:
+            joiners.append(separator)
+        segments.append(tail)
+    return segments, joiners
+
+
+def _cache_key(text: str, lang: str) -> Tuple[str, str]:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest(), lang
+
+
+def _translate_segments(segments: List[str], lang: str) -> Dict[str, str]:
+    """Translate unique segments, using the cache first and one batched API call for the rest."""
+    found: Dict[str, str] = {}
+    missing: List[str] = []
+    with _cache_lock:
+        for segment in dict.fromkeys(segments):
+            cached = _cache.get(_cache_key(segment, lang))
+            if cached is not None:
+                _cache.move_to_end(_cache_key(segment, lang))
+                found[segment] = cached
+                _stats["hits"] += 1
+            else:
+                missing.append(segment)
+                _stats["misses"] += 1
+
+    if missing:
+        client = get_translate_client()
+        # Normally a single call; only very long requests need more than one
+        batches: List[List[str]] = [[]]
+        size = 0
+        for segment in missing:
+            if batches[-1] and (len(batches[-1]) >= _MAX_SEGMENTS_PER_CALL or size + len(segment) > _MAX_CHARS_PER_CALL):
+                batches.append([])
+                size = 0
+            batches[-1].append(segment)
+            size += len(segment)
+        translated: Dict[str, str] = {}
+        for batch in batches:
+            with track_call("translate"):
+                results: Any = client.translate(batch, target_language=lang)
+            with _cache_lock:
+                _stats["api_calls"] += 1
+            for segment, result in zip(batch, results):
+                translated[segment] = result.get("translatedText", segment)
+
+        with _cache_lock:
+            for segment, value in translated.items():
+                key = _cache_key(segment, lang)
+                _cache[key] = value
+                _cache.move_to_end(key)
+            while len(_cache) > max(0, TRANSLATION_CACHE_ITEMS):
+                _cache.popitem(last=False)
+                _stats["evictions"] += 1
+        found.update(translated)
+    return found
+
+
+def translate_texts(texts: List[str], target_language: str) -> List[str]:
+    """Translate several texts into the requested language with at most one batched API call."""
+    lang = _normalize_lang(target_language)
+    if lang in ("en", "auto", ""):
+        return list(texts)
+
+    split = [_segments(text) if text else ([], []) for text in texts]
+    translated = _translate_segments([s for segments, _ in split for s in segments], lang)
+
+    out: List[str] = []
+    for text, (segments, joiners) in zip(texts, split):
+        if not segments:
+            out.append(text)
+            continue
+        pieces = [translated[segments[0]]]
+        for joiner, segment in zip(joiners, segments[1:]):
+            pieces.append(joiner)
+            pieces.append(translated[segment])
+        out.append("".join(pieces))
+    return out
+
+
+def translate_text(text: str, target_language: str) -> str:
+    """Translate text into the requested language using Google Cloud Translation (v2)."""
+    if not text:
+        return text
+    return translate_texts([text], target_language)[0]
+
+
+def get_translation_stats() -> Dict[str, Any]:
+    with _cache_lock:
+        return {**_stats, "cached_items": len(_cache)}
@@ -1,101 +1,166 @@
-"""
-Text-to-Speech (TTS) helper using Google Cloud TTS.
-
-We break long text into smaller pieces, synthesize speech, then upload a single MP3
-to Cloud Storage and return its public URL.
-"""
-import os
-import uuid
-import tempfile
-from google.cloud import texttospeech
-from google.cloud import storage
-from typing import List
-
-# Support both package and script execution imports
-try:
-    from ..config import PROJECT_ID, BUCKET_NAME
-except ImportError:
-    from config import PROJECT_ID, BUCKET_NAME
-
-
-def _normalize_tts_lang(code: str) -> str:
-    if not code:
-        return "en-US"
-    c = code.strip().lower()
-    mapping = {
-        "en": "en-US",
-        "en-us": "en-US",
-        "en-gb": "en-GB",
-        "hi": "hi-IN",
-        "hi-in": "hi-IN",
-    }
-    return mapping.get(c, code)
-
-
-def _select_voice(language_code: str):
-    # Prefer standard voices widely available; fall back gracefully
-    voice_names = {
-        "en-US": "en-US-Standard-C",
-        "hi-IN": "hi-IN-Standard-A",
-    }
-    name = voice_names.get(language_code)
-    return texttospeech.VoiceSelectionParams(
-        language_code=language_code,
-        name=name if name else None,
-        ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
-    )
-
-
-def _chunk_text_by_bytes(text: str, max_bytes: int = 4500) -> List[str]:
-    parts: List[str] = []
-    buf: List[str] = []
-    current_bytes = 0
-    for token in text.split(" "):
-        token_bytes = len((token + " ").encode("utf-8"))
-        if current_bytes + token_bytes > max_bytes:
-            parts.append(" ".join(buf).strip())
-            buf = [token]
-            current_bytes = len((token + " ").encode("utf-8"))
-        else:
-            buf.append(token)
-            current_bytes += token_bytes
-    if buf:
-        parts.append(" ".join(buf).strip())
-    # Ensure no empty strings
-    return [p for p in parts if p]
-
-def generate_audio(text: str, language: str = "en") -> str:
-    """
-    Convert text to speech, upload MP3 to Cloud Storage, and return a public URL.
-    """
-    if not text:
-        return ""
-    
-    tts_client = texttospeech.TextToSpeechClient()
-    
-    # Determine language/voice and chunk input to stay under API size limits
-    lang_code = _normalize_tts_lang(language)
-    voice = _select_voice(lang_code)
-    audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-
-    audio_bytes = b""
-    for chunk in _chunk_text_by_bytes(text):
-        synthesis_input = texttospeech.SynthesisInput(text=chunk)
-        resp = tts_client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-        audio_bytes += resp.audio_content
-
-    # Generate a unique filename and upload to GCS
-    unique_filename = f"audio-{uuid.uuid4()}.mp3"
-    storage_client = storage.Client(project=PROJECT_ID)
-    bucket = storage_client.bucket(BUCKET_NAME)
-    blob = bucket.blob(f"audio/{unique_filename}")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-        tmp.write(audio_bytes)
-        temp_file_path = tmp.name
-        
-    try:
-        blob.upload_from_filename(temp_file_path)
-        return f"https://storage.googleapis.com/{BUCKET_NAME}/audio/{unique_filename}"
-    finally:
-        os.unlink(temp_file_path)
\ No newline at end of file
+"""
+Text-to-Speech (TTS) helper using Google Cloud TTS.
+
+We break long text into smaller pieces, synthesize them in parallel, then upload a single
+MP3 to Cloud Storage and return its public URL. Files are named by a hash of the text,
+voice and language, so the same audio is only ever synthesised once.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import texttospeech
+from typing import List, Optional
+
+# Support both package and script execution imports
+try:
+    from ..config import BUCKET_NAME, TTS_MAX_CONCURRENCY
+    from .client_registry import get_tts_client, get_storage_client
+    from .metrics import track_call
+except ImportError:
+    from config import BUCKET_NAME, TTS_MAX_CONCURRENCY
+    from utils.client_registry import get_tts_client, get_storage_client
+    from utils.metrics import track_call
+
+# Blob names we know exist in the bucket (skips the exists() round trip on repeats)
+_MAX_KNOWN_BLOBS = 10000
+_known_blobs: "OrderedDict[str, None]" = OrderedDict()
+_known_lock = threading.Lock()
+
+# Chunks of one text are synthesised in parallel on this pool (shared by all requests)
+_tts_executor: Optional[ThreadPoolExecutor] = None
+_tts_executor_lock = threading.Lock()
+
+
+def _get_tts_executor() -> ThreadPoolExecutor:
+    global _tts_executor
+    if _tts_executor is None:
+        with _tts_executor_lock:
+            if _tts_executor is None:
+                _tts_executor = ThreadPoolExecutor(
+                    max_workers=max(1, TTS_MAX_CONCURRENCY),
+                    thread_name_prefix="tts",
+                )
+    return _tts_executor
+
+
+def shutdown_tts_executor(wait: bool = True) -> None:
+    """Stop the TTS chunk pool (called on app shutdown)."""
+    global _tts_executor
+    with _tts_executor_lock:
+        if _tts_executor is not None:
+            _tts_executor.shutdown(wait=wait)
+            _tts_executor = None
+
+
+def _normalize_tts_lang(code: str) -> str:
+    if not code:
+        return "en-US"
+    c = code.strip().lower()
+    mapping = {
+        "en": "en-US",
+        "en-us": "en-US",
+        "en-gb": "en-GB",
+        "hi": "hi-IN",
+        "hi-in": "hi-IN",
+    }
+    return mapping.get(c, code)
+
+
+def _select_voice(language_code: str):
+    # Prefer standard voices widely available; fall back gracefully
+    voice_names = {
+        "en-US": "en-US-Standard-C",
+        "hi-IN": "hi-IN-Standard-A",
+    }
+    name = voice_names.get(language_code)
+    return texttospeech.VoiceSelectionParams(
+        language_code=language_code,
+        name=name if name else None,
+        ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
+    )
+
+
+def _chunk_text_by_bytes(text: str, max_bytes: int = 4500) -> List[str]:
+    parts: List[str] = []
+    buf: List[str] = []
+    current_bytes = 0
+    for token in text.split(" "):
+        token_bytes = len((token + " ").encode("utf-8"))
+        if current_bytes + token_bytes > max_bytes:
+            parts.append(" ".join(buf).strip())
+            buf = [token]
+            current_bytes = len((token + " ").encode("utf-8"))
+        else:
+            buf.append(token)
+            current_bytes += token_bytes
+    if buf:
+        parts.append(" ".join(buf).strip())
+    # Ensure no empty strings
+    return [p for p in parts if p]
+
+def _synthesize_chunk(chunk: str, voice, audio_config) -> bytes:
+    synthesis_input = texttospeech.SynthesisInput(text=chunk)
+    with track_call("tts"):
+        resp = get_tts_client().synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
+    return resp.audio_content
+
+
+def audio_blob_name(text: str, language: str = "en") -> str:
+    """Blob name derived from the text, voice and language: same input, same file."""
+    lang_code = _normalize_tts_lang(language)
+    voice = _select_voice(lang_code)
+    key = "\x00".join([lang_code, voice.name or "", "mp3", text])
+    return f"audio/{hashlib.sha256(key.encode('utf-8')).hexdigest()}.mp3"
+
+
+def _public_url(blob_name: str) -> str:
+    return f"https://storage.googleapis.com/{BUCKET_NAME}/{blob_name}"
+
+
+def generate_audio(text: str, language: str = "en") -> str:
+    """
+    Convert text to speech, upload MP3 to Cloud Storage, and return a public URL.
+
+    The file is named after a hash of (language, voice, text). If it already exists we
+    return its URL without calling TTS again.
+    """
+    if not text:
+        return ""
+
+    blob_name = audio_blob_name(text, language)
+    with _known_lock:
+        if blob_name in _known_blobs:
+            _known_blobs.move_to_end(blob_name)
+            return _public_url(blob_name)
+
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(BUCKET_NAME)
+    blob = bucket.blob(blob_name)
+
+    with track_call("gcs"):
+        exists = blob.exists()
+    if not exists:
+        # Determine language/voice and chunk input to stay under API size limits
+        lang_code = _normalize_tts_lang(language)
+        voice = _select_voice(lang_code)
+        audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
+
+        chunks = _chunk_text_by_bytes(text)
+        if len(chunks) == 1:
+            parts = [_synthesize_chunk(chunks[0], voice, audio_config)]
+        else:
+            # map() keeps chunk order
+            parts = list(_get_tts_executor().map(
+                _synthesize_chunk, chunks, [voice] * len(chunks), [audio_config] * len(chunks)
+            ))
+
+        # Build the MP3 once and upload it straight from memory
+        with track_call("gcs"):
+            blob.upload_from_string(b"".join(parts), content_type="audio/mpeg")
+
+    with _known_lock:
+        _known_blobs[blob_name] = None
+        while len(_known_blobs) > _MAX_KNOWN_BLOBS:
+            _known_blobs.popitem(last=False)
+    return _public_url(blob_name)
@@ -1,45 +1,597 @@
-"""
-Helpers for our in-memory vector store (FAISS).
-
-We add vectors (embeddings) for document chunks and search for the most similar chunks
-for a given question.
-"""
-from typing import List, Tuple
-import numpy as np
-import faiss
-
-def create_and_add_embeddings(embeddings: List[List[float]], index: faiss.Index, chunks: List[str], chunk_store: List[str]):
-    """
-    Adds new embeddings and chunks to the existing, persistent vector store.
-    
-    Args:
-        embeddings (List[List[float]]): The list of embeddings to add.
-        index (faiss.Index): The persistent Faiss index.
-        chunks (List[str]): The text chunks corresponding to the embeddings.
-        chunk_store (List[str]): The persistent list of all document chunks.
-    """
-    embeddings_array = np.array(embeddings, dtype=np.float32)
-    
-    # Normalize embeddings to use Inner Product for cosine similarity
-    faiss.normalize_L2(embeddings_array)
-    
-    index.add(embeddings_array)  # type: ignore[arg-type]
-    chunk_store.extend(chunks)
-
-def search_vector_store(index: faiss.Index, chunk_store: List[str], query_embedding: List[float], top_k: int = 3) -> List[str]:
-    """
-    Searches the persistent vector store for the most relevant document chunks.
-    
-    Args:
-        index (faiss.Index): The persistent Faiss index.
-        chunk_store (List[str]): The persistent list of all document chunks.
-        query_embedding (List[float]): The embedding of the user's query.
-        top_k (int): The number of top results to retrieve.
-    """
-    query_array = np.array([query_embedding], dtype=np.float32)
-    faiss.normalize_L2(query_array)
-    
-    distances, indices = index.search(query_array, top_k)  # type: ignore[misc]
-    
-    results = [chunk_store[i] for i in indices[0] if i < len(chunk_store)]
-    return results
\ No newline at end of file
+"""
+Helpers for our in-memory vector store (FAISS).
+
+We add vectors (embeddings) for document chunks and search for the most similar chunks
+for a given question. Each processed document gets its own small index (a "namespace"),
+so a question is only ever matched against the document it is about.
+
+When a storage folder is configured, every document is also written to disk once
+(FAISS index + a compact chunk file). After a restart, documents are reopened
+memory-mapped on first use, so nothing has to be re-uploaded and the whole corpus
+never needs to fit in RAM.
+
+Every document also gets a BM25 keyword index over its chunks (rebuilt from the chunks
+when a saved document is reopened); search_hybrid fuses the keyword and vector rankings,
+and works from the keyword index alone when no query embedding is available.
+
+Similarity is cosine everywhere: vectors are L2-normalized before they are added and
+queries are normalized before searching, and indexes use inner product. Small documents
+use an exact index; once a document passes ANN_MIN_VECTORS, an approximate index
+(HNSW or IVF) is built in the background and swapped in when ready.
+"""
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import faiss
+
+# Support both package and script execution imports
+try:
+    from ..config import (
+        ANN_MIN_VECTORS,
+        ANN_INDEX_TYPE,
+        ANN_HNSW_M,
+        ANN_HNSW_EF_CONSTRUCTION,
+        ANN_HNSW_EF_SEARCH,
+        ANN_IVF_NPROBE,
+        RETRIEVAL_CANDIDATES,
+        RETRIEVAL_RRF_K,
+    )
+    from .lexical_index import BM25Index, reciprocal_rank_fusion
+    from .metrics import SEARCH_SECONDS
+except ImportError:
+    from config import (
+        ANN_MIN_VECTORS,
+        ANN_INDEX_TYPE,
+        ANN_HNSW_M,
+        ANN_HNSW_EF_CONSTRUCTION,
+        ANN_HNSW_EF_SEARCH,
+        ANN_IVF_NPROBE,
+        RETRIEVAL_CANDIDATES,
+        RETRIEVAL_RRF_K,
+    )
+    from utils.lexical_index import BM25Index, reciprocal_rank_fusion
+    from utils.metrics import SEARCH_SECONDS
+
+# Marks indexes holding normalized vectors searched by inner product (cosine)
+_METRIC = "cosine_ip"
+_INDEX_FILE = "index.faiss"
+_CHUNKS_FILE = "chunks.bin"
+_OFFSETS_FILE = "offsets.npy"
+_META_FILE = "meta.json"
+
+# Approximate indexes are built off the request path, one or two at a time
+_builder = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ann-builder")
+
+
+def normalize_embeddings(embeddings) -> np.ndarray:
+    """Return a float32 copy of the vectors scaled to unit length (cosine via inner product)."""
+    array = np.array(embeddings, dtype=np.float32, copy=True)
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    faiss.normalize_L2(array)
+    return array
+
+
+def build_exact_index(normalized: np.ndarray) -> faiss.Index:
+    """Exact inner-product index for already-normalized vectors."""
+    index = faiss.IndexFlatIP(normalized.shape[1])
+    index.add(normalized)  # type: ignore[arg-type]
+    return index
+
+
+def build_ann_index(normalized: np.ndarray) -> faiss.Index:
+    """Approximate inner-product index (HNSW or IVF, see ANN_INDEX_TYPE) for normalized vectors."""
+    dim = normalized.shape[1]
+    if ANN_INDEX_TYPE == "ivf":
+        # ~4*sqrt(n) lists is the usual starting point (and FAISS wants >= 39 training points per list)
+        nlist = max(1, min(int(4 * np.sqrt(len(normalized))), len(normalized) // 39))
+        index = faiss.index_factory(dim, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+        index.train(normalized)  # type: ignore[arg-type]
+    else:
+        index = faiss.IndexHNSWFlat(dim, ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ANN_HNSW_EF_CONSTRUCTION
+    index.add(normalized)  # type: ignore[arg-type]
+    return index
+
+
+def _index_type(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def _search_params(index: faiss.Index):
+    """Recall/speed knobs for approximate indexes (None for exact ones)."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ANN_HNSW_EF_SEARCH)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=ANN_IVF_NPROBE)
+    return None
+
+
+def create_and_add_embeddings(embeddings: List[List[float]], index: faiss.Index, chunks: List[str], chunk_store: List[str]):
+    """
+    Adds new embeddings and chunks to the existing, persistent vector store.
+    
+    Args:
+        embeddings (List[List[float]]): The list of embeddings to add.
+        index (faiss.Index): The persistent Faiss index.
+        chunks (List[str]): The text chunks corresponding to the embeddings.
+        chunk_store (List[str]): The persistent list of all document chunks.
+    """
+    # Normalize embeddings to use Inner Product for cosine similarity
+    embeddings_array = normalize_embeddings(embeddings)
+    
+    index.add(embeddings_array)  # type: ignore[arg-type]
+    chunk_store.extend(chunks)
+
+def search_vector_store(index: faiss.Index, chunk_store: Sequence[str], query_embedding: List[float], top_k: int = 3) -> List[str]:
+    """
+    Searches the persistent vector store for the most relevant document chunks.
+    
+    Args:
+        index (faiss.Index): The persistent Faiss index.
+        chunk_store (Sequence[str]): The document chunks (list or ChunkArena).
+        query_embedding (List[float]): The embedding of the user's query.
+        top_k (int): The number of top results to retrieve.
+    """
+    return [chunk_store[i] for i in vector_ranking(index, query_embedding, top_k) if i < len(chunk_store)]
+
+
+def vector_ranking(index: faiss.Index, query_embedding: List[float], top_k: int) -> List[int]:
+    """Ids of the top_k vectors closest to the query, best first."""
+    started = time.perf_counter()
+    query_array = normalize_embeddings(query_embedding)
+
+    params = _search_params(index)
+    if params is not None:
+        distances, indices = index.search(query_array, top_k, params=params)  # type: ignore[misc]
+    else:
+        distances, indices = index.search(query_array, top_k)  # type: ignore[misc]
+    SEARCH_SECONDS.labels(_index_type(index)).observe(time.perf_counter() - started)
+    return [int(i) for i in indices[0] if i >= 0]
+
+
+class ChunkArena(Sequence[str]):
+    """
+    Text chunks packed into one UTF-8 buffer plus an offsets array.
+
+    Chunk i is buffer[offsets[i]:offsets[i + 1]]. This is the on-disk format, and
+    opening it memory-maps both files instead of reading them into Python strings.
+    """
+
+    def __init__(self, buffer, offsets: np.ndarray, _mapped: Optional[mmap.mmap] = None) -> None:
+        self._buffer = buffer
+        self._offsets = offsets
+        self._mapped = _mapped
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[str]) -> "ChunkArena":
+        encoded = [c.encode("utf-8") for c in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return cls(b"".join(encoded), offsets)
+
+    @classmethod
+    def open(cls, directory: str) -> "ChunkArena":
+        """Memory-map a chunk file written by write()."""
+        offsets = np.load(os.path.join(directory, _OFFSETS_FILE), mmap_mode="r")
+        chunks_path = os.path.join(directory, _CHUNKS_FILE)
+        if os.path.getsize(chunks_path) == 0:
+            return cls(b"", offsets)
+        with open(chunks_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, offsets, _mapped=mapped)
+
+    def write(self, directory: str) -> None:
+        with open(os.path.join(directory, _CHUNKS_FILE), "wb") as f:
+            f.write(self._buffer)
+        np.save(os.path.join(directory, _OFFSETS_FILE), np.asarray(self._offsets, dtype=np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer) + int(self._offsets.nbytes)
+
+    def __len__(self) -> int:
+        return max(0, len(self._offsets) - 1)
+
+    def __getitem__(self, i):  # type: ignore[override]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._buffer[start:end]).decode("utf-8")
+
+    def close(self) -> None:
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+
+@dataclass
+class DocumentEntry:
+    """Vectors and text chunks for a single processed document."""
+    document_id: str
+    index: faiss.Index
+    chunks: Sequence[str]
+    created_at: float = field(default_factory=time.time)
+    lexical: Optional[BM25Index] = None
+
+
+def _index_bytes(index: faiss.Index) -> int:
+    """Rough memory of a FAISS index: the float32 vectors plus HNSW graph links."""
+    size = index.ntotal * index.d * 4
+    if isinstance(index, faiss.IndexHNSW):
+        size += index.ntotal * ANN_HNSW_M * 2 * 4
+    elif isinstance(index, faiss.IndexIVF):
+        size += index.ntotal * 8  # stored ids
+    return size
+
+
+def _entry_bytes(entry: DocumentEntry) -> int:
+    chunks = entry.chunks.nbytes if isinstance(entry.chunks, ChunkArena) else sum(len(c.encode("utf-8")) for c in entry.chunks)
+    lexical = entry.lexical.nbytes if entry.lexical is not None else 0
+    return _index_bytes(entry.index) + chunks + lexical
+
+
+def _read_index(path: str) -> faiss.Index:
+    """Open an index memory-mapped when FAISS supports it for this index type."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except Exception:
+        return faiss.read_index(path)
+
+
+class DocumentStore:
+    """
+    Keeps one FAISS index and chunk list per document.
+
+    Entries are fully built before they are published, so searching a document
+    needs no locking; only the id -> entry map is guarded.
+
+    With persist_dir set, each document lives in its own folder
+    (persist_dir/<document_id>/), written once when the document is added. Adding
+    a document never rewrites the others.
+
+    Documents with at least ANN_MIN_VECTORS chunks are served from an exact index
+    until their approximate index has been built in the background.
+
+    Chunk text is always kept in a ChunkArena (one UTF-8 buffer + offsets). Loaded
+    documents are kept within max_bytes (estimated, 0 = unlimited): the least recently
+    used are unloaded, to be reopened from disk on next use (or dropped if they were
+    never saved). With ttl_s > 0, documents unused for that long are removed entirely.
+    Reopening a document reads its files outside the lock, so other documents are not held up.
+    """
+
+    def __init__(self, persist_dir: Optional[str] = None, max_bytes: int = 0, ttl_s: float = 0) -> None:
+        # None means "known on disk, not opened yet"
+        self._documents: Dict[str, Optional[DocumentEntry]] = {}
+        self._chunk_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Documents being opened from disk (outside the lock); concurrent getters share the result
+        self._loading: Dict[str, "Future[Optional[DocumentEntry]]"] = {}
+        self.lexical_only_searches = 0
+        self.max_bytes = max(0, max_bytes)
+        self.ttl_s = max(0.0, ttl_s)
+        # Estimated memory of loaded documents, and when each document was last used
+        self._bytes: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._next_sweep = 0.0
+        self.unloaded = 0
+        self.dropped = 0
+        self.expired = 0
+        self.persist_dir = persist_dir or None
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+
+    def load_from_disk(self) -> int:
+        """Register every document saved on disk (cheap: files are opened on first use)."""
+        if not self.persist_dir:
+            return 0
+        found = 0
+        for name in os.listdir(self.persist_dir):
+            path = os.path.join(self.persist_dir, name)
+            if name.startswith(".tmp-"):
+                # Left over from a write interrupted by a crash
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            meta_path = os.path.join(path, _META_FILE)
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                print(f"Warning: skipping unreadable vector store entry {name}: {e}")
+                continue
+            with self._lock:
+                if name not in self._documents:
+                    self._documents[name] = None
+                    self._chunk_counts[name] = int(meta.get("num_chunks", 0))
+                    self._last_used[name] = float(meta.get("created_at", time.time()))
+                    found += 1
+        return found
+
+    def _persist(self, entry: DocumentEntry) -> None:
+        """Write one document atomically: build it in a temp folder, then rename."""
+        assert self.persist_dir
+        final_dir = os.path.join(self.persist_dir, entry.document_id)
+        tmp_dir = os.path.join(self.persist_dir, f".tmp-{entry.document_id}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        faiss.write_index(entry.index, os.path.join(tmp_dir, _INDEX_FILE))
+        arena = entry.chunks if isinstance(entry.chunks, ChunkArena) else ChunkArena.from_chunks(entry.chunks)
+        arena.write(tmp_dir)
+        self._write_meta(tmp_dir, entry)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+
+    @staticmethod
+    def _write_meta(directory: str, entry: DocumentEntry) -> None:
+        meta = {
+            "document_id": entry.document_id,
+            "created_at": entry.created_at,
+            "num_chunks": len(entry.chunks),
+            "dim": entry.index.d,
+            "metric": _METRIC,
+            "index_type": _index_type(entry.index),
+        }
+        tmp_path = os.path.join(directory, f"{_META_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, _META_FILE))
+
+    def _persist_index(self, entry: DocumentEntry) -> None:
+        """Replace only the index file of an already saved document (after an ANN upgrade)."""
+        assert self.persist_dir
+        directory = os.path.join(self.persist_dir, entry.document_id)
+        tmp_path = os.path.join(directory, f"{_INDEX_FILE}.tmp")
+        faiss.write_index(entry.index, tmp_path)
+        os.replace(tmp_path, os.path.join(directory, _INDEX_FILE))
+        self._write_meta(directory, entry)
+
+    def _open(self, document_id: str) -> DocumentEntry:
+        assert self.persist_dir
+        directory = os.path.join(self.persist_dir, document_id)
+        with open(os.path.join(directory, _META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = _read_index(os.path.join(directory, _INDEX_FILE))
+        entry = DocumentEntry(
+            document_id=document_id,
+            index=index,
+            chunks=ChunkArena.open(directory),
+            created_at=float(meta.get("created_at", time.time())),
+        )
+        if meta.get("metric") != _METRIC:
+            # Saved before the cosine switch: raw vectors in an L2 index. Re-normalize once.
+            normalized = normalize_embeddings(index.reconstruct_n(0, index.ntotal))
+            entry.index = build_exact_index(normalized)
+            self._persist_index(entry)
+            self._maybe_schedule_ann(entry, normalized)
+        elif isinstance(index, faiss.IndexFlat):
+            # e.g. the process stopped before a background ANN build finished
+            self._maybe_schedule_ann(entry, None)
+        return entry
+
+    def _maybe_schedule_ann(self, entry: DocumentEntry, normalized: Optional[np.ndarray]) -> None:
+        if ANN_MIN_VECTORS <= 0 or entry.index.ntotal < ANN_MIN_VECTORS:
+            return
+        _builder.submit(self._upgrade_to_ann, entry, normalized)
+
+    def _upgrade_to_ann(self, entry: DocumentEntry, normalized: Optional[np.ndarray]) -> None:
+        """Build the approximate index in the background and swap it in when ready."""
+        try:
+            if normalized is None:
+                normalized = entry.index.reconstruct_n(0, entry.index.ntotal)
+            started = time.time()
+            ann_index = build_ann_index(normalized)
+            # Searches already running keep using the exact index they picked up
+            entry.index = ann_index
+            print(
+                f"Built {_index_type(ann_index)} index for document {entry.document_id} "
+                f"({ann_index.ntotal} vectors) in {time.time() - started:.2f}s"
+            )
+            with self._lock:
+                if self._documents.get(entry.document_id) is entry:
+                    self._bytes[entry.document_id] = _entry_bytes(entry)
+            if self.persist_dir:
+                self._persist_index(entry)
+        except Exception as e:
+            print(f"Warning: ANN index build failed for document {entry.document_id}: {e}")
+
+    def add_document(self, embeddings: np.ndarray, chunks: List[str], document_id: Optional[str] = None) -> str:
+        """Index a document's chunks under a new (or given) document ID and return the ID."""
+        document_id = document_id or uuid.uuid4().hex
+        # Copy + normalize: the caller may still be using the raw array (e.g. clause detection)
+        normalized = normalize_embeddings(embeddings)
+        index = build_exact_index(normalized)
+        entry = DocumentEntry(document_id=document_id, index=index, chunks=ChunkArena.from_chunks(chunks))
+        entry.lexical = BM25Index(chunks)
+        if self.persist_dir:
+            try:
+                self._persist(entry)
+            except Exception as e:
+                # Still serve the document from memory; it just won't survive a restart
+                print(f"Warning: failed to persist document {document_id}: {e}")
+        with self._lock:
+            self._documents[document_id] = entry
+            self._chunk_counts[document_id] = len(entry.chunks)
+            self._bytes[document_id] = _entry_bytes(entry)
+            self._last_used[document_id] = time.time()
+            expired = self._evict(keep=document_id)
+        self._delete_files(expired)
+        self._maybe_schedule_ann(entry, normalized)
+        return document_id
+
+    def get(self, document_id: Optional[str]) -> Optional[DocumentEntry]:
+        if not document_id:
+            return None
+        expired: List[str] = []
+        loading: "Optional[Future[Optional[DocumentEntry]]]" = None
+        opener = False
+        with self._lock:
+            if document_id not in self._documents:
+                return None
+            entry = self._documents[document_id]
+            self._last_used[document_id] = time.time()
+            if entry is None:
+                loading = self._loading.get(document_id)
+                if loading is None:
+                    loading = Future()
+                    self._loading[document_id] = loading
+                    opener = True
+            elif self.ttl_s and time.time() >= self._next_sweep:
+                expired = self._evict(keep=document_id)
+        if loading is not None:
+            if not opener:
+                return loading.result()
+            # Disk I/O (and a legacy index rewrite) happens without holding the store lock
+            entry, expired = self._load(document_id)
+            loading.set_result(entry)
+        self._delete_files(expired)
+        return entry
+
+    def _load(self, document_id: str) -> Tuple[Optional[DocumentEntry], List[str]]:
+        """Open a saved document and publish it; returns the entry and expired document IDs."""
+        try:
+            entry: Optional[DocumentEntry] = self._open(document_id)
+        except Exception as e:
+            print(f"Warning: failed to open stored document {document_id}: {e}")
+            entry = None
+        expired: List[str] = []
+        with self._lock:
+            self._loading.pop(document_id, None)
+            current = self._documents.get(document_id, False)
+            if current is None and entry is not None:
+                self._documents[document_id] = entry
+                self._bytes[document_id] = _entry_bytes(entry)
+                expired = self._evict(keep=document_id)
+            elif current:
+                # Added again while we were reading: serve the newer entry
+                entry = current
+            # (removed in the meantime: serve this request from what was read, publish nothing)
+        return entry, expired
+
+    def _evict(self, keep: str) -> List[str]:
+        """Apply the TTL and the memory budget (caller holds the lock).
+
+        Returns the expired document IDs whose folders the caller deletes after releasing the lock.
+        Entries are only unreferenced, never closed, so searches already running are unaffected.
+        """
+        now = time.time()
+        expired: List[str] = []
+        if self.ttl_s and now >= self._next_sweep:
+            self._next_sweep = now + min(60.0, self.ttl_s / 10)
+            for document_id, last_used in list(self._last_used.items()):
+                if document_id != keep and now - last_used > self.ttl_s:
+                    self._forget(document_id)
+                    expired.append(document_id)
+                    self.expired += 1
+        if self.max_bytes:
+            total = sum(self._bytes.values())
+            for document_id in sorted(self._bytes, key=lambda d: self._last_used.get(d, 0.0)):
+                if total <= self.max_bytes:
+                    break
+                if document_id == keep:
+                    continue
+                total -= self._bytes.pop(document_id)
+                if self.persist_dir and os.path.isdir(os.path.join(self.persist_dir, document_id)):
+                    self._documents[document_id] = None  # reopened from disk on next use
+                    self.unloaded += 1
+                else:
+                    self._forget(document_id)
+                    self.dropped += 1
+        return expired
+
+    def _forget(self, document_id: str) -> None:
+        """Remove a document from every in-memory map (caller holds the lock)."""
+        self._documents.pop(document_id, None)
+        self._chunk_counts.pop(document_id, None)
+        self._bytes.pop(document_id, None)
+        self._last_used.pop(document_id, None)
+
+    def _delete_files(self, document_ids: List[str]) -> None:
+        if not self.persist_dir:
+            return
+        for document_id in document_ids:
+            with self._lock:
+                if document_id in self._documents:
+                    continue  # added again in the meantime
+            shutil.rmtree(os.path.join(self.persist_dir, document_id), ignore_errors=True)
+
+    def search(self, document_id: str, query_embedding: List[float], top_k: int = 3) -> List[str]:
+        """Search only the given document's vectors (empty list if the document is unknown)."""
+        entry = self.get(document_id)
+        if entry is None or not entry.chunks:
+            return []
+        return search_vector_store(entry.index, entry.chunks, query_embedding, top_k=min(top_k, len(entry.chunks)))
+
+    def search_hybrid(
+        self, document_id: str, query: str, query_embedding: Optional[List[float]], top_k: int = 3
+    ) -> List[str]:
+        """Best chunks by keyword (BM25) and vector rank, fused with reciprocal rank fusion.
+
+        Without a query embedding (e.g. the embedding API was too slow) only keywords are used.
+        """
+        entry = self.get(document_id)
+        if entry is None or not entry.chunks:
+            return []
+        if entry.lexical is None:
+            # Reopened from disk: the keyword index is rebuilt from the chunks on first use
+            entry.lexical = BM25Index(entry.chunks)
+            with self._lock:
+                if self._documents.get(document_id) is entry:
+                    self._bytes[document_id] = _entry_bytes(entry)
+        candidates = min(max(top_k, RETRIEVAL_CANDIDATES), len(entry.chunks))
+        rankings = [entry.lexical.search(query, candidates)]
+        if query_embedding is not None:
+            rankings.append(vector_ranking(entry.index, query_embedding, candidates))
+        else:
+            with self._lock:
+                self.lexical_only_searches += 1
+        fused = reciprocal_rank_fusion(rankings, k=RETRIEVAL_RRF_K)
+        return [entry.chunks[i] for i in fused[:top_k] if i < len(entry.chunks)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._documents)
+
+    def total_chunks(self) -> int:
+        with self._lock:
+            return sum(self._chunk_counts.values())
+
+    def memory_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "loaded_documents": len(self._bytes),
+                "bytes_in_use": sum(self._bytes.values()),
+                "max_bytes": self.max_bytes,
+                "unloaded": self.unloaded,
+                "dropped": self.dropped,
+                "expired": self.expired,
+            }
+
+    def close(self) -> None:
+        """Release memory-mapped files (called on shutdown)."""
+        with self._lock:
+            for entry in self._documents.values():
+                if entry is not None and isinstance(entry.chunks, ChunkArena):
+                    entry.chunks.close()
+            self._documents.clear()
+            self._chunk_counts.clear()
+            self._bytes.clear()
+            self._last_used.clear()
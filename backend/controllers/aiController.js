@@ -20,13 +20,100 @@ const processDocument = async (req, res) => {
     if (req.body && req.body.language) {
       form.append("language", req.body.language);
     }
+    // Optional: make the audio now instead of on demand via /api/audio/:textId
+    if (req.body && req.body.audio !== undefined) {
+      form.append("audio", String(req.body.audio));
+    }
+    // Optional streaming mode ("ndjson" or "sse"): relay stage events as they arrive
+    const stream = req.body && req.body.stream;
+    if (stream) {
+      form.append("stream", stream);
+    }
 
     const response = await axios.post(`${AI_BASE_URL}/api/process-document`, form, {
       headers: form.getHeaders(),
       maxContentLength: Infinity,
       maxBodyLength: Infinity,
+      responseType: stream ? "stream" : "json",
     });
 
+    if (stream) {
+      res.status(200);
+      res.set({
+        "Content-Type": response.headers["content-type"],
+        "Cache-Control": "no-cache",
+      });
+      res.flushHeaders();
+      response.data.pipe(res);
+      req.on("close", () => response.data.destroy());
+      return;
+    }
+
+    return res.status(200).json(response.data);
+  } catch (error) {
+    const status = error.response?.status || 500;
+    const detail = error.response?.data || { message: error.message };
+    return res.status(status).json({ error: detail });
+  }
+};
+
+// Proxy: POST /api/jobs/process-document -> FastAPI job mode (returns 202 + job_id at once)
+const submitProcessDocumentJob = async (req, res) => {
+  try {
+    if (!req.file) {
+      return res.status(400).json({ message: "No file uploaded" });
+    }
+
+    const form = new FormData();
+    form.append("file", req.file.buffer, {
+      filename: req.file.originalname,
+      contentType: req.file.mimetype,
+    });
+    if (req.body && req.body.language) {
+      form.append("language", req.body.language);
+    }
+    if (req.body && req.body.audio !== undefined) {
+      form.append("audio", String(req.body.audio));
+    }
+
+    const response = await axios.post(`${AI_BASE_URL}/api/jobs/process-document`, form, {
+      headers: form.getHeaders(),
+      maxContentLength: Infinity,
+      maxBodyLength: Infinity,
+    });
+
+    return res.status(202).json(response.data);
+  } catch (error) {
+    const status = error.response?.status || 500;
+    const detail = error.response?.data || { message: error.message };
+    // Pass Retry-After through so clients back off when the AI queue is full
+    const retryAfter = error.response?.headers?.["retry-after"];
+    if (retryAfter) {
+      res.set("Retry-After", retryAfter);
+    }
+    return res.status(status).json({ error: detail });
+  }
+};
+
+// Proxy: GET /api/jobs/:jobId -> FastAPI job status (stage, timings, result when done)
+const getProcessDocumentJob = async (req, res) => {
+  try {
+    const jobId = encodeURIComponent(req.params.jobId);
+    const response = await axios.get(`${AI_BASE_URL}/api/jobs/${jobId}`);
+    return res.status(200).json(response.data);
+  } catch (error) {
+    const status = error.response?.status || 500;
+    const detail = error.response?.data || { message: error.message };
+    return res.status(status).json({ error: detail });
+  }
+};
+
+// Proxy: GET /api/audio/:textId?language=hi -> FastAPI on-demand audio for a summary_id/answer_id
+const getAudio = async (req, res) => {
+  try {
+    const textId = encodeURIComponent(req.params.textId);
+    const params = { language: req.query.language || "en" };
+    const response = await axios.get(`${AI_BASE_URL}/api/audio/${textId}`, { params });
     return res.status(200).json(response.data);
   } catch (error) {
     const status = error.response?.status || 500;
@@ -36,16 +123,16 @@ const processDocument = async (req, res) => {
 };
 
 // Helper to call AI chat endpoint
-const callAiChat = async ({ query, language }) => {
-  const payload = new URLSearchParams();
-  payload.append("query", query || "");
-  payload.append("language", language || "en");
-  const response = await axios.post(`${AI_BASE_URL}/api/chat`, payload.toString(), {
-    headers: { "Content-Type": "application/x-www-form-urlencoded" },
-  });
+// documentId is the `document_id` returned by /api/process-document; chat only searches that document
+const callAiChat = async ({ query, language, documentId }) => {
+  const params = { query: query || "", language: language || "en" };
+  if (documentId) {
+    params.document_id = documentId;
+  }
+  const response = await axios.post(`${AI_BASE_URL}/api/chat`, null, { params });
   return response.data;
 };
 
-module.exports = { processDocument, callAiChat };
+module.exports = { processDocument, submitProcessDocumentJob, getProcessDocumentJob, getAudio, callAiChat };
 
 
@@ -6,7 +6,7 @@ const postChat = async (req, res) => {
   try {
     console.log("📩 POST /api/chat incoming");
     const { userId } = req.params;
-    let { notebookId, messages, language } = req.body;
+    let { notebookId, messages, language, documentId } = req.body;
 
     if (typeof messages === "string") {
       try {
@@ -40,23 +40,39 @@ const postChat = async (req, res) => {
       }
     }
 
-    // AI response
-    const aiResponse = await callAiChat(messages, language || "en");
+    // The document this notebook chats about: sent with the request (document_id from
+    // /api/process-document) or remembered from an earlier message of the notebook
+    if (!documentId) {
+      const existing = await Chat.findOne({ userId, notebookId }, { documentId: 1 });
+      documentId = existing?.documentId || undefined;
+    }
+
+    // AI response to the latest user message
+    const lastUserMessage = [...messages].reverse().find((m) => m.sender === "user");
+    const aiResponse = await callAiChat({
+      query: lastUserMessage?.message || "",
+      language: language || "en",
+      documentId,
+    });
 
     if (aiResponse) {
       messages.push({
         sender: "bot",
-        message: aiResponse.text || "",
-        audioUrl: aiResponse.audioUrl || null,
+        message: aiResponse.translated_response || aiResponse.chatbot_response || "",
+        language: language || "en",
+        audioUrl: aiResponse.audio_url || null,
+        answerId: aiResponse.answer_id || null,
       });
     }
 
     // save chat
+    const update = { updatedAt: new Date() };
+    if (documentId) update.documentId = documentId;
     const saved = await Chat.findOneAndUpdate(
       { userId, notebookId },
       {
         $setOnInsert: { userId, notebookId, createdAt: new Date() },
-        $set: { updatedAt: new Date() },
+        $set: update,
         $push: { messages: { $each: messages } },
       },
       { upsert: true, new: true }
@@ -64,6 +80,7 @@ const postChat = async (req, res) => {
 
     return res.json({
       notebookId,
+      documentId: saved.documentId || null,
       messages: saved.messages,
     });
   } catch (err) {
@@ -83,6 +100,7 @@ const getChat = async (req, resp) => {
 
     resp.status(200).json({
       notebookId: chat.notebookId,
+      documentId: chat.documentId || null,
       messages: Array.isArray(chat.messages) ? chat.messages : [],
     });
   } catch (error) {
@@ -3,12 +3,17 @@ const mongoose = require("mongoose");
 const chatSchema = new mongoose.Schema({
   userId: { type: mongoose.Schema.Types.ObjectId, ref: "User", required: true },
   notebookId: { type: String, required: true },
+  // document_id returned by the AI service's /api/process-document; chat searches only it
+  documentId: { type: String },
 
   messages: [
     {
       sender: { type: String, enum: ["user", "bot"], required: true },
       message: { type: String, default: "" },
       language: { type: String, default: "en" },
+      // Bot replies: audio URL if already made, else answerId for GET /api/audio/:textId
+      audioUrl: { type: String },
+      answerId: { type: String },
       file: {
         fileName: String,
         fileType: String,
@@ -1,7 +1,7 @@
 const express = require("express");
 const uploadAndToCloudinary = require("../middleware/upload");  // ✅ default import
 const { postChat, getChat, getAllNotebooks } = require("../controllers/chatController.js");
-const { processDocument } = require("../controllers/aiController.js");
+const { processDocument, submitProcessDocumentJob, getProcessDocumentJob, getAudio } = require("../controllers/aiController.js");
 
 const router = express.Router();
 
@@ -21,4 +21,11 @@ console.log("Router setup: POST /process-document with memory upload middleware"
 
 router.post("/process-document", memoryUpload.single("file"), processDocument);
 
+// Job mode: upload returns a job ID immediately; poll the status route for progress/result
+router.post("/jobs/process-document", memoryUpload.single("file"), submitProcessDocumentJob);
+router.get("/jobs/:jobId", getProcessDocumentJob);
+
+// On-demand audio for a summary/answer (only synthesised when a user presses play)
+router.get("/audio/:textId", getAudio);
+
 module.exports = router;